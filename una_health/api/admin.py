@@ -1,7 +1,17 @@
 from django.contrib import admin
 
-from .models import Customer, Device, GlucoseData
+from .models import (
+    Customer,
+    Device,
+    GlucoseDailySummary,
+    GlucoseData,
+    GlucoseDataText,
+    ImportJob,
+)
 
 admin.site.register(Customer)
 admin.site.register(Device)
 admin.site.register(GlucoseData)
+admin.site.register(GlucoseDataText)
+admin.site.register(GlucoseDailySummary)
+admin.site.register(ImportJob)
@@ -0,0 +1,237 @@
+from collections import Counter
+from datetime import datetime, timezone
+from math import floor, sqrt
+
+from django.db import NotSupportedError
+from django.db.models import (
+    Avg,
+    BigIntegerField,
+    Count,
+    FilteredRelation,
+    Func,
+    Max,
+    Min,
+    Q,
+)
+
+GLUCOSE_CHANNELS = ("glucose_history", "glucose_scan")
+PERCENTILES = (5, 25, 50, 75, 95)
+# Supported series bucket sizes in seconds
+BUCKET_SIZES = {"5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+
+
+class EpochBucket(Func):
+    """
+    Start of the fixed-size time bucket a datetime falls into, in seconds
+    since the epoch. Buckets are aligned to midnight UTC.
+    """
+
+    output_field = BigIntegerField()
+
+    def __init__(self, expression, seconds, **extra):
+        super().__init__(expression, seconds=int(seconds), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(
+            f"Time buckets are not supported on {connection.vendor}."
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="(CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)"
+            " / %(seconds)s * %(seconds)s)",
+            **extra_context,
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler,
+            connection,
+            template="(FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / %(seconds)s)"
+            " * %(seconds)s)::bigint",
+            **extra_context,
+        )
+
+
+def value_histograms(queryset):
+    """
+    Count the readings per glucose value of both channels in a single grouped
+    query over ``queryset``.
+
+    Glucose values are small integers, so the result has at most a few hundred
+    rows no matter how many readings are aggregated.
+    """
+    return count_values(value_count_rows(queryset))
+
+
+async def avalue_histograms(queryset):
+    """``value_histograms`` for async views."""
+    return count_values([row async for row in value_count_rows(queryset)])
+
+
+def value_count_rows(queryset):
+    return (
+        queryset.order_by()
+        .values_list(*GLUCOSE_CHANNELS)
+        .annotate(readings=Count("id"))
+    )
+
+
+def count_values(rows):
+    histograms = {channel: Counter() for channel in GLUCOSE_CHANNELS}
+    for *values, readings in rows:
+        for channel, value in zip(GLUCOSE_CHANNELS, values):
+            if value is not None:
+                histograms[channel][value] += readings
+    return histograms
+
+
+def percentile(histogram, values, count, rank):
+    """Linearly interpolated percentile of the sorted ``values`` of ``histogram``."""
+    position = rank / 100 * (count - 1)
+    lower_index = floor(position)
+    lower = upper = None
+    seen = 0
+    for value in values:
+        seen += histogram[value]
+        if lower is None and seen > lower_index:
+            lower = value
+        if seen > lower_index + 1 or seen == count:
+            upper = value
+            break
+    return lower + (upper - lower) * (position - lower_index)
+
+
+def histogram_statistics(histogram, percentiles=PERCENTILES):
+    """Summary statistics of the readings counted in ``histogram``."""
+    count = sum(histogram.values())
+    if not count:
+        return {
+            "count": 0,
+            "min": None,
+            "max": None,
+            "mean": None,
+            "std_dev": None,
+            "percentiles": {f"p{rank}": None for rank in percentiles},
+        }
+
+    values = sorted(histogram)
+    total = sum(value * readings for value, readings in histogram.items())
+    total_squares = sum(
+        value * value * readings for value, readings in histogram.items()
+    )
+    mean = total / count
+    variance = max(total_squares / count - mean * mean, 0)
+    return {
+        "count": count,
+        "min": values[0],
+        "max": values[-1],
+        "mean": round(mean, 2),
+        "std_dev": round(sqrt(variance), 2),
+        "percentiles": {
+            f"p{rank}": round(percentile(histogram, values, count, rank), 2)
+            for rank in percentiles
+        },
+    }
+
+
+def glucose_statistics(queryset):
+    """
+    Statistics of both glucose channels over ``queryset``, computed from one
+    database query.
+    """
+    return channel_statistics(value_histograms(queryset))
+
+
+def channel_statistics(histograms):
+    """
+    Statistics of both glucose channels from their value ``histograms``.
+
+    ``min_value`` and ``max_value`` span both channels and are ``None`` when
+    there are no readings.
+    """
+    channels = {
+        channel: histogram_statistics(histogram)
+        for channel, histogram in histograms.items()
+    }
+    minimums = [stats["min"] for stats in channels.values() if stats["count"]]
+    maximums = [stats["max"] for stats in channels.values() if stats["count"]]
+    return {
+        "min_value": min(minimums, default=None),
+        "max_value": max(maximums, default=None),
+        **channels,
+    }
+
+
+def glucose_series(queryset, seconds):
+    """
+    Min, mean, max and count of both glucose channels per time bucket of
+    ``seconds``, aggregated by the database in a single grouped query.
+    """
+    aggregates = {}
+    for channel in GLUCOSE_CHANNELS:
+        aggregates[f"{channel}_min"] = Min(channel)
+        aggregates[f"{channel}_mean"] = Avg(channel)
+        aggregates[f"{channel}_max"] = Max(channel)
+        aggregates[f"{channel}_count"] = Count(channel)
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=EpochBucket("device_timestamp", seconds))
+        .values("bucket")
+        .annotate(**aggregates)
+        .order_by("bucket")
+    )
+    for row in rows:
+        bucket = {"timestamp": datetime.fromtimestamp(row["bucket"], tz=timezone.utc)}
+        for channel in GLUCOSE_CHANNELS:
+            mean = row[f"{channel}_mean"]
+            bucket[channel] = {
+                "min": row[f"{channel}_min"],
+                "mean": None if mean is None else round(mean, 2),
+                "max": row[f"{channel}_max"],
+                "count": row[f"{channel}_count"],
+            }
+        yield bucket
+
+
+def cohort_statistics(customers, start=None, stop=None):
+    """
+    Yield min, mean, max and count of both glucose channels for each of
+    ``customers`` between ``start`` and ``stop``, ordered by user ID.
+
+    All users are aggregated by one query grouped by user. The time window is
+    part of the join, so each user's readings are found through the (user,
+    device_timestamp) index and users without readings are reported with a
+    count of zero.
+    """
+    window = Q()
+    if start is not None:
+        window &= Q(glucosedata__device_timestamp__gte=start)
+    if stop is not None:
+        window &= Q(glucosedata__device_timestamp__lte=stop)
+    aggregates = {}
+    for channel in GLUCOSE_CHANNELS:
+        column = f"readings__{channel}"
+        aggregates[f"{channel}_min"] = Min(column)
+        aggregates[f"{channel}_mean"] = Avg(column)
+        aggregates[f"{channel}_max"] = Max(column)
+        aggregates[f"{channel}_count"] = Count(column)
+    rows = (
+        customers.annotate(readings=FilteredRelation("glucosedata", condition=window))
+        .values("user_id")
+        .annotate(**aggregates)
+        .order_by("user_id")
+    )
+    for row in rows.iterator():
+        statistics = {"user_id": row["user_id"]}
+        for channel in GLUCOSE_CHANNELS:
+            mean = row[f"{channel}_mean"]
+            statistics[channel] = {
+                "min": row[f"{channel}_min"],
+                "mean": None if mean is None else round(mean, 2),
+                "max": row[f"{channel}_max"],
+                "count": row[f"{channel}_count"],
+            }
+        yield statistics
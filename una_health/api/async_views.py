@@ -0,0 +1,108 @@
+"""
+Async versions of the read endpoints, for ASGI servers.
+
+The views run on the event loop and query through Django's async ORM, so a
+request waiting for a slow aggregate doesn't hold a worker thread. They share
+filtering, pagination, serialization and caching with their DRF counterparts
+and respond with the same data.
+"""
+
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .caching import acached_response
+from .filters import GlucoseDataFilter, glucose_filter_values
+from .instrumentation import span
+from .models import GlucoseData
+from .pagination import GlucoseDataPagination
+from .rollups import asummarized_statistics
+from .serializers import GlucoseDataRowSerializer, GlucoseMinMaxSerializer
+from .views import selected_fields
+
+
+def render_json(data, status=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data), content_type="application/json", status=status
+    )
+
+
+class AsyncGlucoseView(View):
+    """
+    Async view that parses query parameters like DRF views do and answers API
+    exceptions with the same error responses.
+    """
+
+    filter_backends = [GlucoseDataFilter]
+
+    async def dispatch(self, request, *args, **kwargs):
+        # The DRF request only parses query parameters here, no authentication
+        # or content negotiation is run
+        self.request = request = Request(request)
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            data = exc.detail
+            if not isinstance(data, (list, dict)):
+                data = {"detail": data}
+            return render_json(data, status=exc.status_code)
+
+    def filter_queryset(self, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+
+class AsyncGlucoseDataListView(AsyncGlucoseView):
+    filter_backends = [GlucoseDataFilter, OrderingFilter]
+    ordering_fields = ["device_timestamp"]
+
+    async def get(self, request, *args, **kwargs):
+        return await acached_response(request, self.list_data)
+
+    async def list_data(self):
+        row_serializer = GlucoseDataRowSerializer(
+            fields=selected_fields(self.request.query_params)
+        )
+        queryset = self.filter_queryset(GlucoseData.objects.all())
+        queryset = row_serializer.get_queryset(queryset)
+
+        paginator = GlucoseDataPagination()
+        page = await paginator.apaginate_queryset(queryset, self.request)
+        if page is not None:
+            with span("serialize"):
+                data = row_serializer.to_representation(page)
+                return paginator.get_paginated_response(data).data
+        rows = [row async for row in queryset.aiterator()]
+        with span("serialize"):
+            return row_serializer.to_representation(rows)
+
+
+class AsyncGlucoseDataSingleView(AsyncGlucoseView):
+    async def get(self, request, id, *args, **kwargs):
+        row_serializer = GlucoseDataRowSerializer()
+        queryset = row_serializer.get_queryset(GlucoseData.objects.filter(id=id))
+        try:
+            row = await queryset.aget()
+        except GlucoseData.DoesNotExist:
+            raise NotFound("No GlucoseData matches the given query.")
+        (data,) = row_serializer.to_representation([row])
+        return render_json(data)
+
+
+class AsyncGlucoseMinMaxView(AsyncGlucoseView):
+    async def get(self, request, *args, **kwargs):
+        return await acached_response(request, self.statistics)
+
+    async def statistics(self):
+        # Same rollup based statistics as GlucoseMinMaxView
+        queryset = self.filter_queryset(GlucoseData.objects.all())
+        user_id, start, stop = glucose_filter_values(self.request.query_params)
+        with span("aggregate"):
+            statistics = await asummarized_statistics(queryset, user_id, start, stop)
+        with span("serialize"):
+            return GlucoseMinMaxSerializer(statistics).data
@@ -0,0 +1,103 @@
+import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from .importers import import_glucose_csv
+from .models import Customer
+
+logger = logging.getLogger(__name__)
+
+
+def user_id_from_filename(name):
+    # Exports are named after the user they belong to, e.g. "<user_id>.csv"
+    return PurePosixPath(name).name.split(".")[0]
+
+
+def expand_uploads(files, stack):
+    """
+    Return ``(name, open)`` pairs for every CSV export in ``files``.
+
+    Zip archives are read in place: each member is streamed from the archive
+    when it is imported instead of being extracted to disk. Archives are
+    closed by the ``contextlib.ExitStack`` given as ``stack``.
+    """
+    sources = []
+    for file in files:
+        if not zipfile.is_zipfile(file):
+            file.seek(0)
+            sources.append((file.name, lambda file=file: file))
+            continue
+        archive = stack.enter_context(zipfile.ZipFile(file))
+        for member in archive.infolist():
+            path = PurePosixPath(member.filename)
+            if member.is_dir() or path.suffix.lower() != ".csv":
+                continue
+            # Skip resource forks and other metadata added by archivers
+            if path.name.startswith(".") or "__MACOSX" in path.parts:
+                continue
+            sources.append(
+                (
+                    f"{file.name}/{member.filename}",
+                    lambda archive=archive, member=member: archive.open(member),
+                )
+            )
+    return sources
+
+
+def import_source(name, open_file):
+    """Import one export in its own transaction and summarize the outcome."""
+    user_id = user_id_from_filename(name)
+    summary = {"name": name, "user_id": user_id}
+    created = False
+    try:
+        # The customer is committed first, the import's transaction would hold
+        # its lock on the customers and keep new partitions from being attached
+        customer, created = Customer.objects.get_or_create(user_id=user_id)
+        with transaction.atomic():
+            counts = import_glucose_csv(open_file(), customer)
+    except Exception as e:
+        logger.exception(f"Bulk import of {name} failed")
+        # Failed files leave no trace, not even the customer
+        if created:
+            customer.delete()
+        summary.update(status="failed", error=str(e))
+    else:
+        summary.update(
+            status="succeeded",
+            rows_inserted=counts["inserted"],
+            rows_updated=counts["updated"],
+            rows_skipped=counts["skipped"],
+            invalid_values=counts["invalid"],
+        )
+    return summary
+
+
+def import_in_worker(source):
+    try:
+        return import_source(*source)
+    finally:
+        connections.close_all()
+
+
+def bulk_workers():
+    # SQLite only allows a single writer, parallel imports would just wait
+    if connection.vendor == "sqlite":
+        return 1
+    return settings.GLUCOSE_BULK_IMPORT_WORKERS
+
+
+def import_sources(sources):
+    """
+    Import ``sources`` in parallel on a bounded pool of worker threads, each
+    file in its own transaction, and return one summary per source.
+    """
+    if settings.GLUCOSE_IMPORT_EAGER:
+        return [import_source(*source) for source in sources]
+    with ThreadPoolExecutor(
+        max_workers=bulk_workers(), thread_name_prefix="glucose-bulk-import"
+    ) as executor:
+        return list(executor.map(import_in_worker, sources))
@@ -0,0 +1,120 @@
+from hashlib import sha256
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+# Version of the responses that cover every user, bumped by any write
+ALL_USERS = "*"
+
+
+def get_cache():
+    return caches[settings.GLUCOSE_CACHE_ALIAS]
+
+
+def version_key(user_id):
+    return f"glucose:version:{user_id}"
+
+
+def data_version(user_id):
+    """
+    Current data version of ``user_id``.
+
+    Versions are random tokens rather than counters, so a version evicted from
+    the cache is replaced by a new token and can never match a stale response.
+    """
+    cache = get_cache()
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Another request may have set the version in the meantime
+        version = uuid4().hex
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+async def adata_version(user_id):
+    """``data_version`` for async views."""
+    cache = get_cache()
+    key = version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = uuid4().hex
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def invalidate_user(user_id):
+    """Expire the cached responses covering the data of ``user_id``."""
+    get_cache().set_many(
+        {version_key(user_id): uuid4().hex, version_key(ALL_USERS): uuid4().hex},
+        timeout=None,
+    )
+
+
+def response_user(request):
+    # Responses filtered by user only depend on that user's data
+    return request.query_params.get("user_id") or ALL_USERS
+
+
+def etag_for(request, user_id, version):
+    key = f"{request.build_absolute_uri()}|{user_id}|{version}"
+    return quote_etag(sha256(key.encode("utf-8")).hexdigest())
+
+
+def response_etag(request):
+    user_id = response_user(request)
+    return etag_for(request, user_id, data_version(user_id))
+
+
+def cached_response(request, compute):
+    """
+    Serve the data returned by ``compute`` from the cache.
+
+    The ETag of a response is derived from the request URL and the data
+    version of the user it filters on, so it is known before the database is
+    touched: a matching ``If-None-Match`` is answered with 304 and a cache hit
+    is served without running ``compute``. Imports change the version, which
+    makes every older entry unreachable.
+    """
+    etag = response_etag(request)
+    headers = {"ETag": etag}
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cache = get_cache()
+    key = f"glucose:response:{etag}"
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, timeout=settings.GLUCOSE_CACHE_TIMEOUT)
+    return Response(data, headers=headers)
+
+
+async def acached_response(request, compute):
+    """
+    ``cached_response`` for async views, where ``compute`` is a coroutine
+    function. Returns a plain Django response rendered as DRF would.
+    """
+    user_id = response_user(request)
+    etag = etag_for(request, user_id, await adata_version(user_id))
+    headers = {"ETag": etag}
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cache = get_cache()
+    key = f"glucose:response:{etag}"
+    data = await cache.aget(key)
+    if data is None:
+        data = await compute()
+        await cache.aset(key, data, timeout=settings.GLUCOSE_CACHE_TIMEOUT)
+    return HttpResponse(
+        JSONRenderer().render(data), content_type="application/json", headers=headers
+    )
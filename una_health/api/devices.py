@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Device
+
+
+class DeviceCache:
+    """
+    Per-process LRU cache of ``Device`` rows keyed by serial number.
+
+    Only devices that are known to be committed are stored, so a rolled back
+    import can never leave a dangling device behind in the cache.
+    """
+
+    def __init__(self, max_size=None):
+        self._max_size = max_size
+        self._devices = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def max_size(self):
+        return self._max_size or settings.GLUCOSE_DEVICE_CACHE_SIZE
+
+    def __len__(self):
+        return len(self._devices)
+
+    def get_many(self, serial_numbers):
+        found = {}
+        with self._lock:
+            for serial_number in serial_numbers:
+                device = self._devices.get(serial_number)
+                if device is not None:
+                    self._devices.move_to_end(serial_number)
+                    found[serial_number] = device
+        return found
+
+    def add_many(self, devices):
+        with self._lock:
+            for device in devices:
+                self._devices[device.serial_number] = device
+                self._devices.move_to_end(device.serial_number)
+            while len(self._devices) > self.max_size:
+                self._devices.popitem(last=False)
+
+    def discard(self, serial_number):
+        with self._lock:
+            self._devices.pop(serial_number, None)
+
+    def clear(self):
+        with self._lock:
+            self._devices.clear()
+
+
+device_cache = DeviceCache()
+
+
+class DeviceResolver:
+    """
+    Resolves the devices named in an import, one batch of rows at a time.
+
+    Serial numbers are looked up in the process cache first; the rest are
+    fetched with a single query and the missing ones inserted with a single
+    ``bulk_create``. Devices resolved during the import are remembered locally
+    and handed to the process cache once the surrounding transaction commits.
+    """
+
+    def __init__(self, cache=device_cache):
+        self.cache = cache
+        self.devices = {}
+
+    def resolve(self, pairs):
+        """
+        Resolve ``(device_name, serial_number)`` pairs and return a mapping of
+        serial number to ``Device`` covering every device seen so far.
+        """
+        missing = {}
+        for device_name, serial_number in pairs:
+            if serial_number not in self.devices:
+                missing.setdefault(serial_number, device_name)
+        if not missing:
+            return self.devices
+
+        self.devices.update(self.cache.get_many(missing))
+        missing = {
+            serial_number: device_name
+            for serial_number, device_name in missing.items()
+            if serial_number not in self.devices
+        }
+        if not missing:
+            return self.devices
+
+        fetched = Device.objects.in_bulk(list(missing))
+        created = [
+            Device(device_name=device_name, serial_number=serial_number)
+            for serial_number, device_name in missing.items()
+            if serial_number not in fetched
+        ]
+        if created:
+            Device.objects.bulk_create(created, ignore_conflicts=True)
+
+        resolved = list(fetched.values()) + created
+        self.devices.update((device.serial_number, device) for device in resolved)
+        transaction.on_commit(lambda: self.cache.add_many(resolved))
+        return self.devices
@@ -0,0 +1,247 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .serializers import GlucoseDataRowSerializer
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # Arrow and Parquet exports are optional
+    pyarrow = None
+
+# Columns of a flat (CSV, Arrow or Parquet) export, in file order
+EXPORT_COLUMNS = [
+    "id",
+    "user_id",
+    "device_name",
+    "serial_number",
+    "device_timestamp",
+    "record_type",
+    "glucose_history",
+    "glucose_scan",
+    "non_numeric_rapid_acting_insulin",
+    "rapid_acting_insulin",
+    "non_numeric_food_data",
+    "carbohydrates_grams",
+    "carbohydrates_portions",
+    "non_numeric_depot_insulin",
+    "depot_insulin",
+    "notes",
+    "glucose_test_strips",
+    "ketone",
+    "meal_insulin",
+    "corrective_insulin",
+    "insulin_change_by_user",
+]
+# Database column behind each export column that isn't named after one, the
+# text columns are annotated by GlucoseDataQuerySet.with_text()
+EXPORT_SOURCES = {"device_name": "device__device_name", "serial_number": "device_id"}
+
+
+def iterate_chunks(queryset):
+    """
+    Yield the rows of ``queryset`` in lists of ``GLUCOSE_EXPORT_CHUNK_SIZE``.
+
+    Rows are fetched with ``iterator()``, a server-side cursor where the
+    database supports it, so memory use does not grow with the export.
+    """
+    chunk_size = settings.GLUCOSE_EXPORT_CHUNK_SIZE
+    rows = queryset.order_by("device_timestamp", "id").iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+def export_csv(queryset):
+    """Stream ``queryset`` as UTF-8 CSV with a header line, one chunk at a time."""
+    columns = [EXPORT_SOURCES.get(column, column) for column in EXPORT_COLUMNS]
+    timestamp = columns.index("device_timestamp")
+    to_representation = serializers.DateTimeField().to_representation
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in iterate_chunks(queryset.with_text().values_list(*columns)):
+        for row in chunk:
+            row = list(row)
+            row[timestamp] = to_representation(row[timestamp])
+            writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Only the header is left when nothing matched the filters
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_ndjson(queryset):
+    """
+    Stream ``queryset`` as newline delimited JSON, one object per reading in
+    the format of the list endpoint.
+    """
+    row_serializer = GlucoseDataRowSerializer()
+    for chunk in iterate_chunks(row_serializer.get_queryset(queryset)):
+        lines = [
+            json.dumps(reading, cls=JSONEncoder, separators=(",", ":"))
+            for reading in row_serializer.to_representation(chunk)
+        ]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def stream_json_results(results):
+    """
+    Stream the dicts of ``results`` as a ``{"results": [...]}`` JSON document,
+    encoding each result as soon as it is produced.
+    """
+    yield b'{"results":['
+    separator = b""
+    for result in results:
+        yield separator + json.dumps(result, separators=(",", ":")).encode("utf-8")
+        separator = b","
+    yield b"]}"
+
+
+class StreamSink(io.RawIOBase):
+    """
+    Write-only file that hands out what was written since the last ``take()``.
+
+    ``tell()`` keeps counting across takes, so writers that record offsets,
+    like the Arrow file and Parquet writers, produce valid files.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def arrow_schema():
+    text, integer = pyarrow.string(), pyarrow.int32()
+    # Like the DecimalFields of GlucoseData
+    decimal = pyarrow.decimal128(7, 2)
+    types = {
+        "id": pyarrow.int64(),
+        "user_id": text,
+        "device_name": text,
+        "serial_number": text,
+        "device_timestamp": pyarrow.timestamp("us", tz="UTC"),
+        "non_numeric_rapid_acting_insulin": text,
+        "non_numeric_food_data": text,
+        "non_numeric_depot_insulin": text,
+        "notes": text,
+        "rapid_acting_insulin": decimal,
+        "carbohydrates_portions": decimal,
+        "depot_insulin": decimal,
+        "ketone": decimal,
+        "meal_insulin": decimal,
+        "corrective_insulin": decimal,
+        "insulin_change_by_user": decimal,
+    }
+    return pyarrow.schema(
+        [(column, types.get(column, integer)) for column in EXPORT_COLUMNS]
+    )
+
+
+def record_batches(queryset, schema):
+    """
+    Yield the rows of ``queryset`` as Arrow record batches, one per chunk.
+
+    Each chunk is transposed into columns, which are converted to typed Arrow
+    arrays as a whole.
+    """
+    columns = [EXPORT_SOURCES.get(column, column) for column in EXPORT_COLUMNS]
+    for chunk in iterate_chunks(queryset.with_text().values_list(*columns)):
+        arrays = [
+            pyarrow.array(values, type=field.type)
+            for values, field in zip(zip(*chunk), schema)
+        ]
+        yield pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def export_arrow(queryset):
+    """Stream ``queryset`` as an Arrow IPC file, one record batch per chunk."""
+    sink = StreamSink()
+    schema = arrow_schema()
+    with pyarrow.ipc.new_file(sink, schema) as writer:
+        for batch in record_batches(queryset, schema):
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
+
+
+def export_parquet(queryset):
+    """Stream ``queryset`` as a Parquet file, one row group per chunk."""
+    sink = StreamSink()
+    schema = arrow_schema()
+    with pyarrow.parquet.ParquetWriter(sink, schema) as writer:
+        for batch in record_batches(queryset, schema):
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
+
+
+class ExportFormat(NamedTuple):
+    content_type: str
+    export: Callable
+    # Parquet compresses its pages itself, gzip would only cost time
+    compressible: bool = True
+    requires_pyarrow: bool = False
+
+
+EXPORT_FORMATS = {
+    "csv": ExportFormat("text/csv; charset=utf-8", export_csv),
+    "ndjson": ExportFormat("application/x-ndjson", export_ndjson),
+    "arrow": ExportFormat(
+        "application/vnd.apache.arrow.file",
+        export_arrow,
+        requires_pyarrow=True,
+    ),
+    "parquet": ExportFormat(
+        "application/vnd.apache.parquet",
+        export_parquet,
+        compressible=False,
+        requires_pyarrow=True,
+    ),
+}
+
+
+class ExportUnavailable(APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = "This export format is not available on this server."
+    default_code = "export_unavailable"
+
+
+def get_export_format(name):
+    """Look up an export format, failing for unknown or unavailable ones."""
+    if name not in EXPORT_FORMATS:
+        raise ValidationError(
+            {"export_format": [f"Must be one of {', '.join(EXPORT_FORMATS)}."]}
+        )
+    export_format = EXPORT_FORMATS[name]
+    if export_format.requires_pyarrow and pyarrow is None:
+        raise ExportUnavailable(f"The {name} export requires pyarrow.")
+    return export_format
@@ -0,0 +1,51 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+def parse_timestamp(name, value):
+    try:
+        timestamp = models.DateTimeField().to_python(value)
+    except DjangoValidationError:
+        raise ValidationError({name: [f"'{value}' is not a valid timestamp."]})
+    # Timestamps without an offset are interpreted in the default time zone
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp
+
+
+def glucose_filter_values(query_params):
+    """
+    Parse the ``user_id``, ``start_timestamp`` and ``stop_timestamp`` query
+    parameters shared by the glucose read endpoints, ``None`` where missing.
+    """
+    user_id = query_params.get("user_id") or None
+    start_timestamp = query_params.get("start_timestamp")
+    stop_timestamp = query_params.get("stop_timestamp")
+    if start_timestamp:
+        start_timestamp = parse_timestamp("start_timestamp", start_timestamp)
+    if stop_timestamp:
+        stop_timestamp = parse_timestamp("stop_timestamp", stop_timestamp)
+    return user_id, start_timestamp or None, stop_timestamp or None
+
+
+def filter_glucose_data(queryset, query_params):
+    """
+    Apply the ``user_id``, ``start_timestamp`` and ``stop_timestamp`` query
+    parameters shared by the glucose read endpoints to ``queryset``.
+    """
+    user_id, start_timestamp, stop_timestamp = glucose_filter_values(query_params)
+    if user_id:
+        queryset = queryset.filter(user_id=user_id)
+    if start_timestamp:
+        queryset = queryset.filter(device_timestamp__gte=start_timestamp)
+    if stop_timestamp:
+        queryset = queryset.filter(device_timestamp__lte=stop_timestamp)
+    return queryset
+
+
+class GlucoseDataFilter(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        return filter_glucose_data(queryset, request.query_params)
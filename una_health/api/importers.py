@@ -0,0 +1,230 @@
+import codecs
+import csv
+from collections import Counter
+from contextlib import closing, suppress
+from queue import Empty, Queue
+from threading import Event, Thread
+
+from django.conf import settings
+from django.db import transaction
+
+from .caching import invalidate_user
+from .devices import DeviceResolver
+from .instrumentation import import_duration
+from .loaders import READING_FIELDS, ROW_FIELDS, get_loader
+from .models import TEXT_FIELDS, GlucoseData
+from .parsers import LibreViewParser
+from .partitions import ensure_partitions
+from .rollups import day_of, refresh_daily_summaries
+
+# LibreView exports start with a title line, an empty line and the column header.
+HEADER_LINES = 3
+# Marks the end of the items passed from a background thread
+END_OF_ITEMS = object()
+
+
+def build_rows(columns):
+    """
+    Rows of the readings in the parsed columns of a batch, in ``ROW_FIELDS``
+    order. Devices are identified by their serial number, their primary key.
+    """
+    return list(zip(*(columns[field] for field in ["serial_number", *ROW_FIELDS[1:]])))
+
+
+class CountingLines:
+    """Iterates over the lines of a binary file, counting the bytes read."""
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes_read = 0
+
+    def __iter__(self):
+        for line in self.file:
+            self.bytes_read += len(line)
+            yield line
+
+
+def import_glucose_csv(file, customer, batch_size=None, progress=None):
+    """
+    Stream a LibreView CSV export into ``GlucoseData`` rows for ``customer``.
+
+    The upload is decoded line by line and upserted every ``batch_size`` rows,
+    so memory use does not grow with the size of the file. Each batch is
+    parsed column by column and its devices are resolved together. Readings
+    that already exist are updated if they changed and skipped otherwise, so
+    importing the same export twice leaves the table unchanged. Numeric cells
+    that can't be stored exactly are imported as empty and counted as invalid,
+    rows without a valid record type are left out. The loader configured in
+    ``GLUCOSE_IMPORT_LOADER`` writes the changed readings.
+
+    With ``GLUCOSE_IMPORT_QUEUE_SIZE`` set, batches are parsed on a separate
+    thread, up to that many ahead of the batch being written, so parsing the
+    next batch overlaps with writing the current one. All database work stays
+    on the calling thread and in its transaction.
+
+    Returns a ``Counter`` of inserted, updated and skipped rows and invalid
+    cells. If given, ``progress`` is called with these counts and the bytes
+    read so far after every batch. Files without any rows raise ``ValueError``.
+    """
+    batch_size = batch_size or settings.GLUCOSE_IMPORT_BATCH_SIZE
+    lines = CountingLines(file)
+    batches = parse_batches(lines, batch_size)
+    if settings.GLUCOSE_IMPORT_QUEUE_SIZE:
+        batches = in_background(batches, settings.GLUCOSE_IMPORT_QUEUE_SIZE)
+
+    resolver = DeviceResolver()
+    counts = Counter(inserted=0, updated=0, skipped=0, invalid=0)
+    with import_duration.time("file"), closing(batches), get_loader(customer) as loader:
+        for rows, devices, invalid, bytes_read in batches:
+            with import_duration.time("write"):
+                counts += write_batch(rows, devices, customer, resolver, loader)
+            counts["invalid"] += invalid
+            if progress:
+                progress(counts, bytes_read)
+    if progress:
+        progress(counts, lines.bytes_read)
+    if not any(counts.values()):
+        raise ValueError("The file contains no readings")
+    return counts
+
+
+def parse_batches(lines, batch_size):
+    """
+    Parse the CSV ``lines`` of an export in batches of ``batch_size`` rows.
+
+    Yields the rows of every batch, built by ``build_rows()``, with the
+    distinct ``(device_name, serial_number)`` pairs in it, the number of
+    invalid cells in it and the bytes read up to its end. Nothing
+    here touches the database, so batches can be parsed on another thread
+    than the one writing them.
+    """
+    reader = csv.reader(codecs.iterdecode(lines, "utf-8"))
+    for _ in range(HEADER_LINES):
+        next(reader, None)
+
+    parser = LibreViewParser()
+    batch = []
+    for row in reader:
+        # Skip empty lines, e.g. a trailing newline at the end of the export
+        if not row:
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield parsed_batch(parser, batch, lines.bytes_read)
+            batch = []
+    if batch:
+        yield parsed_batch(parser, batch, lines.bytes_read)
+
+
+def parsed_batch(parser, batch, bytes_read):
+    with import_duration.time("parse"):
+        columns, invalid = parser.parse(batch)
+    devices = dict.fromkeys(zip(columns["device_name"], columns["serial_number"]))
+    return build_rows(columns), list(devices), invalid, bytes_read
+
+
+def in_background(iterable, max_size):
+    """
+    Iterate over ``iterable`` on a separate thread, at most ``max_size`` items
+    ahead of the caller.
+
+    The bounded queue between the threads makes a fast producer wait for a
+    slow consumer. Exceptions raised by ``iterable`` are raised in the caller,
+    and closing the generator stops the producer.
+    """
+    items = Queue(max_size)
+    stopped = Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((item, None))
+                if stopped.is_set():
+                    return
+        # Anything the producer dies of, the consumer would wait for the next
+        # item forever otherwise
+        except BaseException as exc:
+            items.put((None, exc))
+        else:
+            items.put((END_OF_ITEMS, None))
+
+    thread = Thread(target=produce, name="glucose-import-parser", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, exc = items.get()
+            if exc is not None:
+                raise exc
+            if item is END_OF_ITEMS:
+                return
+            yield item
+    finally:
+        stopped.set()
+        # Take items off the queue until the producer, which may be waiting
+        # for room in it, has seen that it should stop
+        while thread.is_alive():
+            with suppress(Empty):
+                items.get(timeout=0.1)
+
+
+def write_batch(rows, devices, customer, resolver, loader):
+    """
+    Upsert the ``rows`` of one parsed batch, which use the ``devices``, and
+    count what happened to them.
+    """
+    if not rows:
+        return Counter()
+    # Create missing partitions before the batch creates devices or reads its
+    # months, so the import's transaction holds no locks they have to wait for
+    ensure_partitions(GlucoseData._meta.db_table, [row[1] for row in rows])
+    resolver.resolve(devices)
+    # Readings are keyed by device, timestamp and record type. Later rows win
+    # over earlier rows for the same reading.
+    readings = {row[:3]: row for row in rows}
+
+    # Rows repeated within the batch are skipped like unchanged rows
+    counts = Counter(skipped=len(rows) - len(readings))
+    existing = existing_readings(customer, readings)
+    changed = []
+    # Keys of readings whose text row goes away because their texts became empty
+    cleared = []
+    for key, row in readings.items():
+        stored = existing.get(key)
+        if stored is None:
+            counts["inserted"] += 1
+            changed.append(row)
+        elif stored != row[3:]:
+            counts["updated"] += 1
+            changed.append(row)
+            if any(stored[-len(TEXT_FIELDS) :]) and not any(row[-len(TEXT_FIELDS) :]):
+                cleared.append(key)
+        else:
+            counts["skipped"] += 1
+
+    if changed:
+        # The rollups are refreshed in the same transaction as the readings, so
+        # they never disagree once the batch is committed
+        with transaction.atomic():
+            loader.load(changed, cleared)
+            refresh_daily_summaries(
+                customer.user_id, {day_of(row[1]) for row in changed}
+            )
+        # Cached responses for this user are stale once the batch is committed
+        transaction.on_commit(lambda: invalidate_user(customer.user_id))
+    return counts
+
+
+def existing_readings(customer, keys):
+    """
+    Stored values and texts of the readings of ``customer`` in the time range
+    covered by the reading ``keys``, keyed the same way.
+    """
+    timestamps = [device_timestamp for _, device_timestamp, _ in keys]
+    rows = (
+        GlucoseData.objects.filter(
+            user=customer, device_timestamp__range=(min(timestamps), max(timestamps))
+        )
+        .with_text()
+        .values_list(*READING_FIELDS, *TEXT_FIELDS)
+    )
+    return {row[:3]: row[3:] for row in rows}
@@ -0,0 +1,249 @@
+"""
+Request timing: query counts, database time, named spans and total time.
+
+``instrumentation_middleware`` times every request. Queries are counted by an
+execute wrapper installed on every database connection, and views mark their
+hot paths with ``span()``. The timings of a request are sent back in a
+``Server-Timing`` header and recorded in histograms of the in-process
+``registry``, which the ``/metrics`` endpoint exposes in the Prometheus text
+format. Imports record their time in ``import_duration``, wherever they run.
+Every process keeps its own registry.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+# Prometheus' default buckets, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    """Prometheus histogram with a fixed set of labels."""
+
+    def __init__(self, name, documentation, labels, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.lock = Lock()
+        # Observations per bucket, not cumulative, then their sum and count
+        self.series = {}
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0,
+                    0,
+                ]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        """Observe the seconds the block takes."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, *label_values)
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            series = sorted(
+                (label_values, list(counts), total, count)
+                for label_values, (counts, total, count) in self.series.items()
+            )
+        for label_values, counts, total, count in series:
+            labels = list(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, observations in zip((*self.buckets, "+Inf"), counts):
+                cumulative += observations
+                bucket_labels = format_labels(labels + [("le", str(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+        return lines
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def histogram(self, name, documentation, labels, buckets=DURATION_BUCKETS):
+        histogram = Histogram(name, documentation, labels, buckets)
+        self.metrics[name] = histogram
+        return histogram
+
+    def expose(self):
+        """All metrics in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics.values():
+            with metric.lock:
+                metric.series.clear()
+
+
+registry = MetricsRegistry()
+request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Time spent answering requests.",
+    ["view", "method", "status"],
+)
+request_queries = registry.histogram(
+    "http_request_db_queries",
+    "Database queries run per request.",
+    ["view"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+request_db_duration = registry.histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per request.",
+    ["view"],
+)
+request_span_duration = registry.histogram(
+    "http_request_span_duration_seconds",
+    "Time spent in the named parts of a request, like serialization.",
+    ["view", "span"],
+)
+# Imports run on worker threads, outside of any request
+import_duration = registry.histogram(
+    "glucose_import_duration_seconds",
+    "Time spent importing uploads: whole files, and parsing and writing batches.",
+    ["phase"],
+    buckets=(*DURATION_BUCKETS, 30, 60, 120, 300, 600),
+)
+
+
+class RequestTimings:
+    """Timings collected while answering one request."""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        # Seconds per span name, in the order the spans were first entered
+        self.spans = {}
+
+    def add_span(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def server_timing(self, total):
+        metrics = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"']
+        metrics.extend(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items()
+        )
+        metrics.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+# Timings of the request being answered, also seen by the threads async views
+# run their queries on
+current_timings = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def span(name):
+    """
+    Time the block as the span ``name`` of the current request. Spans entered
+    several times in a request add up.
+    """
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_span(name, perf_counter() - start)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_time += perf_counter() - start
+
+
+def install_query_recorder(connection):
+    """Count the queries of ``connection`` towards the current request."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def finish_request(request, response, timings):
+    total = perf_counter() - timings.start
+    match = request.resolver_match
+    view = match.view_name if match else "unmatched"
+    request_duration.observe(total, view, request.method, str(response.status_code))
+    request_queries.observe(timings.queries, view)
+    request_db_duration.observe(timings.db_time, view)
+    for name, seconds in timings.spans.items():
+        request_span_duration.observe(seconds, view, name)
+    if settings.GLUCOSE_SERVER_TIMING:
+        response["Server-Timing"] = timings.server_timing(total)
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    """Times every request, see the module docstring."""
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            timings = RequestTimings()
+            token = current_timings.set(timings)
+            try:
+                response = await get_response(request)
+            finally:
+                current_timings.reset(token)
+            finish_request(request, response, timings)
+            return response
+
+    else:
+
+        def middleware(request):
+            timings = RequestTimings()
+            token = current_timings.set(timings)
+            try:
+                response = get_response(request)
+            finally:
+                current_timings.reset(token)
+            finish_request(request, response, timings)
+            return response
+
+    return middleware
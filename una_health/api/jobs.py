@@ -0,0 +1,136 @@
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .importers import import_glucose_csv
+from .models import ImportJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+# Jobs of this process's host and ID created before it started are orphans of an
+# earlier process that had the same ID
+_started_at = timezone.now()
+
+
+def current_worker():
+    """Identifies the process whose worker pool runs the jobs it schedules."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fail_orphaned_jobs():
+    """
+    Mark the pending and running jobs of processes on this host that are gone
+    as failed, and delete their uploads. Jobs only live in the worker pool of
+    the process that scheduled them, so those of a stopped or restarted process
+    would otherwise never finish. Jobs of other hosts are left to them.
+    """
+    hostname, pid = current_worker().rsplit(":", 1)
+    jobs = ImportJob.objects.filter(
+        status__in=[ImportJob.Status.PENDING, ImportJob.Status.RUNNING],
+        worker__startswith=f"{hostname}:",
+    )
+    for job in jobs:
+        job_pid = job.worker.rsplit(":", 1)[1]
+        if job_pid == pid:
+            if job.created_at >= _started_at:
+                continue
+        elif process_exists(int(job_pid)):
+            continue
+        logger.warning(f"Import job {job.pk} was orphaned by process {job_pid}")
+        job.status = ImportJob.Status.FAILED
+        job.error = "The process running the import stopped before it finished."
+        job.file.delete(save=False)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "file", "finished_at"])
+
+
+def get_executor():
+    """
+    Return the process-wide pool of import workers, creating it on first use.
+    Jobs orphaned by earlier processes are failed before the pool starts.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            fail_orphaned_jobs()
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.GLUCOSE_IMPORT_WORKERS,
+                thread_name_prefix="glucose-import",
+            )
+        return _executor
+
+
+def enqueue_import(job):
+    """
+    Schedule ``job`` on the worker pool once the current transaction commits.
+
+    With ``GLUCOSE_IMPORT_EAGER`` enabled the job runs immediately in the
+    calling thread instead, which is what the test suite relies on.
+    """
+    if settings.GLUCOSE_IMPORT_EAGER:
+        run_import_job(job.pk)
+        job.refresh_from_db()
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run_in_worker, job.pk))
+
+
+def run_in_worker(job_id):
+    close_old_connections()
+    try:
+        run_import_job(job_id)
+    finally:
+        # Worker threads are reused, so never leave a connection open on them
+        connections.close_all()
+
+
+def run_import_job(job_id):
+    job = ImportJob.objects.select_related("user").get(pk=job_id)
+    job.status = ImportJob.Status.RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=["status", "started_at"])
+
+    try:
+        with job.file.open("rb") as file:
+            import_glucose_csv(file, job.user, progress=job.record_progress)
+    except Exception as e:
+        logger.exception(f"Import job {job.pk} failed")
+        job.status = ImportJob.Status.FAILED
+        job.error = str(e)
+    else:
+        job.status = ImportJob.Status.SUCCEEDED
+
+    # The upload isn't needed anymore, a failed import is retried with a new one
+    job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save(
+        update_fields=[
+            "status",
+            "error",
+            "file",
+            "rows_imported",
+            "rows_inserted",
+            "rows_updated",
+            "rows_skipped",
+            "invalid_values",
+            "bytes_processed",
+            "finished_at",
+        ]
+    )
@@ -0,0 +1,265 @@
+"""
+Writers of imported readings.
+
+The importer hands every batch to a loader as plain rows: the device id,
+timestamp and record type of a reading, its values and its texts, in
+``ROW_FIELDS`` order. ``NativeLoader`` writes them with the database's bulk
+loading facilities, ``OrmLoader`` with ``bulk_create``.
+"""
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+
+from .models import TEXT_FIELDS, GlucoseData, GlucoseDataText
+from .partitions import ensure_partitions
+
+# Natural key of a reading, see GlucoseData.Meta.constraints
+READING_KEY_FIELDS = ["user", "device_timestamp", "device", "record_type"]
+# Everything else stored for a reading, updated when an import changes it
+READING_VALUE_FIELDS = [
+    "glucose_history",
+    "glucose_scan",
+    "rapid_acting_insulin",
+    "carbohydrates_grams",
+    "carbohydrates_portions",
+    "depot_insulin",
+    "glucose_test_strips",
+    "ketone",
+    "meal_insulin",
+    "corrective_insulin",
+    "insulin_change_by_user",
+]
+# Columns of a reading besides its user, the first part of every row
+READING_FIELDS = ["device_id", "device_timestamp", "record_type", *READING_VALUE_FIELDS]
+# Layout of the rows the importer passes to loaders
+ROW_FIELDS = [*READING_FIELDS, *TEXT_FIELDS]
+
+# Name of the table a batch is copied into before it is upserted
+COPY_TABLE = "glucose_import_rows"
+# Page cache of SQLite connections during an import, in KiB like PRAGMA
+# cache_size takes negative values
+SQLITE_IMPORT_CACHE_SIZE = 64 * 1024
+
+
+def reading_texts(row):
+    return row[len(READING_FIELDS) :]
+
+
+class OrmLoader:
+    """Writes readings through the ORM, as model instances with ``bulk_create``."""
+
+    def __init__(self, customer):
+        self.customer = customer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def load(self, rows, cleared):
+        """
+        Upsert ``rows`` and their texts, and delete the text rows of the
+        readings with the ``cleared`` keys, ``(device_id, device_timestamp,
+        record_type)`` tuples of readings in ``rows``.
+        """
+        readings = {
+            row[:3]: GlucoseData(user=self.customer, **dict(zip(READING_FIELDS, row)))
+            for row in rows
+        }
+        GlucoseData.objects.bulk_create(
+            readings.values(),
+            update_conflicts=True,
+            unique_fields=READING_KEY_FIELDS,
+            update_fields=READING_VALUE_FIELDS,
+            # write_batch() refreshes the rollups of the whole batch
+            refresh_rollups=False,
+        )
+        # The upsert returned the id of every reading, inserted or updated
+        texts = [
+            GlucoseDataText(
+                reading_id=readings[row[:3]].pk,
+                **dict(zip(TEXT_FIELDS, reading_texts(row))),
+            )
+            for row in rows
+            if any(reading_texts(row))
+        ]
+        if texts:
+            GlucoseDataText.objects.bulk_create(
+                texts,
+                update_conflicts=True,
+                unique_fields=["reading"],
+                update_fields=TEXT_FIELDS,
+            )
+        if cleared:
+            GlucoseDataText.objects.filter(
+                reading__in=[readings[key].pk for key in cleared]
+            ).delete()
+
+
+class NativeLoader:
+    """
+    Writes readings with the database's own bulk loading, without creating
+    model instances.
+
+    On PostgreSQL with psycopg 3 every batch is streamed into a temporary table
+    with a binary ``COPY FROM STDIN`` and upserted from there in one statement.
+    Other databases upsert it with ``executemany`` of one prepared statement,
+    and SQLite gets a larger page cache for the duration of the import. Each
+    batch is written in a single transaction.
+    """
+
+    def __init__(self, customer):
+        self.customer = customer
+        self.cache_size = None
+
+    def __enter__(self):
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA cache_size")
+                (self.cache_size,) = cursor.fetchone()
+                cursor.execute(f"PRAGMA cache_size = -{SQLITE_IMPORT_CACHE_SIZE}")
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.cache_size is not None:
+            with connection.cursor() as cursor:
+                cursor.execute(f"PRAGMA cache_size = {self.cache_size}")
+
+    @property
+    def can_copy(self):
+        # psycopg2 cursors have no copy(), they use the executemany path
+        return (
+            connection.vendor == "postgresql"
+            and connection.Database.__name__ == "psycopg"
+        )
+
+    def load(self, rows, cleared):
+        """Like ``OrmLoader.load()``."""
+        ensure_partitions(GlucoseData._meta.db_table, [row[1] for row in rows])
+        user_id = self.customer.pk
+        adapt = connection.ops.adapt_datetimefield_value
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self.can_copy:
+                self.copy_readings(cursor, rows)
+            else:
+                cursor.executemany(
+                    upsert_readings_sql(),
+                    [
+                        (user_id, row[0], adapt(row[1]), *row[2 : len(READING_FIELDS)])
+                        for row in rows
+                    ],
+                )
+            # Texts find their reading by its key, so the ids of the upserted
+            # readings are never fetched
+            texts = [
+                (*reading_texts(row), user_id, row[0], adapt(row[1]), row[2])
+                for row in rows
+                if any(reading_texts(row))
+            ]
+            if texts:
+                cursor.executemany(upsert_texts_sql(), texts)
+            if cleared:
+                cursor.executemany(
+                    delete_texts_sql(),
+                    [
+                        (user_id, device_id, adapt(device_timestamp), record_type)
+                        for device_id, device_timestamp, record_type in cleared
+                    ],
+                )
+
+    def copy_readings(self, cursor, rows):
+        table = connection.ops.quote_name(GlucoseData._meta.db_table)
+        columns = ", ".join(columns_of(GlucoseData, ["user", *READING_FIELDS]))
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {COPY_TABLE} AS "
+            f"SELECT {columns} FROM {table} WITH NO DATA"
+        )
+        with cursor.copy(
+            f"COPY {COPY_TABLE} ({columns}) FROM STDIN (FORMAT BINARY)"
+        ) as copy:
+            copy.set_types(
+                ["varchar", "varchar", "timestamptz"]
+                + [copy_type(field_name) for field_name in READING_FIELDS[2:]]
+            )
+            user_id = self.customer.pk
+            for row in rows:
+                copy.write_row((user_id, *row[: len(READING_FIELDS)]))
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {COPY_TABLE} "
+            f"{upsert_suffix_sql(GlucoseData, READING_KEY_FIELDS, READING_VALUE_FIELDS)}"
+        )
+        cursor.execute(f"DROP TABLE {COPY_TABLE}")
+
+
+def copy_type(field_name):
+    """PostgreSQL type a value column of a reading is copied as."""
+    field = GlucoseData._meta.get_field(field_name)
+    return "numeric" if field.get_internal_type() == "DecimalField" else "int2"
+
+
+def columns_of(model, field_names):
+    """Quoted columns of the fields of ``model`` named ``field_names``."""
+    return [
+        connection.ops.quote_name(model._meta.get_field(field_name).column)
+        for field_name in field_names
+    ]
+
+
+def upsert_suffix_sql(model, unique_fields, update_fields):
+    get_field = model._meta.get_field
+    return connection.ops.on_conflict_suffix_sql(
+        model._meta.concrete_fields,
+        OnConflict.UPDATE,
+        [get_field(field_name).column for field_name in update_fields],
+        [get_field(field_name).column for field_name in unique_fields],
+    )
+
+
+def reading_key_sql(select):
+    """Query selecting ``select`` from the reading with the key of a row."""
+    key = columns_of(GlucoseData, ["user", "device", "device_timestamp", "record_type"])
+    return (
+        f"SELECT {select} "
+        f"FROM {connection.ops.quote_name(GlucoseData._meta.db_table)} "
+        f"WHERE {' AND '.join(f'{column} = %s' for column in key)}"
+    )
+
+
+def upsert_readings_sql():
+    columns = columns_of(GlucoseData, ["user", *READING_FIELDS])
+    return (
+        f"INSERT INTO {connection.ops.quote_name(GlucoseData._meta.db_table)} "
+        f"({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"{upsert_suffix_sql(GlucoseData, READING_KEY_FIELDS, READING_VALUE_FIELDS)}"
+    )
+
+
+def upsert_texts_sql():
+    # The SELECT needs its WHERE clause on SQLite, which would otherwise parse
+    # ON CONFLICT as part of a join
+    columns = columns_of(GlucoseDataText, ["reading", *TEXT_FIELDS])
+    (reading_id,) = columns_of(GlucoseData, ["id"])
+    select = ", ".join([reading_id] + ["%s"] * len(TEXT_FIELDS))
+    return (
+        f"INSERT INTO {connection.ops.quote_name(GlucoseDataText._meta.db_table)} "
+        f"({', '.join(columns)}) {reading_key_sql(select)} "
+        f"{upsert_suffix_sql(GlucoseDataText, ['reading'], TEXT_FIELDS)}"
+    )
+
+
+def delete_texts_sql():
+    return (
+        f"DELETE FROM {connection.ops.quote_name(GlucoseDataText._meta.db_table)} "
+        f"WHERE {columns_of(GlucoseDataText, ['reading'])[0]} "
+        f"IN ({reading_key_sql(columns_of(GlucoseData, ['id'])[0])})"
+    )
+
+
+LOADERS = {"native": NativeLoader, "orm": OrmLoader}
+
+
+def get_loader(customer):
+    """Loader for the readings of ``customer``, see ``GLUCOSE_IMPORT_LOADER``."""
+    return LOADERS[settings.GLUCOSE_IMPORT_LOADER](customer)
@@ -0,0 +1,33 @@
+from api.models import GlucoseData
+from api.partitions import (
+    ensure_partitions,
+    months_between,
+    next_month,
+    supports_partitions,
+)
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Create the monthly glucose data partitions of the coming months."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=3,
+            help="Number of months after the current one to create (default 3).",
+        )
+
+    def handle(self, *args, months, **options):
+        if not supports_partitions(connection):
+            self.stdout.write(f"Partitions are not used on {connection.vendor}.")
+            return
+        start = stop = timezone.now()
+        for _ in range(months):
+            stop = next_month(stop.replace(day=1))
+        months = list(months_between(start, stop))
+        ensure_partitions(GlucoseData._meta.db_table, months)
+        self.stdout.write(f"Ensured the partitions of {len(months)} months.")
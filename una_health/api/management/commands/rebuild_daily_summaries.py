@@ -0,0 +1,26 @@
+from api.caching import invalidate_user
+from api.models import Customer
+from api.rollups import rebuild_daily_summaries
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily glucose rollups from the raw readings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "user_ids",
+            nargs="*",
+            help="Users to rebuild the rollups of, all users when left out.",
+        )
+
+    def handle(self, *args, user_ids, **options):
+        if not user_ids:
+            user_ids = list(Customer.objects.values_list("user_id", flat=True))
+        for user_id in user_ids:
+            # One transaction per user, readers never see half rebuilt rollups
+            with transaction.atomic():
+                rebuild_daily_summaries(user_id)
+                transaction.on_commit(lambda user_id=user_id: invalidate_user(user_id))
+        self.stdout.write(f"Rebuilt the daily summaries of {len(user_ids)} users.")
@@ -0,0 +1,127 @@
+from math import sqrt
+
+from django.conf import settings
+
+from .aggregates import GLUCOSE_CHANNELS
+
+# Consensus target range in mg/dL, readings below 70 or above 180 are out
+TARGET_RANGE = (70, 180)
+
+
+class ChannelMetrics:
+    """
+    Time weighted glycemic metrics of one glucose channel of one user.
+
+    Every reading stands for the time until the next reading, capped at
+    ``max_gap`` seconds so that gaps in the data, e.g. while no sensor was
+    worn, are not attributed to the reading before them. The last reading
+    stands for as long as the one before it, a single reading for
+    ``max_gap``.
+    """
+
+    def __init__(self, max_gap):
+        self.max_gap = max_gap
+        self.count = 0
+        self.weight = 0.0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.below = 0.0
+        self.above = 0.0
+        self.previous = None
+        self.previous_seconds = max_gap
+
+    def add(self, timestamp, value):
+        if self.previous is not None:
+            previous_timestamp, previous_value = self.previous
+            seconds = (timestamp - previous_timestamp).total_seconds()
+            self.previous_seconds = min(seconds, self.max_gap)
+            self.weigh(previous_value, self.previous_seconds)
+        self.previous = timestamp, value
+        self.count += 1
+
+    def weigh(self, value, seconds):
+        self.weight += seconds
+        self.total += value * seconds
+        self.total_squares += value * value * seconds
+        low, high = TARGET_RANGE
+        if value < low:
+            self.below += seconds
+        elif value > high:
+            self.above += seconds
+
+    def finish(self):
+        if self.previous is not None:
+            self.weigh(self.previous[1], self.previous_seconds)
+            self.previous = None
+        if not self.weight:
+            return {
+                "count": self.count,
+                "covered_minutes": 0,
+                "mean": None,
+                "gmi": None,
+                "cv": None,
+                "time_below_range": None,
+                "time_in_range": None,
+                "time_above_range": None,
+            }
+
+        mean = self.total / self.weight
+        variance = max(self.total_squares / self.weight - mean * mean, 0)
+        below = self.below / self.weight * 100
+        above = self.above / self.weight * 100
+        return {
+            "count": self.count,
+            "covered_minutes": round(self.weight / 60),
+            "mean": round(mean, 2),
+            # Glucose management indicator, an estimate of HbA1c in percent
+            "gmi": round(3.31 + 0.02392 * mean, 2),
+            "cv": round(sqrt(variance) / mean * 100, 2) if mean else None,
+            "time_below_range": round(below, 2),
+            "time_in_range": round(100 - below - above, 2),
+            "time_above_range": round(above, 2),
+        }
+
+
+def empty_metrics(user_id):
+    max_gap = settings.GLUCOSE_METRICS_MAX_GAP
+    return {
+        "user_id": user_id,
+        **{channel: ChannelMetrics(max_gap).finish() for channel in GLUCOSE_CHANNELS},
+    }
+
+
+def glucose_metrics(queryset):
+    """
+    Yield the glycemic metrics of both glucose channels for every user with
+    readings in ``queryset``, in order of user ID.
+
+    The readings are read in a single pass ordered by user and time, which
+    the (user, device_timestamp) index delivers without sorting.
+    """
+    max_gap = settings.GLUCOSE_METRICS_MAX_GAP
+    rows = (
+        queryset.order_by("user", "device_timestamp")
+        .values_list("user_id", "device_timestamp", *GLUCOSE_CHANNELS)
+        .iterator(chunk_size=settings.GLUCOSE_EXPORT_CHUNK_SIZE)
+    )
+    user_id = channels = None
+    for row_user_id, timestamp, *values in rows:
+        if row_user_id != user_id:
+            if channels is not None:
+                yield user_metrics(user_id, channels)
+            user_id = row_user_id
+            channels = {
+                channel: ChannelMetrics(max_gap) for channel in GLUCOSE_CHANNELS
+            }
+        for channel, value in zip(GLUCOSE_CHANNELS, values):
+            if value is not None:
+                channels[channel].add(timestamp, value)
+    if channels is not None:
+        yield user_metrics(user_id, channels)
+
+
+def user_metrics(user_id, channels):
+    return {
+        "user_id": user_id,
+        **{channel: metrics.finish() for channel, metrics in channels.items()},
+    }
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0002_importjob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="glucosedata",
+            index=models.Index(
+                fields=["user", "device_timestamp"],
+                include=("glucose_history", "glucose_scan"),
+                name="glucose_user_timestamp_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="glucosedata",
+            index=models.Index(
+                fields=["device_timestamp"], name="glucose_timestamp_idx"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="api.customer",
+            ),
+        ),
+    ]
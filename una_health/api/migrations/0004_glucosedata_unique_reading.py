@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:30
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def delete_duplicate_readings(apps, schema_editor):
+    # Keep the oldest row of every reading that was imported more than once
+    GlucoseData = apps.get_model("api", "GlucoseData")
+    first_ids = (
+        GlucoseData.objects.values("user", "device_timestamp", "device", "record_type")
+        .annotate(first_id=Min("id"))
+        .values("first_id")
+    )
+    GlucoseData.objects.exclude(id__in=first_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0003_glucosedata_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_inserted",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_skipped",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="importjob",
+            name="rows_updated",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(delete_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="glucosedata",
+            constraint=models.UniqueConstraint(
+                fields=("user", "device_timestamp", "device", "record_type"),
+                name="glucose_unique_reading",
+            ),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:37
+
+from collections import Counter, defaultdict
+from datetime import timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+CHANNELS = ("glucose_history", "glucose_scan")
+
+
+def build_daily_summaries(apps, schema_editor):
+    # Roll up the readings imported so far, later imports keep them current
+    GlucoseData = apps.get_model("api", "GlucoseData")
+    GlucoseDailySummary = apps.get_model("api", "GlucoseDailySummary")
+    days = defaultdict(lambda: {channel: Counter() for channel in CHANNELS})
+    rows = GlucoseData.objects.values_list("user_id", "device_timestamp", *CHANNELS)
+    for user_id, timestamp, *values in rows.iterator():
+        histograms = days[user_id, timestamp.astimezone(timezone.utc).date()]
+        for channel, value in zip(CHANNELS, values):
+            if value is not None:
+                histograms[channel][value] += 1
+
+    summaries = []
+    for (user_id, day), histograms in days.items():
+        summary = GlucoseDailySummary(user_id=user_id, day=day)
+        for channel, histogram in histograms.items():
+            items = histogram.items()
+            setattr(summary, f"{channel}_count", sum(histogram.values()))
+            setattr(summary, f"{channel}_min", min(histogram, default=None))
+            setattr(summary, f"{channel}_max", max(histogram, default=None))
+            setattr(summary, f"{channel}_sum", sum(v * n for v, n in items))
+            setattr(summary, f"{channel}_sum_squares", sum(v * v * n for v, n in items))
+            setattr(
+                summary,
+                f"{channel}_histogram",
+                {str(v): n for v, n in sorted(items)},
+            )
+        summaries.append(summary)
+    GlucoseDailySummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0004_glucosedata_unique_reading"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GlucoseDailySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("glucose_history_count", models.PositiveIntegerField(default=0)),
+                ("glucose_history_min", models.IntegerField(null=True)),
+                ("glucose_history_max", models.IntegerField(null=True)),
+                ("glucose_history_sum", models.BigIntegerField(default=0)),
+                ("glucose_history_sum_squares", models.BigIntegerField(default=0)),
+                ("glucose_history_histogram", models.JSONField(default=dict)),
+                ("glucose_scan_count", models.PositiveIntegerField(default=0)),
+                ("glucose_scan_min", models.IntegerField(null=True)),
+                ("glucose_scan_max", models.IntegerField(null=True)),
+                ("glucose_scan_sum", models.BigIntegerField(default=0)),
+                ("glucose_scan_sum_squares", models.BigIntegerField(default=0)),
+                ("glucose_scan_histogram", models.JSONField(default=dict)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="api.customer",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "glucose daily summaries",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="glucosedailysummary",
+            constraint=models.UniqueConstraint(
+                fields=("user", "day"), name="glucose_daily_summary_unique_day"
+            ),
+        ),
+        migrations.RunPython(build_daily_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+
+def next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def rebuild_table(schema_editor, table, partitioned):
+    """
+    Copy ``table`` into a new table of the same name, partitioned by month of
+    device_timestamp if ``partitioned`` and a single table otherwise.
+
+    Partitioned tables need the partition key in their primary key, so the
+    primary key is (id, device_timestamp) on the partitioned table and (id)
+    on the single one. Ids are still unique since they come from one identity
+    sequence. Foreign keys, unique constraints and indexes are recreated from
+    their definitions in the catalog, under their old names.
+    """
+    connection = schema_editor.connection
+    old_table = f"{table}_old"
+    quote = schema_editor.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')",
+            [quote(table)],
+        )
+        constraints = cursor.fetchall()
+        # Indexes of the constraints above are created with them
+        cursor.execute(
+            "SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) "
+            "FROM pg_index WHERE indrelid = %s::regclass AND NOT EXISTS ("
+            "SELECT 1 FROM pg_constraint WHERE conindid = indexrelid)",
+            [quote(table)],
+        )
+        indexes = cursor.fetchall()
+
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+    # Index and constraint names are unique per schema, the new table reuses them
+    for name, _, _ in constraints:
+        schema_editor.execute(
+            f"ALTER TABLE {quote(old_table)} DROP CONSTRAINT {quote(name)}"
+        )
+    for name, _ in indexes:
+        schema_editor.execute(f"DROP INDEX {name}")
+
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} "
+        f"(LIKE {quote(old_table)} INCLUDING DEFAULTS INCLUDING IDENTITY "
+        "INCLUDING CONSTRAINTS)"
+        + (f" PARTITION BY RANGE ({quote('device_timestamp')})" if partitioned else "")
+    )
+    primary_key = ["id", "device_timestamp"] if partitioned else ["id"]
+    schema_editor.execute(
+        f"ALTER TABLE {quote(table)} "
+        f"ADD PRIMARY KEY ({', '.join(map(quote, primary_key))})"
+    )
+
+    if partitioned:
+        # One partition per month with readings, later months are created on
+        # demand when readings for them are inserted
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT MIN(device_timestamp), MAX(device_timestamp) "
+                f"FROM {quote(old_table)}"
+            )
+            first, last = cursor.fetchone()
+        if first is not None:
+            first, last = first.astimezone(timezone.utc), last.astimezone(timezone.utc)
+            month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+            while month <= last:
+                partition = f"{table}_y{month.year}m{month.month:02d}"
+                schema_editor.execute(
+                    f"CREATE TABLE {quote(partition)} PARTITION OF {quote(table)} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') "
+                    f"TO ('{next_month(month).isoformat()}')"
+                )
+                month = next_month(month)
+
+    schema_editor.execute(
+        f"INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}"
+    )
+    schema_editor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {quote(table)}"
+    )
+    # Partitions of a partitioned old table are dropped with it
+    schema_editor.execute(f"DROP TABLE {quote(old_table)}")
+
+    # Indexes on a partitioned table are created on every partition
+    for name, kind, definition in constraints:
+        if kind != "p":
+            schema_editor.execute(
+                f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}"
+            )
+    for _, definition in indexes:
+        schema_editor.execute(definition)
+
+
+def partition_glucose_data(apps, schema_editor):
+    """
+    Turn the readings table into a table partitioned by month of
+    device_timestamp on PostgreSQL, other databases keep a single table.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    table = apps.get_model("api", "GlucoseData")._meta.db_table
+    rebuild_table(schema_editor, table, partitioned=True)
+
+
+def unpartition_glucose_data(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    table = apps.get_model("api", "GlucoseData")._meta.db_table
+    rebuild_table(schema_editor, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0005_glucosedailysummary"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_glucose_data, unpartition_glucose_data),
+    ]
@@ -0,0 +1,245 @@
+# Generated by Django 5.0.4 on 2026-10-18 10:58
+
+from collections import Counter, defaultdict
+from datetime import timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q
+
+TEXT_FIELDS = [
+    "non_numeric_rapid_acting_insulin",
+    "non_numeric_food_data",
+    "non_numeric_depot_insulin",
+    "notes",
+]
+SMALL_INTEGER_FIELDS = [
+    "glucose_history",
+    "glucose_scan",
+    "rapid_acting_insulin",
+    "carbohydrates_grams",
+    "carbohydrates_portions",
+    "depot_insulin",
+    "glucose_test_strips",
+    "ketone",
+    "meal_insulin",
+    "corrective_insulin",
+    "insulin_change_by_user",
+]
+CHANNELS = ("glucose_history", "glucose_scan")
+BATCH_SIZE = 1000
+
+
+def out_of_range(field):
+    return Q(**{f"{field}__gt": 32767}) | Q(**{f"{field}__lt": -32768})
+
+
+def rebuild_daily_summaries(apps, user_ids):
+    """Recompute the daily rollups of ``user_ids`` like migration 0005."""
+    GlucoseData = apps.get_model("api", "GlucoseData")
+    GlucoseDailySummary = apps.get_model("api", "GlucoseDailySummary")
+    days = defaultdict(lambda: {channel: Counter() for channel in CHANNELS})
+    rows = GlucoseData.objects.filter(user_id__in=user_ids).values_list(
+        "user_id", "device_timestamp", *CHANNELS
+    )
+    for user_id, timestamp, *values in rows.iterator(chunk_size=BATCH_SIZE):
+        histograms = days[user_id, timestamp.astimezone(timezone.utc).date()]
+        for channel, value in zip(CHANNELS, values):
+            if value is not None:
+                histograms[channel][value] += 1
+
+    summaries = []
+    for (user_id, day), histograms in days.items():
+        summary = GlucoseDailySummary(user_id=user_id, day=day)
+        for channel, histogram in histograms.items():
+            items = histogram.items()
+            setattr(summary, f"{channel}_count", sum(histogram.values()))
+            setattr(summary, f"{channel}_min", min(histogram, default=None))
+            setattr(summary, f"{channel}_max", max(histogram, default=None))
+            setattr(summary, f"{channel}_sum", sum(v * n for v, n in items))
+            setattr(summary, f"{channel}_sum_squares", sum(v * v * n for v, n in items))
+            setattr(
+                summary,
+                f"{channel}_histogram",
+                {str(v): n for v, n in sorted(items)},
+            )
+        summaries.append(summary)
+    GlucoseDailySummary.objects.filter(user_id__in=user_ids).delete()
+    GlucoseDailySummary.objects.bulk_create(summaries, batch_size=BATCH_SIZE)
+
+
+def move_text_and_shrink_values(apps, schema_editor):
+    GlucoseData = apps.get_model("api", "GlucoseData")
+    GlucoseDataText = apps.get_model("api", "GlucoseDataText")
+    # Only readings with some text get a text row, empty texts are ""
+    has_text = Q()
+    for field in TEXT_FIELDS:
+        has_text |= ~Q(**{field: ""}) & Q(**{f"{field}__isnull": False})
+    rows = (
+        GlucoseData.objects.filter(has_text)
+        .values_list("id", *TEXT_FIELDS)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for reading_id, *texts in rows:
+        batch.append(
+            GlucoseDataText(
+                reading_id=reading_id,
+                **{field: text or "" for field, text in zip(TEXT_FIELDS, texts)},
+            )
+        )
+        if len(batch) >= BATCH_SIZE:
+            GlucoseDataText.objects.bulk_create(batch)
+            batch = []
+    GlucoseDataText.objects.bulk_create(batch)
+
+    # Values that don't fit two bytes are dropped like non-numeric cells. The
+    # rollups of the users who lose glucose values are rebuilt without them.
+    user_ids = set(
+        GlucoseData.objects.filter(
+            out_of_range(CHANNELS[0]) | out_of_range(CHANNELS[1])
+        )
+        .values_list("user_id", flat=True)
+        .distinct()
+    )
+    for field in SMALL_INTEGER_FIELDS:
+        GlucoseData.objects.filter(out_of_range(field)).update(**{field: None})
+    if user_ids:
+        rebuild_daily_summaries(apps, user_ids)
+
+
+def move_text_back(apps, schema_editor):
+    GlucoseData = apps.get_model("api", "GlucoseData")
+    GlucoseDataText = apps.get_model("api", "GlucoseDataText")
+    readings = []
+    for text in GlucoseDataText.objects.iterator(chunk_size=BATCH_SIZE):
+        reading = GlucoseData(id=text.reading_id)
+        for field in TEXT_FIELDS:
+            setattr(reading, field, getattr(text, field))
+        readings.append(reading)
+    GlucoseData.objects.bulk_update(readings, TEXT_FIELDS, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0006_partition_glucosedata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GlucoseDataText",
+            fields=[
+                (
+                    "reading",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="text",
+                        serialize=False,
+                        to="api.glucosedata",
+                    ),
+                ),
+                (
+                    "non_numeric_rapid_acting_insulin",
+                    models.CharField(blank=True, max_length=255),
+                ),
+                ("non_numeric_food_data", models.CharField(blank=True, max_length=255)),
+                (
+                    "non_numeric_depot_insulin",
+                    models.CharField(blank=True, max_length=255),
+                ),
+                ("notes", models.CharField(blank=True, max_length=255)),
+            ],
+            options={
+                "verbose_name": "glucose data text",
+            },
+        ),
+        migrations.RunPython(move_text_and_shrink_values, move_text_back),
+        migrations.RemoveField(
+            model_name="glucosedata",
+            name="non_numeric_depot_insulin",
+        ),
+        migrations.RemoveField(
+            model_name="glucosedata",
+            name="non_numeric_food_data",
+        ),
+        migrations.RemoveField(
+            model_name="glucosedata",
+            name="non_numeric_rapid_acting_insulin",
+        ),
+        migrations.RemoveField(
+            model_name="glucosedata",
+            name="notes",
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="carbohydrates_grams",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="carbohydrates_portions",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="corrective_insulin",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="depot_insulin",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="glucose_history",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="glucose_scan",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="glucose_test_strips",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="insulin_change_by_user",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="ketone",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="meal_insulin",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="rapid_acting_insulin",
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="record_type",
+            field=models.PositiveSmallIntegerField(
+                choices=[
+                    (0, "Historic Glucose"),
+                    (1, "Scan Glucose"),
+                    (2, "Strip Glucose"),
+                    (3, "Ketone"),
+                    (4, "Insulin"),
+                    (5, "Food"),
+                    (6, "Time Change"),
+                ]
+            ),
+        ),
+    ]
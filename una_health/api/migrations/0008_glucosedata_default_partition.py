@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_default_partition(apps, schema_editor):
+    """
+    Add a default partition to the readings table on PostgreSQL, which takes
+    the readings of months without a partition of their own.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    table = apps.get_model("api", "GlucoseData")._meta.db_table
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(f'{table}_default')} PARTITION OF {quote(table)} "
+        "DEFAULT"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0007_glucosedata_compact_storage"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_default_partition, migrations.RunPython.noop),
+    ]
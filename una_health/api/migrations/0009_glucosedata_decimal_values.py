@@ -0,0 +1,61 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0008_glucosedata_default_partition"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="carbohydrates_portions",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=7, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="corrective_insulin",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=7, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="depot_insulin",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=7, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="insulin_change_by_user",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=7, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="ketone",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=7, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="meal_insulin",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=7, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="glucosedata",
+            name="rapid_acting_insulin",
+            field=models.DecimalField(
+                blank=True, decimal_places=2, max_digits=7, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0009_glucosedata_decimal_values"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="invalid_values",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
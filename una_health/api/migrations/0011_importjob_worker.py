@@ -0,0 +1,17 @@
+# Generated by Django 5.0.4 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("api", "0010_importjob_invalid_values"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importjob",
+            name="worker",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+from .partitions import ensure_partitions
 
 # Create your models here.
 
@@ -19,25 +23,259 @@ class Device(models.Model):
         return self.serial_number
 
 
+# Fields the daily rollups of the readings are computed from
+ROLLUP_FIELDS = {"user", "device_timestamp", "glucose_history", "glucose_scan"}
+
+
+class GlucoseDataQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, refresh_rollups=True, **kwargs):
+        """
+        Like ``QuerySet.bulk_create()``, but creates the monthly partitions the
+        readings go to and refreshes the daily rollups of their days. Imports,
+        which refresh the rollups once per batch, pass ``refresh_rollups=False``.
+        """
+        from .rollups import refresh_reading_days
+
+        objs = list(objs)
+        ensure_partitions(
+            self.model._meta.db_table,
+            [obj.device_timestamp for obj in objs],
+            using=self.db,
+        )
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            if refresh_rollups:
+                refresh_reading_days(
+                    (obj.user_id, obj.device_timestamp) for obj in objs
+                )
+        return created
+
+    def update(self, **kwargs):
+        """
+        Like ``QuerySet.update()``, but refreshes the daily rollups of the days
+        the readings were on and are on afterwards when the update changes a
+        field they are computed from.
+        """
+        from .rollups import refresh_reading_days
+
+        fields = {self.model._meta.get_field(name).name for name in kwargs}
+        if not fields & ROLLUP_FIELDS:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            readings = list(self.values_list("pk", "user_id", "device_timestamp"))
+            updated = super().update(**kwargs)
+            days = {(user_id, timestamp) for _, user_id, timestamp in readings}
+            if fields & {"user", "device_timestamp"}:
+                days.update(
+                    self.model._base_manager.using(self.db)
+                    .filter(pk__in=[pk for pk, *_ in readings])
+                    .values_list("user_id", "device_timestamp")
+                )
+            refresh_reading_days(days)
+        return updated
+
+    def with_text(self, *fields):
+        """
+        Annotate the text ``fields`` of every reading, all of them by default,
+        from the sparse ``GlucoseDataText`` table. Readings without a text row
+        get empty strings.
+        """
+        return self.annotate(
+            **{
+                field: Coalesce(f"text__{field}", Value(""))
+                for field in fields or TEXT_FIELDS
+            }
+        )
+
+
 class GlucoseData(models.Model):
-    user = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    # Lookups by user are served by the (user, device_timestamp) index below
+    user = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
     device = models.ForeignKey(Device, on_delete=models.SET_NULL, null=True)
     device_timestamp = models.DateTimeField()
-    record_type = models.IntegerField()
-    glucose_history = models.IntegerField(null=True, blank=True)
-    glucose_scan = models.IntegerField(null=True, blank=True)
-    non_numeric_rapid_acting_insulin = models.CharField(
-        max_length=255, null=True, blank=True
-    )
-    rapid_acting_insulin = models.IntegerField(null=True, blank=True)
-    non_numeric_food_data = models.CharField(max_length=255, null=True, blank=True)
-    carbohydrates_grams = models.IntegerField(null=True, blank=True)
-    carbohydrates_portions = models.IntegerField(null=True, blank=True)
-    non_numeric_depot_insulin = models.CharField(max_length=255, null=True, blank=True)
-    depot_insulin = models.IntegerField(null=True, blank=True)
-    notes = models.CharField(max_length=255, null=True, blank=True)
-    glucose_test_strips = models.IntegerField(null=True, blank=True)
-    ketone = models.IntegerField(null=True, blank=True)
-    meal_insulin = models.IntegerField(null=True, blank=True)
-    corrective_insulin = models.IntegerField(null=True, blank=True)
-    insulin_change_by_user = models.IntegerField(null=True, blank=True)
+
+    class RecordType(models.IntegerChoices):
+        # Record types of LibreView exports, other types are stored as they are
+        HISTORIC_GLUCOSE = 0
+        SCAN_GLUCOSE = 1
+        STRIP_GLUCOSE = 2
+        KETONE = 3
+        INSULIN = 4
+        FOOD = 5
+        TIME_CHANGE = 6
+
+    # Counts are stored in two byte integers, values with fractional units like
+    # insulin doses and ketones with two decimal places, and the text cells of
+    # a reading in GlucoseDataText, which keeps rows small so more of them stay
+    # cached
+    record_type = models.PositiveSmallIntegerField(choices=RecordType.choices)
+    glucose_history = models.SmallIntegerField(null=True, blank=True)
+    glucose_scan = models.SmallIntegerField(null=True, blank=True)
+    rapid_acting_insulin = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True
+    )
+    carbohydrates_grams = models.SmallIntegerField(null=True, blank=True)
+    carbohydrates_portions = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True
+    )
+    depot_insulin = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True
+    )
+    glucose_test_strips = models.SmallIntegerField(null=True, blank=True)
+    ketone = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    meal_insulin = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True
+    )
+    corrective_insulin = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True
+    )
+    insulin_change_by_user = models.DecimalField(
+        max_digits=7, decimal_places=2, null=True, blank=True
+    )
+
+    objects = GlucoseDataQuerySet.as_manager()
+
+    class Meta:
+        # On PostgreSQL the table is partitioned by month of device_timestamp,
+        # see migration 0006 and api.partitions
+        indexes = [
+            # Every read endpoint filters by user and a device_timestamp range and
+            # orders by device_timestamp. On PostgreSQL the glucose values are
+            # included so the statistics queries are answered from the index.
+            models.Index(
+                fields=["user", "device_timestamp"],
+                include=["glucose_history", "glucose_scan"],
+                name="glucose_user_timestamp_idx",
+            ),
+            # Time range queries across all users
+            models.Index(fields=["device_timestamp"], name="glucose_timestamp_idx"),
+        ]
+        constraints = [
+            # A reading is identified by who, which device, when and what kind.
+            # Re-importing an export upserts on this key instead of duplicating.
+            models.UniqueConstraint(
+                fields=["user", "device_timestamp", "device", "record_type"],
+                name="glucose_unique_reading",
+            ),
+        ]
+
+
+# Free text cells of a reading, stored in GlucoseDataText
+TEXT_FIELDS = [
+    "non_numeric_rapid_acting_insulin",
+    "non_numeric_food_data",
+    "non_numeric_depot_insulin",
+    "notes",
+]
+
+
+class GlucoseDataText(models.Model):
+    """
+    Free text cells of a reading that has any.
+
+    Most readings, like every CGM history reading, have no text, so rows only
+    exist for the few that do. Readings without a row have empty texts.
+    """
+
+    # There is no database foreign key since the partitioned readings table on
+    # PostgreSQL has no unique constraint on id alone; the ORM still cascades
+    reading = models.OneToOneField(
+        GlucoseData,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="text",
+        db_constraint=False,
+    )
+    non_numeric_rapid_acting_insulin = models.CharField(max_length=255, blank=True)
+    non_numeric_food_data = models.CharField(max_length=255, blank=True)
+    non_numeric_depot_insulin = models.CharField(max_length=255, blank=True)
+    notes = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        verbose_name = "glucose data text"
+
+    def __str__(self) -> str:
+        return str(self.reading_id)
+
+
+class GlucoseDailySummary(models.Model):
+    """
+    Readings of a user on one UTC day rolled up per glucose channel.
+
+    Besides count, min, max, sum and sum of squares the rollup keeps the
+    number of readings per glucose value, so percentiles over many days can
+    be computed from rollups alone. Kept up to date by the importer.
+    """
+
+    # Lookups by user are served by the unique (user, day) constraint
+    user = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
+    day = models.DateField()
+    glucose_history_count = models.PositiveIntegerField(default=0)
+    glucose_history_min = models.IntegerField(null=True)
+    glucose_history_max = models.IntegerField(null=True)
+    glucose_history_sum = models.BigIntegerField(default=0)
+    glucose_history_sum_squares = models.BigIntegerField(default=0)
+    glucose_history_histogram = models.JSONField(default=dict)
+    glucose_scan_count = models.PositiveIntegerField(default=0)
+    glucose_scan_min = models.IntegerField(null=True)
+    glucose_scan_max = models.IntegerField(null=True)
+    glucose_scan_sum = models.BigIntegerField(default=0)
+    glucose_scan_sum_squares = models.BigIntegerField(default=0)
+    glucose_scan_histogram = models.JSONField(default=dict)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "day"], name="glucose_daily_summary_unique_day"
+            ),
+        ]
+        verbose_name_plural = "glucose daily summaries"
+
+
+class ImportJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        SUCCEEDED = "succeeded"
+        FAILED = "failed"
+
+    user = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    file = models.FileField(upload_to="imports/", blank=True)
+    file_size = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING
+    )
+    bytes_processed = models.PositiveBigIntegerField(default=0)
+    # Host name and process ID of the web process whose worker pool runs the job
+    worker = models.CharField(max_length=255, blank=True)
+    # Rows read from the file, split into inserted, updated and unchanged rows
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_inserted = models.PositiveIntegerField(default=0)
+    rows_updated = models.PositiveIntegerField(default=0)
+    rows_skipped = models.PositiveIntegerField(default=0)
+    # Numeric cells imported as empty because their value can't be stored, and
+    # record types of rows left out for lacking a valid one
+    invalid_values = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.user_id} ({self.status})"
+
+    def record_progress(self, counts, bytes_processed):
+        self.rows_inserted = counts["inserted"]
+        self.rows_updated = counts["updated"]
+        self.rows_skipped = counts["skipped"]
+        self.invalid_values = counts["invalid"]
+        self.rows_imported = self.rows_inserted + self.rows_updated + self.rows_skipped
+        self.bytes_processed = bytes_processed
+        ImportJob.objects.filter(pk=self.pk).update(
+            rows_imported=self.rows_imported,
+            rows_inserted=self.rows_inserted,
+            rows_updated=self.rows_updated,
+            rows_skipped=self.rows_skipped,
+            invalid_values=self.invalid_values,
+            bytes_processed=self.bytes_processed,
+        )
@@ -0,0 +1,145 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class GlucoseDataPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination with an opt-in keyset (cursor) mode.
+
+    Passing the ``cursor`` query parameter, empty for the first page, switches
+    to pages keyed on ``(device_timestamp, id)``. Each page then seeks straight
+    to its first row through the (user, device_timestamp) index, so the cost
+    of a page does not depend on how deep it is, and no count query is run.
+    The ``ordering`` parameter decides whether pages run forwards or
+    backwards in time.
+    """
+
+    cursor_query_param = "cursor"
+    cursor_default_limit = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        # One extra row tells whether there is another page
+        queryset = self.keyset_queryset(queryset, request)
+        return self.keyset_page(list(queryset[: self.limit + 1]))
+
+    async def apaginate_queryset(self, queryset, request):
+        """``paginate_queryset`` for async views, rows are fetched asynchronously."""
+        self.keyset = self.cursor_query_param in request.query_params
+        if self.keyset:
+            queryset = self.keyset_queryset(queryset, request)
+            return self.keyset_page([row async for row in queryset[: self.limit + 1]])
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.count = await queryset.acount()
+        self.offset = self.get_offset(request)
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return [row async for row in queryset[self.offset : self.offset + self.limit]]
+
+    def keyset_queryset(self, queryset, request):
+        """Order ``queryset`` for the requested cursor page and seek past the cursor."""
+        self.request = request
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), self.offset_query_param
+        )
+        self.limit = self.get_limit(request) or self.cursor_default_limit
+        position, self.reverse = self.decode_cursor(request)
+        self.has_position = position is not None
+
+        # Newest first when the client asked for a descending ordering
+        ordering = queryset.query.order_by
+        descending = bool(ordering) and ordering[0] == "-device_timestamp"
+        backwards = descending != self.reverse
+        if backwards:
+            queryset = queryset.order_by("-device_timestamp", "-id")
+        else:
+            queryset = queryset.order_by("device_timestamp", "id")
+
+        if position is not None:
+            timestamp, pk = position
+            # (device_timestamp, id) past the cursor, written as a range on
+            # device_timestamp so the index can be used
+            if backwards:
+                queryset = queryset.filter(device_timestamp__lte=timestamp).exclude(
+                    device_timestamp=timestamp, id__gte=pk
+                )
+            else:
+                queryset = queryset.filter(device_timestamp__gte=timestamp).exclude(
+                    device_timestamp=timestamp, id__lte=pk
+                )
+        return queryset
+
+    def keyset_page(self, results):
+        """Page of ``results``, fetched from ``keyset_queryset`` with one extra row."""
+        has_more = len(results) > self.limit
+        results = results[: self.limit]
+        if self.reverse:
+            results.reverse()
+            has_next, has_previous = self.has_position, has_more
+        else:
+            has_next, has_previous = has_more, self.has_position
+
+        self.next_position = (
+            self.get_position(results[-1]) if has_next and results else None
+        )
+        self.previous_position = (
+            self.get_position(results[0]) if has_previous and results else None
+        )
+        return results
+
+    def get_position(self, item):
+        return item.device_timestamp, item.id
+
+    def encode_cursor(self, position, reverse):
+        timestamp, pk = position
+        token = f"{timestamp.isoformat()}|{pk}|{int(reverse)}"
+        encoded = urlsafe_b64encode(token.encode("ascii")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            token = urlsafe_b64decode(encoded.encode("ascii")).decode("ascii")
+            timestamp, pk, reverse = token.split("|")
+            return (datetime.fromisoformat(timestamp), int(pk)), bool(int(reverse))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
@@ -0,0 +1,237 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from math import isfinite
+
+from django.utils import timezone
+
+# Columns of a LibreView export, in file order
+LIBREVIEW_COLUMNS = [
+    "device_name",
+    "serial_number",
+    "device_timestamp",
+    "record_type",
+    "glucose_history",
+    "glucose_scan",
+    "non_numeric_rapid_acting_insulin",
+    "rapid_acting_insulin",
+    "non_numeric_food_data",
+    "carbohydrates_grams",
+    "carbohydrates_portions",
+    "non_numeric_depot_insulin",
+    "depot_insulin",
+    "notes",
+    "glucose_test_strips",
+    "ketone",
+    "meal_insulin",
+    "corrective_insulin",
+    "insulin_change_by_user",
+]
+TEXT_COLUMNS = {
+    "device_name",
+    "serial_number",
+    "non_numeric_rapid_acting_insulin",
+    "non_numeric_food_data",
+    "non_numeric_depot_insulin",
+    "notes",
+}
+# Largest value of the small integer columns numeric cells are stored in
+SMALL_INTEGER_MAX = 32767
+# Largest value and precision of the decimal columns, decimal(7, 2)
+DECIMAL_MAX = Decimal("99999.99")
+CENT = Decimal("0.01")
+# Values accepted per integer column. Record types, glucose in mg/dL,
+# carbohydrate grams and test strips are never negative.
+INTEGER_RANGES = {
+    name: (0, SMALL_INTEGER_MAX)
+    for name in [
+        "record_type",
+        "glucose_history",
+        "glucose_scan",
+        "carbohydrates_grams",
+        "glucose_test_strips",
+    ]
+}
+# Values accepted per decimal column. Only changes of the insulin by the user
+# can be negative.
+DECIMAL_RANGES = {
+    "rapid_acting_insulin": (0, DECIMAL_MAX),
+    "carbohydrates_portions": (0, DECIMAL_MAX),
+    "depot_insulin": (0, DECIMAL_MAX),
+    "ketone": (0, DECIMAL_MAX),
+    "meal_insulin": (0, DECIMAL_MAX),
+    "corrective_insulin": (0, DECIMAL_MAX),
+    "insulin_change_by_user": (-DECIMAL_MAX, DECIMAL_MAX),
+}
+# Numeric cells that can't be stored as they are, imported as empty cells
+INVALID = object()
+# Date and time formats seen in LibreView exports, tried in this order
+TIMESTAMP_FORMATS = [
+    ("%d-%m-%Y", "%H:%M"),
+    ("%d.%m.%Y", "%H:%M"),
+    ("%Y-%m-%d", "%H:%M"),
+    ("%m-%d-%Y", "%I:%M %p"),
+]
+
+
+def parse_integer(value, minimum=0, maximum=SMALL_INTEGER_MAX):
+    """
+    Parse a numeric cell into an integer. Empty and non-numeric cells become
+    ``None``. Numbers that would not be stored exactly, decimals (``0.6`` or
+    the German ``0,6``) and values outside ``minimum`` to ``maximum``, become
+    ``INVALID``.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        try:
+            number = float(value.replace(",", "."))
+        except ValueError:
+            return None
+        if not isfinite(number):
+            return None
+        if not number.is_integer():
+            return INVALID
+        number = int(number)
+    if not minimum <= number <= maximum:
+        return INVALID
+    return number
+
+
+def parse_decimal(value, minimum=0, maximum=DECIMAL_MAX):
+    """
+    Parse a numeric cell into a ``Decimal`` with two places, accepting the
+    German decimal comma. Empty and non-numeric cells become ``None``. Numbers
+    that would not be stored exactly, with more than two decimal places or
+    outside ``minimum`` to ``maximum``, become ``INVALID``.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        number = Decimal(value.replace(",", "."))
+    except InvalidOperation:
+        return None
+    if not number.is_finite():
+        return None
+    if not minimum <= number <= maximum or number != number.quantize(CENT):
+        return INVALID
+    return number.quantize(CENT)
+
+
+class ValueCache(dict):
+    """Dict that converts and remembers every key it is asked for."""
+
+    def __init__(self, convert):
+        super().__init__()
+        self.convert = convert
+
+    def __missing__(self, key):
+        value = self[key] = self.convert(key)
+        return value
+
+
+class LibreViewParser:
+    """
+    Turns batches of CSV rows from a LibreView export into typed columns.
+
+    Every column is converted as a whole with ``map`` over a cache of already
+    converted cells. Glucose and insulin cells repeat a few hundred distinct
+    values, so nearly every cell is a dict lookup. Timestamps are split into
+    a date and a time part, each cached separately, and the timestamp format
+    is detected once per file. Numeric cells that can't be stored exactly, see
+    ``parse_integer()`` and ``parse_decimal()``, are imported as empty cells.
+    """
+
+    def __init__(self):
+        self.numbers = {
+            name: ValueCache(partial(parse, minimum=minimum, maximum=maximum))
+            for parse, ranges in [
+                (parse_integer, INTEGER_RANGES),
+                (parse_decimal, DECIMAL_RANGES),
+            ]
+            for name, (minimum, maximum) in ranges.items()
+        }
+        self.dates = None
+        self.times = None
+
+    def parse(self, rows):
+        """
+        Return a dict of column name to list of typed values for the ``rows``,
+        and the number of invalid cells in them. Invalid numeric cells are
+        imported as empty. Readings can't be stored without a record type, so
+        rows whose record type is invalid or empty are left out and count as
+        invalid too.
+        """
+        width = len(LIBREVIEW_COLUMNS)
+        # Exports may leave out trailing empty cells
+        rows = [
+            row if len(row) >= width else row + [""] * (width - len(row))
+            for row in rows
+        ]
+        columns = {}
+        for name, cells in zip(LIBREVIEW_COLUMNS, zip(*rows)):
+            if name in TEXT_COLUMNS:
+                columns[name] = list(cells)
+            elif name == "device_timestamp":
+                columns[name] = self.parse_timestamps(cells)
+            else:
+                columns[name] = list(map(self.numbers[name].__getitem__, cells))
+
+        # Rows without a record type, empty cells count as invalid here and
+        # invalid ones with the other invalid cells below
+        record_types = columns["record_type"]
+        untyped = {
+            index
+            for index, record_type in enumerate(record_types)
+            if record_type is None or record_type is INVALID
+        }
+        invalid = record_types.count(None)
+        for name in self.numbers:
+            values = columns[name]
+            if INVALID in values:
+                invalid += values.count(INVALID)
+                columns[name] = [
+                    None if value is INVALID else value for value in values
+                ]
+        if untyped:
+            columns = {
+                name: [
+                    value for index, value in enumerate(values) if index not in untyped
+                ]
+                for name, values in columns.items()
+            }
+        return columns, invalid
+
+    def parse_timestamps(self, cells):
+        if self.dates is None:
+            self.detect_timestamp_format(cells[0])
+        dates, times = self.dates, self.times
+        # Timestamps without an offset are in the default time zone
+        tzinfo = timezone.get_current_timezone()
+        timestamps = []
+        for cell in cells:
+            date, _, time = cell.strip().partition(" ")
+            try:
+                timestamps.append(datetime.combine(dates[date], times[time], tzinfo))
+            except ValueError:
+                raise ValueError(f"Invalid timestamp {cell!r}") from None
+        return timestamps
+
+    def detect_timestamp_format(self, cell):
+        for date_format, time_format in TIMESTAMP_FORMATS:
+            try:
+                datetime.strptime(cell.strip(), f"{date_format} {time_format}")
+            except ValueError:
+                continue
+            self.dates = ValueCache(
+                lambda value: datetime.strptime(value, date_format).date()
+            )
+            self.times = ValueCache(
+                lambda value: datetime.strptime(value, time_format).time()
+            )
+            return
+        raise ValueError(f"Invalid timestamp {cell!r}")
@@ -0,0 +1,181 @@
+import logging
+from datetime import datetime, timezone
+from threading import Lock
+
+from django.db import DatabaseError, connections
+from django.utils import timezone as django_timezone
+
+logger = logging.getLogger(__name__)
+
+# Longest the connection creating partitions waits for its locks
+PARTITION_LOCK_TIMEOUT = "10s"
+
+
+def month_start(timestamp):
+    """First instant of the UTC month ``timestamp`` falls into."""
+    if django_timezone.is_naive(timestamp):
+        timestamp = django_timezone.make_aware(timestamp)
+    timestamp = timestamp.astimezone(timezone.utc)
+    return datetime(timestamp.year, timestamp.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def months_between(start, stop):
+    """Start of every month from the one of ``start`` to the one of ``stop``."""
+    month, last = month_start(start), month_start(stop)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(table, month):
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def create_partition_sql(table, month):
+    """
+    Statements creating the partition of ``table`` for ``month``.
+
+    The partition is created as a table of its own and then attached, which
+    only takes a SHARE UPDATE EXCLUSIVE lock on ``table``. ``CREATE TABLE ...
+    PARTITION OF`` would take an ACCESS EXCLUSIVE lock and block every read.
+    The new table copies the defaults and CHECK constraints of ``table``,
+    attaching a partition without them fails.
+    """
+    name = partition_name(table, month)
+    return [
+        f'CREATE TABLE "{name}" '
+        f'(LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+        f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') "
+        f"TO ('{next_month(month).isoformat()}')",
+    ]
+
+
+def attached_partitions(cursor, table):
+    cursor.execute(
+        "SELECT inhrelid::regclass::text FROM pg_inherits "
+        "WHERE inhparent = %s::regclass",
+        [f'"{table}"'],
+    )
+    return {name.strip('"') for (name,) in cursor.fetchall()}
+
+
+def holds_attach_locks(cursor, table):
+    """
+    Whether the transaction of ``cursor`` holds locks that attaching a
+    partition of ``table`` waits for: any lock on the default partition, which
+    is scanned for rows of the new month, or a write lock on a table the
+    foreign keys of ``table`` reference.
+    """
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE pid = pg_backend_pid() AND ("
+        "relation = to_regclass(%s) OR (relation IN ("
+        "SELECT confrelid FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'"
+        ") AND mode NOT IN ('AccessShareLock', 'RowShareLock'))))",
+        [f'"{default_partition_name(table)}"', f'"{table}"'],
+    )
+    return cursor.fetchone()[0]
+
+
+def supports_partitions(connection):
+    return connection.vendor == "postgresql"
+
+
+class PartitionRegistry:
+    """
+    Creates missing monthly partitions and remembers which ones exist, so
+    routing a batch of readings to known months costs no queries.
+    """
+
+    def __init__(self):
+        self.known = set()
+        self.lock = Lock()
+
+    def ensure(self, table, timestamps, using="default"):
+        if not supports_partitions(connections[using]):
+            return
+        months = {(table, month_start(timestamp)) for timestamp in timestamps}
+        with self.lock:
+            missing = sorted(months - self.known)
+        if not missing:
+            return
+        names = ", ".join(partition_name(table, month) for table, month in missing)
+        if self.blocked_by_transaction(table, using):
+            # The connection attaching the partitions would wait for locks of
+            # this transaction, which are only released when it ends. Its
+            # readings go to the default partition, later transactions try again.
+            logger.warning(
+                f"Not creating the partitions {names}, the current transaction "
+                "holds locks attaching them waits for"
+            )
+            return
+        # Partitions are created on a connection of their own and committed
+        # right away. In the transaction writing the readings, the locks they
+        # take would be held until the whole import commits.
+        connection = connections.create_connection(using)
+        try:
+            connection.set_autocommit(False)
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'")
+                attached = set()
+                for name in {table for table, _ in missing}:
+                    attached |= attached_partitions(cursor, name)
+                for table, month in missing:
+                    if partition_name(table, month) not in attached:
+                        for sql in create_partition_sql(table, month):
+                            cursor.execute(sql)
+            connection.commit()
+        except DatabaseError:
+            # Readings of the month go to the default partition instead, e.g.
+            # when it already holds some and the month can't be attached
+            logger.warning(
+                f"Creating the partitions {names} failed, their readings are "
+                "stored in the default partition",
+                exc_info=True,
+            )
+        finally:
+            connection.close()
+        self.remember(missing)
+
+    def blocked_by_transaction(self, table, using):
+        connection = connections[using]
+        if not connection.in_atomic_block:
+            return False
+        with connection.cursor() as cursor:
+            return holds_attach_locks(cursor, table)
+
+    def remember(self, partitions):
+        with self.lock:
+            self.known.update(partitions)
+
+    def clear(self):
+        with self.lock:
+            self.known.clear()
+
+
+partitions = PartitionRegistry()
+
+
+def ensure_partitions(table, timestamps, using="default"):
+    """
+    Create the monthly partitions of ``table`` that rows with ``timestamps``
+    are routed to, if they don't exist yet.
+
+    On PostgreSQL the readings are partitioned by month of ``device_timestamp``
+    and queries with a time window only scan the partitions of its months.
+    Readings of months without a partition end up in the default partition.
+    Other databases keep a single table, where the ``device_timestamp``
+    indexes limit range queries to the window instead, and nothing is done.
+    """
+    partitions.ensure(table, timestamps, using)
@@ -0,0 +1,206 @@
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta, timezone
+
+from django.db.models import Count
+from django.utils import timezone as django_timezone
+
+from .aggregates import (
+    GLUCOSE_CHANNELS,
+    EpochBucket,
+    avalue_histograms,
+    channel_statistics,
+    value_histograms,
+)
+from .models import GlucoseDailySummary, GlucoseData
+
+ONE_DAY = timedelta(days=1)
+SUMMARY_FIELDS = [
+    f"{channel}_{field}"
+    for channel in GLUCOSE_CHANNELS
+    for field in ("count", "min", "max", "sum", "sum_squares", "histogram")
+]
+
+
+def day_of(timestamp):
+    """UTC day a reading taken at ``timestamp`` is rolled up into."""
+    return timestamp.astimezone(timezone.utc).date()
+
+
+def day_start(day):
+    return datetime.combine(day, time(), timezone.utc)
+
+
+def daily_histograms(queryset):
+    """
+    Count the readings per UTC day and glucose value of both channels in a
+    single grouped query over ``queryset``.
+    """
+    days = defaultdict(lambda: {channel: Counter() for channel in GLUCOSE_CHANNELS})
+    rows = (
+        queryset.order_by()
+        .annotate(day=EpochBucket("device_timestamp", ONE_DAY.total_seconds()))
+        .values_list("day", *GLUCOSE_CHANNELS)
+        .annotate(readings=Count("id"))
+    )
+    for day, *values, readings in rows:
+        histograms = days[datetime.fromtimestamp(day, tz=timezone.utc).date()]
+        for channel, value in zip(GLUCOSE_CHANNELS, values):
+            if value is not None:
+                histograms[channel][value] += readings
+    return days
+
+
+def build_summary(user_id, day, histograms):
+    summary = GlucoseDailySummary(user_id=user_id, day=day)
+    for channel, histogram in histograms.items():
+        setattr(summary, f"{channel}_count", sum(histogram.values()))
+        setattr(summary, f"{channel}_min", min(histogram, default=None))
+        setattr(summary, f"{channel}_max", max(histogram, default=None))
+        setattr(
+            summary,
+            f"{channel}_sum",
+            sum(value * readings for value, readings in histogram.items()),
+        )
+        setattr(
+            summary,
+            f"{channel}_sum_squares",
+            sum(value * value * readings for value, readings in histogram.items()),
+        )
+        # JSON object keys are strings
+        setattr(
+            summary,
+            f"{channel}_histogram",
+            {str(value): readings for value, readings in sorted(histogram.items())},
+        )
+    return summary
+
+
+def refresh_daily_summaries(user_id, days):
+    """
+    Recompute the rollups of ``user_id`` for ``days`` from the raw readings.
+
+    Days are recomputed rather than adjusted, so readings updated by an import
+    are accounted for correctly. Rollups of days without readings are deleted.
+    """
+    days = set(days)
+    if not days:
+        return
+    readings = GlucoseData.objects.filter(
+        user_id=user_id,
+        device_timestamp__gte=day_start(min(days)),
+        device_timestamp__lt=day_start(max(days)) + ONE_DAY,
+    )
+    histograms = daily_histograms(readings)
+    summaries = [
+        build_summary(user_id, day, histograms[day])
+        for day in sorted(days)
+        if day in histograms
+    ]
+    GlucoseDailySummary.objects.filter(
+        user_id=user_id, day__in=days - histograms.keys()
+    ).delete()
+    GlucoseDailySummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=["user", "day"],
+        update_fields=SUMMARY_FIELDS,
+    )
+
+
+def refresh_reading_days(readings):
+    """
+    Refresh the rollups of the days of ``readings``, ``(user_id,
+    device_timestamp)`` pairs of readings that were written or deleted.
+    """
+    days = defaultdict(set)
+    for user_id, timestamp in readings:
+        if django_timezone.is_naive(timestamp):
+            timestamp = django_timezone.make_aware(timestamp)
+        days[user_id].add(day_of(timestamp))
+    for user_id, user_days in days.items():
+        refresh_daily_summaries(user_id, user_days)
+
+
+def rebuild_daily_summaries(user_id):
+    """Replace all rollups of ``user_id`` with ones computed from scratch."""
+    GlucoseDailySummary.objects.filter(user_id=user_id).delete()
+    histograms = daily_histograms(GlucoseData.objects.filter(user_id=user_id))
+    GlucoseDailySummary.objects.bulk_create(
+        build_summary(user_id, day, histograms[day]) for day in sorted(histograms)
+    )
+
+
+def summarized_statistics(queryset, user_id=None, start=None, stop=None):
+    """
+    Same result as ``glucose_statistics(queryset)`` for the readings of
+    ``queryset``, which are those of ``user_id`` (all users when ``None``)
+    between ``start`` and ``stop`` inclusive.
+
+    Whole UTC days in the range are read from the daily rollups. Only the
+    partial days at the edges of the range are aggregated from raw readings,
+    so the cost grows with the number of days rather than readings.
+    """
+    edges, summaries = statistics_sources(queryset, user_id, start, stop)
+    histograms = {channel: Counter() for channel in GLUCOSE_CHANNELS}
+    for edge in edges:
+        merge_histograms(histograms, value_histograms(edge))
+    if summaries is not None:
+        merge_summaries(histograms, summaries.iterator())
+    return channel_statistics(histograms)
+
+
+async def asummarized_statistics(queryset, user_id=None, start=None, stop=None):
+    """``summarized_statistics`` for async views."""
+    edges, summaries = statistics_sources(queryset, user_id, start, stop)
+    histograms = {channel: Counter() for channel in GLUCOSE_CHANNELS}
+    for edge in edges:
+        merge_histograms(histograms, await avalue_histograms(edge))
+    if summaries is not None:
+        merge_summaries(histograms, [row async for row in summaries])
+    return channel_statistics(histograms)
+
+
+def statistics_sources(queryset, user_id=None, start=None, stop=None):
+    """
+    Querysets that together cover the readings of ``summarized_statistics``:
+    raw readings of the partial days at the edges of the range, and the
+    histogram columns of the rollups of the whole days in between, or
+    ``None`` when the range has no whole days.
+    """
+    # First and last midnight within the range, the whole days lie between
+    whole_start = whole_stop = None
+    if start is not None:
+        whole_start = day_start(day_of(start))
+        if whole_start < start:
+            whole_start += ONE_DAY
+    if stop is not None:
+        whole_stop = day_start(day_of(stop))
+    if whole_start and whole_stop and whole_start >= whole_stop:
+        return [queryset], None
+
+    edges = []
+    summaries = GlucoseDailySummary.objects.all()
+    if user_id:
+        summaries = summaries.filter(user_id=user_id)
+    if whole_start is not None:
+        summaries = summaries.filter(day__gte=whole_start.date())
+        if whole_start > start:
+            edges.append(queryset.filter(device_timestamp__lt=whole_start))
+    if whole_stop is not None:
+        summaries = summaries.filter(day__lt=whole_stop.date())
+        edges.append(queryset.filter(device_timestamp__gte=whole_stop))
+    columns = [f"{channel}_histogram" for channel in GLUCOSE_CHANNELS]
+    return edges, summaries.values_list(*columns)
+
+
+def merge_histograms(histograms, other):
+    for channel, histogram in other.items():
+        histograms[channel].update(histogram)
+
+
+def merge_summaries(histograms, rows):
+    for row in rows:
+        for channel, histogram in zip(GLUCOSE_CHANNELS, row):
+            histograms[channel].update(
+                {int(value): readings for value, readings in histogram.items()}
+            )
@@ -1,6 +1,16 @@
+from operator import itemgetter
+
+from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Customer, Device, GlucoseData
+from .models import (
+    TEXT_FIELDS,
+    Customer,
+    Device,
+    GlucoseData,
+    GlucoseDataText,
+    ImportJob,
+)
 
 
 class DeviceSerializer(serializers.ModelSerializer):
@@ -15,9 +25,26 @@ class CustomerSerializer(serializers.ModelSerializer):
         fields = ["user_id"]
 
 
+class ReadingTextField(serializers.CharField):
+    """Text cell of a reading, empty for readings without a text row."""
+
+    def __init__(self, **kwargs):
+        super().__init__(read_only=True, **kwargs)
+
+    def get_attribute(self, instance):
+        try:
+            return getattr(instance.text, self.field_name)
+        except GlucoseDataText.DoesNotExist:
+            return ""
+
+
 class GlucoseDataSerializer(serializers.ModelSerializer):
     user = CustomerSerializer()
     device = DeviceSerializer()
+    non_numeric_rapid_acting_insulin = ReadingTextField()
+    non_numeric_food_data = ReadingTextField()
+    non_numeric_depot_insulin = ReadingTextField()
+    notes = ReadingTextField()
 
     class Meta:
         model = GlucoseData
@@ -43,11 +70,209 @@ class GlucoseDataSerializer(serializers.ModelSerializer):
             "corrective_insulin",
             "insulin_change_by_user",
         ]
+        # Decimal values are JSON numbers like the integer ones
+        extra_kwargs = {
+            field: {"coerce_to_string": False}
+            for field in [
+                "rapid_acting_insulin",
+                "carbohydrates_portions",
+                "depot_insulin",
+                "ketone",
+                "meal_insulin",
+                "corrective_insulin",
+                "insulin_change_by_user",
+            ]
+        }
+
+
+class GlucoseDataRowSerializer:
+    """
+    Fast path for ``GlucoseDataSerializer`` working on ``values_list()`` rows.
+
+    The columns behind every output field are fetched with ``values_list``
+    and each row is turned into a dict by converters compiled once per
+    serializer, skipping model instances and DRF field objects. The output is
+    identical to ``GlucoseDataSerializer``.
+    """
+
+    # Database columns behind each output field
+    field_columns = {
+        "user": ("user_id",),
+        "device": ("device__device_name", "device_id"),
+    }
+    # Columns every row carries, e.g. for cursor pagination
+    key_columns = ("id", "device_timestamp")
+
+    def __init__(self, fields=None):
+        if fields is None:
+            fields = GlucoseDataSerializer.Meta.fields
+        self.fields = list(fields)
+        self.columns = list(self.key_columns)
+        for field in self.fields:
+            for column in self.field_columns.get(field, (field,)):
+                if column not in self.columns:
+                    self.columns.append(column)
+        self.converters = [
+            (field, self.build_converter(field)) for field in self.fields
+        ]
+
+    def build_converter(self, field):
+        index = self.columns.index
+        if field == "user":
+            user_id = index("user_id")
+            return lambda row: {"user_id": row[user_id]}
+        if field == "device":
+            device_name = index("device__device_name")
+            serial_number = index("device_id")
+            return lambda row: (
+                None
+                if row[serial_number] is None
+                else {
+                    "serial_number": row[serial_number],
+                    "device_name": row[device_name],
+                }
+            )
+        if field == "device_timestamp":
+            timestamp = index("device_timestamp")
+            to_representation = serializers.DateTimeField().to_representation
+            return lambda row: to_representation(row[timestamp])
+        return itemgetter(index(field))
+
+    def get_queryset(self, queryset):
+        # Text fields are annotated from the sparse text table when requested
+        text_fields = [field for field in self.fields if field in TEXT_FIELDS]
+        if text_fields:
+            queryset = queryset.with_text(*text_fields)
+        return queryset.values_list(*self.columns, named=True)
+
+    def to_representation(self, rows):
+        converters = self.converters
+        return [{field: convert(row) for field, convert in converters} for row in rows]
 
 
 class GlucoseDataUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
 
+
+class GlucoseDataBulkUploadSerializer(serializers.Serializer):
+    files = serializers.ListField(child=serializers.FileField(), allow_empty=False)
+
+
+class BulkImportFileSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    user_id = serializers.CharField()
+    status = serializers.CharField()
+    rows_inserted = serializers.IntegerField(required=False)
+    rows_updated = serializers.IntegerField(required=False)
+    rows_skipped = serializers.IntegerField(required=False)
+    invalid_values = serializers.IntegerField(required=False)
+    error = serializers.CharField(required=False)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    rows_per_second = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "user",
+            "status",
+            "progress",
+            "file_size",
+            "bytes_processed",
+            "rows_imported",
+            "rows_inserted",
+            "rows_updated",
+            "rows_skipped",
+            "invalid_values",
+            "rows_per_second",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+    def get_progress(self, obj):
+        if obj.status == ImportJob.Status.SUCCEEDED:
+            return 1.0
+        if not obj.file_size:
+            return 0.0
+        return round(min(obj.bytes_processed / obj.file_size, 1.0), 4)
+
+    def get_rows_per_second(self, obj):
+        if obj.started_at is None:
+            return None
+        elapsed = ((obj.finished_at or timezone.now()) - obj.started_at).total_seconds()
+        if elapsed <= 0:
+            return None
+        return round(obj.rows_imported / elapsed, 1)
+
+
+class GlucoseChannelStatisticsSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    min = serializers.IntegerField(allow_null=True)
+    max = serializers.IntegerField(allow_null=True)
+    mean = serializers.FloatField(allow_null=True)
+    std_dev = serializers.FloatField(allow_null=True)
+    percentiles = serializers.DictField(child=serializers.FloatField(allow_null=True))
+
+
 class GlucoseMinMaxSerializer(serializers.Serializer):
-    min_value = serializers.IntegerField()
-    max_value = serializers.IntegerField()
\ No newline at end of file
+    min_value = serializers.IntegerField(allow_null=True)
+    max_value = serializers.IntegerField(allow_null=True)
+    glucose_history = GlucoseChannelStatisticsSerializer()
+    glucose_scan = GlucoseChannelStatisticsSerializer()
+
+
+class GlucoseBucketStatisticsSerializer(serializers.Serializer):
+    min = serializers.IntegerField(allow_null=True)
+    mean = serializers.FloatField(allow_null=True)
+    max = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+
+
+class CohortStatisticsRequestSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.CharField(), required=False, allow_empty=False
+    )
+    all_active = serializers.BooleanField(default=False)
+    start_timestamp = serializers.DateTimeField(required=False)
+    stop_timestamp = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if ("user_ids" in data) == data["all_active"]:
+            raise serializers.ValidationError(
+                "Pass either user_ids or all_active, but not both."
+            )
+        return data
+
+
+class CohortStatisticsSerializer(serializers.Serializer):
+    user_id = serializers.CharField()
+    glucose_history = GlucoseBucketStatisticsSerializer()
+    glucose_scan = GlucoseBucketStatisticsSerializer()
+
+
+class GlucoseSeriesBucketSerializer(serializers.Serializer):
+    timestamp = serializers.DateTimeField()
+    glucose_history = GlucoseBucketStatisticsSerializer()
+    glucose_scan = GlucoseBucketStatisticsSerializer()
+
+
+class GlucoseChannelMetricsSerializer(serializers.Serializer):
+    count = serializers.IntegerField()
+    covered_minutes = serializers.IntegerField()
+    mean = serializers.FloatField(allow_null=True)
+    gmi = serializers.FloatField(allow_null=True)
+    cv = serializers.FloatField(allow_null=True)
+    time_below_range = serializers.FloatField(allow_null=True)
+    time_in_range = serializers.FloatField(allow_null=True)
+    time_above_range = serializers.FloatField(allow_null=True)
+
+
+class GlucoseMetricsSerializer(serializers.Serializer):
+    user_id = serializers.CharField()
+    glucose_history = GlucoseChannelMetricsSerializer()
+    glucose_scan = GlucoseChannelMetricsSerializer()
@@ -0,0 +1,66 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import invalidate_user
+from .devices import device_cache
+from .instrumentation import install_query_recorder
+from .models import Customer, Device, GlucoseData
+from .partitions import ensure_partitions
+from .rollups import refresh_reading_days
+
+
+@receiver(connection_created)
+def record_request_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+@receiver(post_delete, sender=Device)
+def evict_deleted_device(sender, instance, **kwargs):
+    device_cache.discard(instance.serial_number)
+
+
+@receiver(pre_save, sender=GlucoseData)
+def ensure_reading_partition(sender, instance, using, **kwargs):
+    # Bulk inserts create partitions in GlucoseDataQuerySet.bulk_create
+    ensure_partitions(sender._meta.db_table, [instance.device_timestamp], using)
+
+
+@receiver(post_save, sender=GlucoseData)
+@receiver(post_delete, sender=GlucoseData)
+def invalidate_changed_reading(sender, instance, **kwargs):
+    # Imports invalidate in bulk, this covers readings changed one at a time
+    transaction.on_commit(lambda: invalidate_user(instance.user_id))
+
+
+@receiver(pre_save, sender=GlucoseData)
+def remember_stored_day(sender, instance, using, update_fields=None, **kwargs):
+    # A reading moved to another day or user leaves its old day to refresh
+    instance._stored_day = None
+    if instance._state.adding or (
+        update_fields is not None
+        and not {"user", "user_id", "device_timestamp"} & set(update_fields)
+    ):
+        return
+    instance._stored_day = (
+        sender._base_manager.using(using)
+        .filter(pk=instance.pk)
+        .values_list("user_id", "device_timestamp")
+        .first()
+    )
+
+
+@receiver(post_save, sender=GlucoseData)
+@receiver(post_delete, sender=GlucoseData)
+def refresh_changed_day(sender, instance, origin=None, **kwargs):
+    # Imports and bulk writes refresh the rollups themselves, this covers
+    # readings changed one at a time. Deleting a customer deletes their rollups
+    # along with them.
+    if isinstance(origin, Customer):
+        return
+    days = {(instance.user_id, instance.device_timestamp)}
+    stored_day = getattr(instance, "_stored_day", None)
+    if stored_day is not None:
+        days.add(stored_day)
+    refresh_reading_days(days)
@@ -0,0 +1,86 @@
+import json
+
+from api.tests.test_views import ResponseCacheMixin, test_data_create
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+
+
+class AsyncReadViewsTest(ResponseCacheMixin, TestCase):
+    """The async endpoints answer like their sync counterparts."""
+
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    async def assertSameResponse(self, path):
+        expected = await sync_to_async(self.client.get)(f"/api/v1/{path}")
+        response = await self.async_client.get(f"/api/v1/async/{path}")
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response["Content-Type"], "application/json")
+        data = json.loads(response.content)
+        # Pagination links point to the endpoint that served the page
+        if isinstance(data, dict):
+            for link in ("next", "previous"):
+                if data.get(link):
+                    data[link] = data[link].replace("/async/", "/")
+        self.assertEqual(data, json.loads(expected.content))
+        return data
+
+    async def test_list(self):
+        data = await self.assertSameResponse("levels/?user_id=user1")
+        self.assertEqual(len(data), 4)
+
+    async def test_list_with_filters_and_fields(self):
+        await self.assertSameResponse(
+            "levels/?start_timestamp=2025-04-26 12:30:11&fields=id,device_timestamp"
+            "&ordering=-device_timestamp"
+        )
+
+    async def test_list_with_offset_pagination(self):
+        data = await self.assertSameResponse("levels/?limit=3&offset=3")
+        self.assertEqual(data["count"], 9)
+
+    async def test_list_with_cursor_pagination(self):
+        first = await self.assertSameResponse("levels/?cursor=&limit=4")
+        second = await self.async_client.get(
+            first["next"].replace("/api/v1/", "/api/v1/async/")
+        )
+
+        self.assertEqual(len(json.loads(second.content)["results"]), 4)
+
+    async def test_list_validation_errors(self):
+        data = await self.assertSameResponse("levels/?fields=password")
+        self.assertEqual(data, {"fields": ["Unknown field 'password'."]})
+        await self.assertSameResponse("levels/?cursor=not-a-cursor")
+
+    async def test_single(self):
+        data = await self.assertSameResponse("levels/3/")
+        self.assertEqual(data["device_timestamp"], "2024-04-26T12:30:02Z")
+
+    async def test_single_not_found(self):
+        await self.assertSameResponse("levels/1000/")
+
+    async def test_min_max(self):
+        data = await self.assertSameResponse("min-max-blood/?user_id=user1")
+        self.assertEqual(data["max_value"], 204)
+        await self.assertSameResponse(
+            "min-max-blood/?start_timestamp=2024-04-25T12:00:00Z"
+            "&stop_timestamp=2025-04-26 12:30:13"
+        )
+        await self.assertSameResponse("min-max-blood/?start_timestamp=yesterday")
+
+    def test_min_max_queries(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/async/min-max-blood/?user_id=user1")
+        self.assertEqual(response.status_code, 200)
+
+    async def test_not_modified(self):
+        first = await self.async_client.get("/api/v1/async/levels/?user_id=user2")
+        second = await self.async_client.get(
+            "/api/v1/async/levels/?user_id=user2",
+            headers={"If-None-Match": first["ETag"]},
+        )
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], first["ETag"])
@@ -0,0 +1,128 @@
+import tempfile
+
+from api.devices import device_cache
+from api.models import GlucoseData
+from api.tests.test_views import CSV_DATA, ResponseCacheMixin, test_data_create
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+
+class GlucoseResponseCacheTest(ResponseCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def setUp(self):
+        super().setUp()
+        # Committed imports fill the device cache with devices rolled back
+        # at the end of the test
+        self.addCleanup(device_cache.clear)
+
+    def import_csv(self, user_id):
+        upload = SimpleUploadedFile(f"{user_id}.csv", CSV_DATA.encode("utf-8"))
+        with override_settings(GLUCOSE_IMPORT_EAGER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/api/v1/prepopulate-data/bulk/",
+                    {"files": [upload]},
+                    format="multipart",
+                )
+        self.assertEqual(response.data["results"][0]["status"], "succeeded")
+
+    def test_repeated_requests_are_served_from_cache(self):
+        for url in ("/api/v1/levels/?user_id=user1", "/api/v1/min-max-blood/"):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual(second.json(), first.json())
+                self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_matching_etag_returns_not_modified(self):
+        etag = self.client.get("/api/v1/min-max-blood/?user_id=user1")["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                "/api/v1/min-max-blood/?user_id=user1", HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_stale_etag_returns_response(self):
+        response = self.client.get(
+            "/api/v1/min-max-blood/?user_id=user1", HTTP_IF_NONE_MATCH='"stale"'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], '"stale"')
+
+    def test_etag_depends_on_parameters(self):
+        first = self.client.get("/api/v1/levels/?user_id=user1")
+        second = self.client.get("/api/v1/levels/?user_id=user1&limit=1")
+
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_import_invalidates_users_responses(self):
+        user_etag = self.client.get("/api/v1/levels/?user_id=user3")["ETag"]
+        all_etag = self.client.get("/api/v1/levels/")["ETag"]
+
+        self.import_csv("user3")
+
+        response = self.client.get(
+            "/api/v1/levels/?user_id=user3", HTTP_IF_NONE_MATCH=user_etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 14)
+        response = self.client.get("/api/v1/levels/", HTTP_IF_NONE_MATCH=all_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_import_keeps_other_users_responses(self):
+        etag = self.client.get("/api/v1/levels/?user_id=user1")["ETag"]
+
+        self.import_csv("user3")
+
+        response = self.client.get(
+            "/api/v1/levels/?user_id=user1", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_reimport_without_changes_keeps_responses(self):
+        self.import_csv("user3")
+        etag = self.client.get("/api/v1/levels/?user_id=user3")["ETag"]
+
+        self.import_csv("user3")
+
+        response = self.client.get(
+            "/api/v1/levels/?user_id=user3", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_deleted_reading_invalidates_responses(self):
+        etag = self.client.get("/api/v1/min-max-blood/?user_id=user1")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            GlucoseData.objects.filter(user_id="user1").first().delete()
+
+        response = self.client.get(
+            "/api/v1/min-max-blood/?user_id=user1", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            file_cache = {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": location,
+            }
+            with override_settings(CACHES={"default": file_cache}):
+                etag = self.client.get("/api/v1/min-max-blood/")["ETag"]
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        "/api/v1/min-max-blood/", HTTP_IF_NONE_MATCH=etag
+                    )
+
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,57 @@
+from api.devices import DeviceCache, DeviceResolver, device_cache
+from api.models import Device
+from django.test import TestCase
+
+
+class DeviceCacheTest(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = DeviceCache(max_size=2)
+        first, second, third = (
+            Device(device_name="FreeStyle", serial_number=f"SN-{i}") for i in range(3)
+        )
+        cache.add_many([first, second])
+        cache.get_many(["SN-0"])
+        cache.add_many([third])
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(
+            set(cache.get_many(["SN-0", "SN-1", "SN-2"])), {"SN-0", "SN-2"}
+        )
+
+
+class DeviceResolverTest(TestCase):
+    def setUp(self):
+        device_cache.clear()
+        self.addCleanup(device_cache.clear)
+
+    def test_resolves_batch_with_one_query_and_one_insert(self):
+        Device.objects.create(device_name="FreeStyle", serial_number="SN-1")
+        pairs = [("FreeStyle", "SN-1"), ("FreeStyle", "SN-2")] * 50
+
+        with self.assertNumQueries(2):
+            devices = DeviceResolver().resolve(pairs)
+
+        self.assertEqual(set(devices), {"SN-1", "SN-2"})
+        self.assertTrue(Device.objects.filter(serial_number="SN-2").exists())
+
+    def test_known_devices_are_not_queried_again(self):
+        resolver = DeviceResolver()
+        resolver.resolve([("FreeStyle", "SN-1")])
+
+        with self.assertNumQueries(0):
+            resolver.resolve([("FreeStyle", "SN-1")] * 10)
+
+    def test_process_cache_is_filled_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DeviceResolver().resolve([("FreeStyle", "SN-1")])
+
+        with self.assertNumQueries(0):
+            devices = DeviceResolver().resolve([("FreeStyle", "SN-1")])
+        self.assertEqual(devices["SN-1"].device_name, "FreeStyle")
+
+    def test_deleted_device_is_evicted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            DeviceResolver().resolve([("FreeStyle", "SN-1")])
+        Device.objects.get(serial_number="SN-1").delete()
+
+        self.assertEqual(device_cache.get_many(["SN-1"]), {})
@@ -0,0 +1,154 @@
+import io
+import time
+from decimal import Decimal
+from threading import Event, current_thread, main_thread
+from unittest import mock
+
+from api.importers import import_glucose_csv, in_background
+from api.models import Customer, GlucoseData
+from api.tests.test_views import CSV_DATA
+from django.test import SimpleTestCase, TestCase, override_settings
+
+
+class InBackgroundTest(SimpleTestCase):
+    def test_yields_items_in_order_from_another_thread(self):
+        threads = []
+
+        def numbers():
+            for number in range(10):
+                threads.append(current_thread())
+                yield number
+
+        self.assertEqual(list(in_background(numbers(), 2)), list(range(10)))
+        self.assertNotIn(main_thread(), threads)
+
+    def test_producer_waits_for_room_in_queue(self):
+        produced = []
+
+        def numbers():
+            for number in range(10):
+                produced.append(number)
+                yield number
+
+        items = in_background(numbers(), 2)
+        self.assertEqual(next(items), 0)
+        # Two items in the queue and one waiting to be put into it
+        for _ in range(50):
+            if len(produced) == 4:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(produced), 4)
+        items.close()
+
+    def test_raises_producer_exceptions(self):
+        def failing():
+            yield 1
+            raise ValueError("not a date")
+
+        items = in_background(failing(), 2)
+        self.assertEqual(next(items), 1)
+        with self.assertRaisesMessage(ValueError, "not a date"):
+            next(items)
+
+    def test_raises_producer_base_exceptions(self):
+        class Interrupted(BaseException):
+            pass
+
+        def interrupted():
+            yield 1
+            raise Interrupted
+
+        items = in_background(interrupted(), 2)
+        self.assertEqual(next(items), 1)
+        with self.assertRaises(Interrupted):
+            next(items)
+
+    def test_close_stops_producer(self):
+        stopped = Event()
+
+        def endless():
+            try:
+                number = 0
+                while True:
+                    yield number
+                    number += 1
+            finally:
+                stopped.set()
+
+        items = in_background(endless(), 1)
+        next(items)
+        items.close()
+
+        self.assertTrue(stopped.wait(1))
+
+
+class ImportGlucoseCsvTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(user_id="user1")
+
+    def import_csv(self):
+        progress = []
+        counts = import_glucose_csv(
+            io.BytesIO(CSV_DATA.encode("utf-8")),
+            self.customer,
+            batch_size=4,
+            progress=lambda counts, bytes_read: progress.append(bytes_read),
+        )
+        return counts, progress
+
+    @override_settings(GLUCOSE_IMPORT_QUEUE_SIZE=2)
+    def test_pipelined_import(self):
+        counts, progress = self.import_csv()
+
+        self.assertEqual(counts["inserted"], 14)
+        self.assertEqual(GlucoseData.objects.count(), 14)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], len(CSV_DATA.encode("utf-8")))
+
+    @override_settings(GLUCOSE_IMPORT_QUEUE_SIZE=0)
+    def test_sequential_import(self):
+        counts, progress = self.import_csv()
+
+        self.assertEqual(counts["inserted"], 14)
+        self.assertEqual(GlucoseData.objects.count(), 14)
+        self.assertEqual(progress[-1], len(CSV_DATA.encode("utf-8")))
+
+    def test_failed_rollup_refresh_rolls_back_batch(self):
+        with mock.patch(
+            "api.importers.refresh_daily_summaries", side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            import_glucose_csv(io.BytesIO(CSV_DATA.encode("utf-8")), self.customer)
+
+        self.assertFalse(GlucoseData.objects.exists())
+
+    def test_empties_invalid_values(self):
+        data = CSV_DATA.replace(
+            "10-02-2021 09:55,0,138,,,,,,,,,,,,,,",
+            "10-02-2021 09:55,3,,,,,,,,,,,,0.6,,,",
+        ).replace(
+            "10-02-2021 10:10,0,140,,,,,,,,,,,,,,",
+            "10-02-2021 10:10,0,40000,,,,,,,,,,,,,,",
+        )
+
+        counts = import_glucose_csv(io.BytesIO(data.encode("utf-8")), self.customer)
+
+        self.assertEqual(counts["inserted"], 14)
+        self.assertEqual(counts["skipped"], 0)
+        self.assertEqual(counts["invalid"], 1)
+        self.assertEqual(
+            GlucoseData.objects.get(record_type=GlucoseData.RecordType.KETONE).ketone,
+            Decimal("0.60"),
+        )
+        self.assertTrue(
+            GlucoseData.objects.filter(
+                device_timestamp__minute=10, glucose_history=None
+            ).exists()
+        )
+
+    def test_leaves_out_rows_without_record_type(self):
+        data = CSV_DATA.replace("10-02-2021 10:10,0,140", "10-02-2021 10:10,-1,140")
+
+        counts = import_glucose_csv(io.BytesIO(data.encode("utf-8")), self.customer)
+
+        self.assertEqual((counts["inserted"], counts["invalid"]), (13, 1))
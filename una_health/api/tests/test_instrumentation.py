@@ -0,0 +1,131 @@
+import io
+import re
+
+from api.importers import import_glucose_csv
+from api.instrumentation import Histogram, registry, span
+from api.models import Customer
+from api.tests.test_views import CSV_DATA, ResponseCacheMixin, test_data_create
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+
+def server_timing(response):
+    """Server-Timing metrics of ``response`` as ``{name: (duration, desc)}``."""
+    metrics = {}
+    for metric in response["Server-Timing"].split(", "):
+        name, *params = metric.split(";")
+        params = dict(param.split("=", 1) for param in params)
+        metrics[name] = float(params["dur"]), params.get("desc", "").strip('"')
+    return metrics
+
+
+class HistogramTest(SimpleTestCase):
+    def test_exposes_cumulative_buckets(self):
+        histogram = Histogram("request_seconds", "Request time.", ["view"], (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, 'levels "list"')
+
+        self.assertEqual(
+            histogram.expose(),
+            [
+                "# HELP request_seconds Request time.",
+                "# TYPE request_seconds histogram",
+                'request_seconds_bucket{view="levels \\"list\\"",le="0.1"} 2',
+                'request_seconds_bucket{view="levels \\"list\\"",le="1"} 3',
+                'request_seconds_bucket{view="levels \\"list\\"",le="+Inf"} 4',
+                'request_seconds_sum{view="levels \\"list\\""} 3.65',
+                'request_seconds_count{view="levels \\"list\\""} 4',
+            ],
+        )
+
+    def test_span_outside_request(self):
+        with span("serialize"):
+            pass
+
+
+class InstrumentationMiddlewareTest(ResponseCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/v1/levels/?user_id=user1")
+
+        metrics = server_timing(response)
+        self.assertEqual(list(metrics), ["db", "serialize", "total"])
+        self.assertEqual(metrics["db"][1], f"{len(queries)} queries")
+        self.assertGreaterEqual(metrics["total"][0], metrics["serialize"][0])
+
+    def test_aggregate_span(self):
+        response = self.client.get("/api/v1/min-max-blood/?user_id=user1")
+
+        self.assertIn("aggregate", server_timing(response))
+
+    def test_async_view_queries_are_counted(self):
+        response = self.client.get("/api/v1/async/min-max-blood/?user_id=user1")
+
+        metrics = server_timing(response)
+        self.assertEqual(metrics["db"][1], "1 queries")
+        self.assertIn("aggregate", metrics)
+
+    @override_settings(GLUCOSE_SERVER_TIMING=False)
+    def test_server_timing_disabled(self):
+        response = self.client.get("/api/v1/levels/?user_id=user1")
+
+        self.assertNotIn("Server-Timing", response)
+
+    def test_metrics_endpoint(self):
+        self.client.get("/api/v1/levels/?user_id=user1")
+        self.client.get("/api/v1/levels/?user_id=user2")
+        self.client.get("/api/v1/min-max-blood/?start_timestamp=yesterday")
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{view="glucose-data-list",'
+            'method="GET",status="200"} 2',
+            content,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{view="minmax-glucose-data",'
+            'method="GET",status="400"} 1',
+            content,
+        )
+        self.assertRegex(
+            content,
+            re.compile(
+                r'^http_request_span_duration_seconds_count\{view="glucose-data-list",'
+                r'span="serialize"\} 2$',
+                re.MULTILINE,
+            ),
+        )
+        self.assertIn(
+            'http_request_db_queries_bucket{view="glucose-data-list"', content
+        )
+
+
+class ImportDurationTest(TestCase):
+    def setUp(self):
+        registry.clear()
+
+    def test_import_phases_are_recorded(self):
+        customer = Customer.objects.create(user_id="user1")
+
+        import_glucose_csv(io.BytesIO(CSV_DATA.encode("utf-8")), customer, batch_size=4)
+
+        content = registry.expose()
+        # 14 readings in batches of 4
+        for phase, count in (("file", 1), ("parse", 4), ("write", 4)):
+            self.assertIn(
+                f'glucose_import_duration_seconds_count{{phase="{phase}"}} {count}',
+                content,
+            )
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest import skipUnless
+
+from api.loaders import READING_FIELDS, NativeLoader, OrmLoader
+from api.models import TEXT_FIELDS, Customer, Device, GlucoseData, GlucoseDataText
+from api.partitions import month_start, partitions
+from api.tests.test_views import CSV_DATA
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+TIMESTAMP = datetime(2021, 2, 10, 9, 40, tzinfo=timezone.utc)
+
+
+def reading_row(minutes, glucose_history, notes=""):
+    values = [None] * (len(READING_FIELDS) - 4)
+    texts = [""] * (len(TEXT_FIELDS) - 1) + [notes]
+    timestamp = TIMESTAMP + timedelta(minutes=minutes)
+    return ("SN-1", timestamp, 0, glucose_history, *values, *texts)
+
+
+class LoaderTestMixin:
+    loader_class = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(user_id="user1")
+        Device.objects.create(device_name="FreeStyle", serial_number="SN-1")
+
+    def load(self, rows, cleared=()):
+        with self.loader_class(self.customer) as loader:
+            loader.load(rows, list(cleared))
+
+    def stored(self):
+        return list(
+            GlucoseData.objects.order_by("device_timestamp")
+            .with_text("notes")
+            .values_list("device_timestamp", "glucose_history", "notes")
+        )
+
+    def test_inserts_readings_and_texts(self):
+        self.load([reading_row(0, 120), reading_row(15, 130, notes="Lunch")])
+
+        self.assertEqual(
+            self.stored(),
+            [
+                (TIMESTAMP, 120, ""),
+                (TIMESTAMP + timedelta(minutes=15), 130, "Lunch"),
+            ],
+        )
+        # Only the reading with a note has a text row
+        self.assertEqual(GlucoseDataText.objects.count(), 1)
+        self.assertEqual(
+            set(GlucoseData.objects.values_list("user_id", flat=True)), {"user1"}
+        )
+
+    def test_updates_existing_readings(self):
+        self.load([reading_row(0, 120, notes="Lunch"), reading_row(15, 130)])
+        self.load(
+            [reading_row(0, 125), reading_row(15, 135, notes="Walk")],
+            cleared=[reading_row(0, 125)[:3]],
+        )
+
+        self.assertEqual(
+            self.stored(),
+            [
+                (TIMESTAMP, 125, ""),
+                (TIMESTAMP + timedelta(minutes=15), 135, "Walk"),
+            ],
+        )
+        self.assertEqual(GlucoseData.objects.count(), 2)
+        self.assertEqual(GlucoseDataText.objects.count(), 1)
+
+    def test_stores_decimal_values(self):
+        row = list(reading_row(0, None))
+        row[READING_FIELDS.index("ketone")] = Decimal("0.6")
+        row[READING_FIELDS.index("insulin_change_by_user")] = Decimal("-1.5")
+        self.load([tuple(row)])
+
+        self.assertEqual(
+            GlucoseData.objects.values_list("ketone", "insulin_change_by_user").get(),
+            (Decimal("0.60"), Decimal("-1.50")),
+        )
+
+
+class OrmLoaderTest(LoaderTestMixin, TestCase):
+    loader_class = OrmLoader
+
+
+class NativeLoaderTest(LoaderTestMixin, TestCase):
+    loader_class = NativeLoader
+
+    def test_writes_batch_without_model_instances(self):
+        # One upsert for the readings and one for their texts, in a transaction.
+        # COPY adds creating, filling and dropping the table it copies into.
+        queries = 7 if NativeLoader(self.customer).can_copy else 4
+        # Counted without creating the month's partition
+        partitions.remember([("api_glucosedata", month_start(TIMESTAMP))])
+        self.addCleanup(partitions.clear)
+        with self.assertNumQueries(queries):
+            NativeLoader(self.customer).load(
+                [reading_row(0, 120, notes="Lunch"), reading_row(15, 130)], []
+            )
+
+    @skipUnless(connection.vendor == "postgresql", "COPY needs PostgreSQL")
+    def test_copies_batches_on_postgresql(self):
+        if not NativeLoader(self.customer).can_copy:
+            self.skipTest("COPY needs psycopg 3")
+        rows = [reading_row(minutes, 100 + minutes) for minutes in range(0, 300, 15)]
+        rows[3] = reading_row(45, None, notes="Lunch")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.load(rows)
+
+        self.assertTrue(any("COPY" in query["sql"] for query in queries))
+        stored = self.stored()
+        self.assertEqual(len(stored), 20)
+        self.assertEqual(stored[0], (TIMESTAMP, 100, ""))
+        self.assertEqual(stored[3], (TIMESTAMP + timedelta(minutes=45), None, "Lunch"))
+        # The temporary table is dropped again, so the next batch can create it
+        self.load([reading_row(300, 130)])
+        self.assertEqual(GlucoseData.objects.count(), 21)
+
+    def test_restores_sqlite_cache_size(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            (cache_size,) = cursor.fetchone()
+            with NativeLoader(self.customer):
+                cursor.execute("PRAGMA cache_size")
+                self.assertNotEqual(cursor.fetchone()[0], cache_size)
+            cursor.execute("PRAGMA cache_size")
+            self.assertEqual(cursor.fetchone()[0], cache_size)
+
+
+@override_settings(GLUCOSE_IMPORT_EAGER=True, GLUCOSE_IMPORT_LOADER="native")
+class NativeLoaderImportTest(TestCase):
+    def test_import_matches_orm_loader(self):
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv", CSV_DATA.encode("utf-8"), content_type="text/csv"
+        )
+        response = self.client.post(
+            "/api/v1/prepopulate-data/", {"file": csv_file_upload}, format="multipart"
+        )
+
+        self.assertEqual(response.data["status"], "succeeded")
+        self.assertEqual(GlucoseData.objects.count(), 14)
+        self.assertEqual(
+            GlucoseData.objects.with_text().get(glucose_history=148).notes, "77"
+        )
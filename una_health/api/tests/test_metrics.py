@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone
+
+from api.metrics import ChannelMetrics
+from api.models import Customer, GlucoseData
+from api.tests.test_views import ResponseCacheMixin
+from django.test import SimpleTestCase, TestCase
+
+START = datetime(2024, 4, 26, tzinfo=timezone.utc)
+
+
+def minutes(count):
+    return START + timedelta(minutes=count)
+
+
+class ChannelMetricsTest(SimpleTestCase):
+    def metrics(self, readings, max_gap=20 * 60):
+        metrics = ChannelMetrics(max_gap)
+        for minute, value in readings:
+            metrics.add(minutes(minute), value)
+        return metrics.finish()
+
+    def test_evenly_spaced_readings(self):
+        # One reading below, two in and one above the target range
+        metrics = self.metrics([(0, 60), (15, 100), (30, 140), (45, 200)])
+
+        self.assertEqual(metrics["count"], 4)
+        self.assertEqual(metrics["mean"], 125)
+        self.assertEqual(metrics["gmi"], 6.3)
+        self.assertEqual(metrics["time_below_range"], 25)
+        self.assertEqual(metrics["time_in_range"], 50)
+        self.assertEqual(metrics["time_above_range"], 25)
+        self.assertEqual(metrics["cv"], 41.38)
+
+    def test_gaps_are_capped(self):
+        # Without the cap the reading before the six hour gap would dominate
+        metrics = self.metrics([(0, 200), (360, 100), (375, 100)], max_gap=15 * 60)
+
+        self.assertEqual(metrics["covered_minutes"], 45)
+        self.assertEqual(metrics["time_above_range"], 33.33)
+        self.assertEqual(metrics["time_in_range"], 66.67)
+
+    def test_readings_weighted_by_time(self):
+        # The scan five minutes before the next reading covers five minutes
+        metrics = self.metrics([(0, 100), (10, 250), (15, 100)])
+
+        self.assertEqual(metrics["covered_minutes"], 20)
+        self.assertEqual(metrics["time_above_range"], 25)
+
+    def test_no_readings(self):
+        metrics = self.metrics([])
+
+        self.assertEqual(metrics["count"], 0)
+        self.assertIsNone(metrics["time_in_range"])
+        self.assertIsNone(metrics["gmi"])
+
+
+class GlucoseMetricsViewTest(ResponseCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for user_id, values in (
+            ("user1", [60, 100, 140, 200]),
+            ("user2", [100, 120]),
+            ("user3", [300]),
+        ):
+            user = Customer.objects.create(user_id=user_id)
+            GlucoseData.objects.bulk_create(
+                GlucoseData(
+                    user=user,
+                    device_timestamp=minutes(15 * i),
+                    record_type=0,
+                    glucose_history=value,
+                    glucose_scan=value if i == 0 else None,
+                )
+                for i, value in enumerate(values)
+            )
+
+    def get(self, query_string=""):
+        response = self.client.get(f"/api/v1/glucose-metrics/?{query_string}")
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_single_user(self):
+        (metrics,) = self.get("user_id=user1")
+
+        self.assertEqual(metrics["user_id"], "user1")
+        self.assertEqual(metrics["glucose_history"]["time_in_range"], 50)
+        self.assertEqual(metrics["glucose_history"]["mean"], 125)
+        self.assertEqual(metrics["glucose_scan"]["count"], 1)
+        self.assertEqual(metrics["glucose_scan"]["time_below_range"], 100)
+
+    def test_all_users_in_one_query(self):
+        with self.assertNumQueries(1):
+            results = self.get()
+
+        self.assertEqual([m["user_id"] for m in results], ["user1", "user2", "user3"])
+
+    def test_batch_keeps_requested_order(self):
+        results = self.get("user_ids=user3,unknown,user2")
+
+        self.assertEqual([m["user_id"] for m in results], ["user3", "unknown", "user2"])
+        self.assertEqual(results[0]["glucose_history"]["time_above_range"], 100)
+        self.assertEqual(results[1]["glucose_history"]["count"], 0)
+        self.assertIsNone(results[1]["glucose_history"]["time_in_range"])
+
+    def test_time_window(self):
+        (metrics,) = self.get(
+            "user_id=user1&start_timestamp=2024-04-26T00:15:00Z"
+            "&stop_timestamp=2024-04-26T00:30:00Z"
+        )
+
+        self.assertEqual(metrics["glucose_history"]["count"], 2)
+        self.assertEqual(metrics["glucose_history"]["mean"], 120)
+
+    def test_empty_user_ids(self):
+        response = self.client.get("/api/v1/glucose-metrics/?user_ids=,")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("user_ids", response.data)
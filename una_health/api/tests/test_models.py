@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from api.models import Customer, Device, GlucoseData
+from api.models import Customer, Device, GlucoseData, GlucoseDataText
 from django.test import TestCase
 from django.utils import timezone
 
@@ -82,14 +82,10 @@ class GlucoseDataTest(TestCase):
             record_type=5,
             glucose_history=185,
             glucose_scan=201,
-            non_numeric_rapid_acting_insulin="abc",
             rapid_acting_insulin=12,
-            non_numeric_food_data="apple",
             carbohydrates_grams=100,
             carbohydrates_portions=5,
-            non_numeric_depot_insulin="xyz",
             depot_insulin=15,
-            notes="in testing phase",
             glucose_test_strips=2,
             ketone=10,
             meal_insulin=20,
@@ -128,23 +124,11 @@ class GlucoseDataTest(TestCase):
         field_label = glucose_data._meta.get_field("glucose_scan").verbose_name
         self.assertEqual(field_label, "glucose scan")
 
-    def test_non_numeric_rapid_acting_insulin_label(self):
-        glucose_data = GlucoseData.objects.get(id=1)
-        field_label = glucose_data._meta.get_field(
-            "non_numeric_rapid_acting_insulin"
-        ).verbose_name
-        self.assertEqual(field_label, "non numeric rapid acting insulin")
-
     def test_rapid_acting_insulin_label(self):
         glucose_data = GlucoseData.objects.get(id=1)
         field_label = glucose_data._meta.get_field("rapid_acting_insulin").verbose_name
         self.assertEqual(field_label, "rapid acting insulin")
 
-    def test_non_numeric_food_data_label(self):
-        glucose_data = GlucoseData.objects.get(id=1)
-        field_label = glucose_data._meta.get_field("non_numeric_food_data").verbose_name
-        self.assertEqual(field_label, "non numeric food data")
-
     def test_carbohydrates_grams_label(self):
         glucose_data = GlucoseData.objects.get(id=1)
         field_label = glucose_data._meta.get_field("carbohydrates_grams").verbose_name
@@ -157,23 +141,11 @@ class GlucoseDataTest(TestCase):
         ).verbose_name
         self.assertEqual(field_label, "carbohydrates portions")
 
-    def test_non_numeric_depot_insulin_label(self):
-        glucose_data = GlucoseData.objects.get(id=1)
-        field_label = glucose_data._meta.get_field(
-            "non_numeric_depot_insulin"
-        ).verbose_name
-        self.assertEqual(field_label, "non numeric depot insulin")
-
     def test_depot_insulin_label(self):
         glucose_data = GlucoseData.objects.get(id=1)
         field_label = glucose_data._meta.get_field("depot_insulin").verbose_name
         self.assertEqual(field_label, "depot insulin")
 
-    def test_notes_label(self):
-        glucose_data = GlucoseData.objects.get(id=1)
-        field_label = glucose_data._meta.get_field("notes").verbose_name
-        self.assertEqual(field_label, "notes")
-
     def test_glucose_test_strips_label(self):
         glucose_data = GlucoseData.objects.get(id=1)
         field_label = glucose_data._meta.get_field("glucose_test_strips").verbose_name
@@ -201,30 +173,10 @@ class GlucoseDataTest(TestCase):
         ).verbose_name
         self.assertEqual(field_label, "insulin change by user")
 
-    # test max-length
-    def test_non_numeric_rapid_acting_insulin_max_length(self):
+    def test_record_type_choices(self):
         glucose_data = GlucoseData.objects.get(id=1)
-        max_length = glucose_data._meta.get_field(
-            "non_numeric_rapid_acting_insulin"
-        ).max_length
-        self.assertEqual(max_length, 255)
-
-    def test_non_numeric_food_data_max_length(self):
-        glucose_data = GlucoseData.objects.get(id=1)
-        max_length = glucose_data._meta.get_field("non_numeric_food_data").max_length
-        self.assertEqual(max_length, 255)
-
-    def test_non_numeric_depot_insulin_max_length(self):
-        glucose_data = GlucoseData.objects.get(id=1)
-        max_length = glucose_data._meta.get_field(
-            "non_numeric_depot_insulin"
-        ).max_length
-        self.assertEqual(max_length, 255)
-
-    def test_notes_max_length(self):
-        glucose_data = GlucoseData.objects.get(id=1)
-        max_length = glucose_data._meta.get_field("notes").max_length
-        self.assertEqual(max_length, 255)
+        self.assertEqual(glucose_data.record_type, GlucoseData.RecordType.FOOD)
+        self.assertEqual(glucose_data.get_record_type_display(), "Food")
 
     # test  foreign key
     def test_customer_foreign_key(self):
@@ -285,19 +237,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.glucose_scan)
 
-    def test_non_numeric_rapid_acting_insulin_null(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer,
-            device=device,
-            device_timestamp=timezone.now(),
-            record_type=5,
-            non_numeric_rapid_acting_insulin=None,
-        )
-
-        self.assertIsNone(glucose_data.non_numeric_rapid_acting_insulin)
-
     def test_rapid_acting_insulin_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -311,19 +250,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.rapid_acting_insulin)
 
-    def non_numeric_food_data(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer,
-            device=device,
-            device_timestamp=timezone.now(),
-            record_type=5,
-            non_numeric_food_data=None,
-        )
-
-        self.assertIsNone(glucose_data.non_numeric_food_data)
-
     def test_carbohydrates_grams_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -350,19 +276,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.carbohydrates_portions)
 
-    def test_non_numeric_depot_insulin_null(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer,
-            device=device,
-            device_timestamp=timezone.now(),
-            record_type=5,
-            non_numeric_depot_insulin=None,
-        )
-
-        self.assertIsNone(glucose_data.non_numeric_depot_insulin)
-
     def test_depot_insulin_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -376,19 +289,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.depot_insulin)
 
-    def test_notes_null(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer,
-            device=device,
-            device_timestamp=timezone.now(),
-            record_type=5,
-            notes=None,
-        )
-
-        self.assertIsNone(glucose_data.notes)
-
     def test_glucose_test_strips_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -481,15 +381,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.glucose_scan)
 
-    def test_non_numeric_rapid_acting_insulin_null(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer, device=device, device_timestamp=timezone.now(), record_type=5
-        )
-
-        self.assertIsNone(glucose_data.non_numeric_rapid_acting_insulin)
-
     def test_rapid_acting_insulin_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -499,15 +390,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.rapid_acting_insulin)
 
-    def non_numeric_food_data(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer, device=device, device_timestamp=timezone.now(), record_type=5
-        )
-
-        self.assertIsNone(glucose_data.non_numeric_food_data)
-
     def test_carbohydrates_grams_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -526,15 +408,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.carbohydrates_portions)
 
-    def test_non_numeric_depot_insulin_null(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer, device=device, device_timestamp=timezone.now(), record_type=5
-        )
-
-        self.assertIsNone(glucose_data.non_numeric_depot_insulin)
-
     def test_depot_insulin_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -544,15 +417,6 @@ class GlucoseDataTest(TestCase):
 
         self.assertIsNone(glucose_data.depot_insulin)
 
-    def test_notes_null(self):
-        customer = GlucoseData.objects.get(id=1).user
-        device = GlucoseData.objects.get(id=1).device
-        glucose_data = GlucoseData.objects.create(
-            user=customer, device=device, device_timestamp=timezone.now(), record_type=5
-        )
-
-        self.assertIsNone(glucose_data.notes)
-
     def test_glucose_test_strips_null(self):
         customer = GlucoseData.objects.get(id=1).user
         device = GlucoseData.objects.get(id=1).device
@@ -597,3 +461,51 @@ class GlucoseDataTest(TestCase):
         )
 
         self.assertIsNone(glucose_data.insulin_change_by_user)
+
+
+class GlucoseDataTextTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customer = Customer.objects.create(user_id="mike-123")
+        reading = GlucoseData.objects.create(
+            user=customer, device_timestamp=timezone.now(), record_type=5
+        )
+        GlucoseDataText.objects.create(reading=reading, notes="in testing phase")
+
+    def test_labels_and_max_length(self):
+        for name, label in (
+            ("non_numeric_rapid_acting_insulin", "non numeric rapid acting insulin"),
+            ("non_numeric_food_data", "non numeric food data"),
+            ("non_numeric_depot_insulin", "non numeric depot insulin"),
+            ("notes", "notes"),
+        ):
+            field = GlucoseDataText._meta.get_field(name)
+            self.assertEqual(field.verbose_name, label)
+            self.assertEqual(field.max_length, 255)
+
+    def test_blank_texts_are_empty(self):
+        text = GlucoseData.objects.get().text
+        self.assertEqual(text.notes, "in testing phase")
+        self.assertEqual(text.non_numeric_food_data, "")
+
+    def test_reading_without_text(self):
+        reading = GlucoseData.objects.create(
+            user_id="mike-123", device_timestamp=timezone.now(), record_type=0
+        )
+        with self.assertRaises(GlucoseDataText.DoesNotExist):
+            reading.text
+
+    def test_with_text_annotates_empty_strings(self):
+        GlucoseData.objects.create(
+            user_id="mike-123", device_timestamp=timezone.now(), record_type=0
+        )
+        notes = (
+            GlucoseData.objects.with_text()
+            .order_by("id")
+            .values_list("notes", flat=True)
+        )
+        self.assertEqual(list(notes), ["in testing phase", ""])
+
+    def test_reading_on_delete(self):
+        GlucoseData.objects.get().delete()
+        self.assertFalse(GlucoseDataText.objects.exists())
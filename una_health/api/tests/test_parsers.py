@@ -0,0 +1,139 @@
+import csv
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from api.parsers import INVALID, LibreViewParser, parse_decimal, parse_integer
+from django.test import SimpleTestCase
+
+
+def csv_rows(text):
+    return list(csv.reader(text.splitlines()))
+
+
+class ParseIntegerTest(SimpleTestCase):
+    def test_values(self):
+        self.assertEqual(parse_integer("139"), 139)
+        self.assertEqual(parse_integer(" 4 "), 4)
+        self.assertEqual(parse_integer("3,0"), 3)
+        self.assertIsNone(parse_integer(""))
+        self.assertIsNone(parse_integer("abc"))
+        self.assertIsNone(parse_integer("inf"))
+
+    def test_decimals_are_invalid(self):
+        self.assertIs(parse_integer("0.6"), INVALID)
+        self.assertIs(parse_integer("1,5"), INVALID)
+
+    def test_range(self):
+        self.assertEqual(parse_integer("0"), 0)
+        self.assertEqual(parse_integer("32767"), 32767)
+        self.assertIs(parse_integer("32768"), INVALID)
+        self.assertIs(parse_integer("-4"), INVALID)
+        self.assertEqual(parse_integer("-4", minimum=-10), -4)
+
+
+class ParseDecimalTest(SimpleTestCase):
+    def test_values(self):
+        self.assertEqual(parse_decimal("0.6"), Decimal("0.60"))
+        self.assertEqual(parse_decimal("1,5"), Decimal("1.50"))
+        self.assertEqual(parse_decimal(" 4 "), Decimal("4.00"))
+        self.assertIsNone(parse_decimal(""))
+        self.assertIsNone(parse_decimal("abc"))
+        self.assertIsNone(parse_decimal("NaN"))
+
+    def test_more_places_are_invalid(self):
+        self.assertEqual(parse_decimal("0.250"), Decimal("0.25"))
+        self.assertIs(parse_decimal("0.125"), INVALID)
+
+    def test_range(self):
+        self.assertEqual(parse_decimal("99999.99"), Decimal("99999.99"))
+        self.assertIs(parse_decimal("100000"), INVALID)
+        self.assertIs(parse_decimal("-1.5"), INVALID)
+        self.assertEqual(parse_decimal("-1.5", minimum=-10), Decimal("-1.50"))
+
+
+class LibreViewParserTest(SimpleTestCase):
+    def test_typed_columns(self):
+        rows = csv_rows(
+            "FreeStyle LibreLink,SN-1,10-02-2021 09:40,0,139,,,,,,,,,,,,,,\n"
+            'FreeStyle LibreLink,SN-1,10-02-2021 09:55,1,,120,,"2,0",,30,,,,"a, b",,,,,\n'
+        )
+
+        columns, invalid = LibreViewParser().parse(rows)
+
+        self.assertEqual(columns["serial_number"], ["SN-1", "SN-1"])
+        self.assertEqual(
+            columns["device_timestamp"],
+            [
+                datetime(2021, 2, 10, 9, 40, tzinfo=timezone.utc),
+                datetime(2021, 2, 10, 9, 55, tzinfo=timezone.utc),
+            ],
+        )
+        self.assertEqual(columns["record_type"], [0, 1])
+        self.assertEqual(columns["glucose_history"], [139, None])
+        self.assertEqual(columns["glucose_scan"], [None, 120])
+        self.assertEqual(columns["rapid_acting_insulin"], [None, Decimal("2.00")])
+        self.assertEqual(columns["carbohydrates_grams"], [None, 30])
+        self.assertEqual(columns["notes"], ["", "a, b"])
+        self.assertEqual(invalid, 0)
+
+    def test_empties_invalid_cells(self):
+        rows = csv_rows(
+            "FreeStyle,SN-1,10-02-2021 09:40,0,40000\n"
+            "FreeStyle,SN-1,10-02-2021 09:45,3,,,,,,,,,,,,0.6\n"
+            "FreeStyle,SN-1,10-02-2021 09:50,3,,,,,,,,,,,,0.125,,,-2\n"
+            "FreeStyle,SN-1,10-02-2021 09:55,0,141.5\n"
+        )
+
+        columns, invalid = LibreViewParser().parse(rows)
+
+        self.assertEqual(invalid, 3)
+        self.assertEqual(columns["record_type"], [0, 3, 3, 0])
+        self.assertEqual(columns["glucose_history"], [None, None, None, None])
+        self.assertEqual(columns["ketone"], [None, Decimal("0.60"), None, None])
+        self.assertEqual(
+            columns["insulin_change_by_user"], [None, None, Decimal("-2.00"), None]
+        )
+
+    def test_leaves_out_rows_without_record_type(self):
+        rows = csv_rows(
+            "FreeStyle,SN-1,10-02-2021 09:40,0,139\n"
+            "FreeStyle,SN-1,10-02-2021 09:45,-1,140\n"
+            "FreeStyle,SN-1,10-02-2021 09:50,,141\n"
+            "FreeStyle,SN-1,10-02-2021 09:55,0,142\n"
+        )
+
+        columns, invalid = LibreViewParser().parse(rows)
+
+        self.assertEqual(invalid, 2)
+        self.assertEqual(columns["glucose_history"], [139, 142])
+        self.assertEqual(columns["record_type"], [0, 0])
+        self.assertEqual(len(columns["device_timestamp"]), 2)
+
+    def test_pads_short_rows(self):
+        columns, _ = LibreViewParser().parse(
+            csv_rows("FreeStyle,SN-1,10-02-2021 09:40,0,139")
+        )
+
+        self.assertEqual(columns["glucose_history"], [139])
+        self.assertEqual(columns["insulin_change_by_user"], [None])
+        self.assertEqual(columns["notes"], [""])
+
+    def test_detects_timestamp_format(self):
+        parser = LibreViewParser()
+        columns, _ = parser.parse(csv_rows("FreeStyle,SN-1,02-10-2021 01:15 PM,0,139"))
+        later, _ = parser.parse(csv_rows("FreeStyle,SN-1,02-11-2021 09:00 AM,0,140"))
+
+        self.assertEqual(
+            columns["device_timestamp"],
+            [datetime(2021, 2, 10, 13, 15, tzinfo=timezone.utc)],
+        )
+        self.assertEqual(
+            later["device_timestamp"], [datetime(2021, 2, 11, 9, tzinfo=timezone.utc)]
+        )
+
+    def test_invalid_timestamp(self):
+        parser = LibreViewParser()
+        parser.parse(csv_rows("FreeStyle,SN-1,10-02-2021 09:40,0,139"))
+
+        with self.assertRaisesMessage(ValueError, "'31-02-2021 09:40'"):
+            parser.parse(csv_rows("FreeStyle,SN-1,31-02-2021 09:40,0,139"))
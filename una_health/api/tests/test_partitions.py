@@ -0,0 +1,169 @@
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import skipUnless
+
+from api.models import Customer, GlucoseData
+from api.partitions import (
+    attached_partitions,
+    create_partition_sql,
+    ensure_partitions,
+    month_start,
+    months_between,
+    partition_name,
+    partitions,
+)
+from api.tests.test_query_counts import create_readings
+from api.tests.test_query_plans import QueryPlanTestCase
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def attached_partitions_of(table):
+    with connection.cursor() as cursor:
+        return attached_partitions(cursor, table)
+
+
+class PartitionNamingTest(SimpleTestCase):
+    def test_month_start_is_utc(self):
+        timestamp = datetime.fromisoformat("2024-05-01T01:30:00+02:00")
+
+        self.assertEqual(month_start(timestamp), utc(2024, 4, 1))
+
+    def test_months_between_crosses_years(self):
+        self.assertEqual(
+            list(months_between(utc(2023, 11, 15), utc(2024, 2, 1))),
+            [utc(2023, 11, 1), utc(2023, 12, 1), utc(2024, 1, 1), utc(2024, 2, 1)],
+        )
+
+    def test_create_partition_sql(self):
+        month = utc(2024, 12, 1)
+
+        self.assertEqual(
+            partition_name("api_glucosedata", month), "api_glucosedata_y2024m12"
+        )
+        self.assertEqual(
+            create_partition_sql("api_glucosedata", month),
+            [
+                'CREATE TABLE "api_glucosedata_y2024m12" '
+                '(LIKE "api_glucosedata" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                'ALTER TABLE "api_glucosedata" '
+                'ATTACH PARTITION "api_glucosedata_y2024m12" '
+                "FOR VALUES FROM ('2024-12-01T00:00:00+00:00') "
+                "TO ('2025-01-01T00:00:00+00:00')",
+            ],
+        )
+
+
+class PartitionRoutingTest(TransactionTestCase):
+    def setUp(self):
+        partitions.clear()
+        self.addCleanup(partitions.clear)
+        if connection.vendor == "postgresql":
+            # Partitions are committed on a connection of their own and
+            # outlive the test, the ones it creates are dropped again
+            existing = attached_partitions_of("api_glucosedata")
+            self.addCleanup(self.drop_partitions_except, existing)
+
+    def drop_partitions_except(self, existing):
+        with connection.cursor() as cursor:
+            for name in attached_partitions_of("api_glucosedata") - existing:
+                cursor.execute(f'DROP TABLE "{name}"')
+
+    @skipUnless(connection.vendor == "sqlite", "SQLite keeps a single table")
+    def test_single_table_needs_no_partitions(self):
+        with self.assertNumQueries(0):
+            ensure_partitions("api_glucosedata", [utc(2024, 4, 26)])
+
+        stdout = StringIO()
+        call_command("create_glucose_partitions", stdout=stdout)
+        self.assertIn("not used on sqlite", stdout.getvalue())
+
+    @skipUnless(connection.vendor == "postgresql", "Partitions need PostgreSQL")
+    def test_partitions_are_created_on_insert(self):
+        create_readings("user1", "SN-1", 3000)
+
+        self.assertLessEqual(
+            {"api_glucosedata_y2024m04", "api_glucosedata_y2024m05"},
+            attached_partitions_of("api_glucosedata"),
+        )
+        # Known partitions are not created again
+        with self.assertNumQueries(0):
+            ensure_partitions("api_glucosedata", [utc(2024, 4, 27)])
+
+    @skipUnless(connection.vendor == "postgresql", "Partitions need PostgreSQL")
+    def test_partitions_are_committed_outside_the_import_transaction(self):
+        try:
+            with transaction.atomic():
+                ensure_partitions("api_glucosedata", [utc(2031, 7, 4)])
+                raise DatabaseError("import failed")
+        except DatabaseError:
+            pass
+
+        self.assertIn(
+            "api_glucosedata_y2031m07", attached_partitions_of("api_glucosedata")
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "Partitions need PostgreSQL")
+    def test_transaction_holding_attach_locks_uses_default_partition(self):
+        with transaction.atomic():
+            # Creating a customer locks the table the readings reference
+            Customer.objects.create(user_id="user1")
+            with self.assertLogs("api.partitions", "WARNING"):
+                ensure_partitions("api_glucosedata", [utc(2031, 8, 4)])
+
+        self.assertNotIn(
+            "api_glucosedata_y2031m08", attached_partitions_of("api_glucosedata")
+        )
+        # The month is tried again by the next transaction
+        ensure_partitions("api_glucosedata", [utc(2031, 8, 4)])
+        self.assertIn(
+            "api_glucosedata_y2031m08", attached_partitions_of("api_glucosedata")
+        )
+
+    @skipUnless(connection.vendor == "postgresql", "Partitions need PostgreSQL")
+    def test_default_partition_exists(self):
+        self.assertIn(
+            "api_glucosedata_default", attached_partitions_of("api_glucosedata")
+        )
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitions need PostgreSQL")
+class PartitionPruningTest(QueryPlanTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The partitions are created before the class's transaction takes any
+        # locks, or its readings would all go to the default partition
+        cls.existing = attached_partitions_of("api_glucosedata")
+        partitions.clear()
+        months = months_between(utc(2024, 4, 26), utc(2024, 6, 1))
+        ensure_partitions("api_glucosedata", list(months))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        with connection.cursor() as cursor:
+            for name in attached_partitions_of("api_glucosedata") - cls.existing:
+                cursor.execute(f'DROP TABLE "{name}"')
+        partitions.clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        # 15 minute readings from the end of April into June
+        create_readings("user1", "SN-1", 3000)
+
+    def test_window_only_scans_its_month(self):
+        queryset = GlucoseData.objects.filter(
+            user_id="user1",
+            device_timestamp__gte=utc(2024, 5, 10),
+            device_timestamp__lte=utc(2024, 5, 12),
+        )
+
+        plan = self.explain(queryset)
+        self.assertIn("api_glucosedata_y2024m05", plan)
+        self.assertNotIn("api_glucosedata_y2024m04", plan)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from api.models import Customer, Device, GlucoseData
+from api.tests.test_views import ResponseCacheMixin
+from django.test import TestCase
+
+
+def create_readings(user_id, serial_number, count):
+    user = Customer.objects.create(user_id=user_id)
+    device = Device.objects.create(device_name="FreeStyle", serial_number=serial_number)
+    start = datetime(2024, 4, 26, tzinfo=timezone.utc)
+    GlucoseData.objects.bulk_create(
+        GlucoseData(
+            user=user,
+            device=device,
+            device_timestamp=start + timedelta(minutes=15 * i),
+            record_type=0,
+            glucose_history=100 + i % 50,
+        )
+        for i in range(count)
+    )
+
+
+class GlucoseDataQueryCountTest(ResponseCacheMixin, TestCase):
+    """The number of queries per request must not grow with the page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_readings("user1", "SN-1", 60)
+        create_readings("user2", "SN-2", 60)
+
+    def assertQueriesPerPage(self, url, num, page_sizes=(1, 10, 50)):
+        for page_size in page_sizes:
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(num):
+                    response = self.client.get(url.format(limit=page_size))
+                self.assertEqual(response.status_code, 200)
+
+    def test_unpaginated_list(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/levels/?user_id=user1")
+        self.assertEqual(len(response.data), 60)
+
+    def test_limit_offset_pages(self):
+        # One count query plus the page itself
+        self.assertQueriesPerPage("/api/v1/levels/?limit={limit}&offset=5", 2)
+
+    def test_cursor_pages(self):
+        self.assertQueriesPerPage("/api/v1/levels/?cursor=&limit={limit}", 1)
+
+    def test_filtered_pages(self):
+        self.assertQueriesPerPage(
+            "/api/v1/levels/?user_id=user2&ordering=-device_timestamp&limit={limit}",
+            2,
+        )
+
+    def test_single_reading(self):
+        reading = GlucoseData.objects.first()
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/v1/levels/{reading.id}/")
+        self.assertEqual(response.data["device"]["serial_number"], "SN-1")
+
+    def test_reading_without_device(self):
+        GlucoseData.objects.update(device=None)
+        self.assertQueriesPerPage("/api/v1/levels/?cursor=&limit={limit}", 1)
@@ -0,0 +1,163 @@
+import re
+
+from api.aggregates import GLUCOSE_CHANNELS, EpochBucket
+from api.filters import filter_glucose_data
+from api.models import Customer, GlucoseData
+from api.tests.test_views import test_data_create
+from django.db import connection
+from django.db.models import Count, FilteredRelation, Q
+from django.http import QueryDict
+from django.test import TestCase
+
+# Plan lines that read every row of a table rather than a range of an index
+FULL_SCAN_PATTERNS = {
+    "sqlite": r"\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)",
+    "postgresql": r"Seq Scan on (\w+)",
+}
+# Plan lines that sort all rows. PostgreSQL merges the sorted rows of several
+# partitions with a Merge Append, and an Incremental Sort of rows already sorted
+# by a prefix of the order streams, neither is a full sort.
+SORT_PATTERNS = {
+    "sqlite": r"USE TEMP B-TREE FOR ORDER BY",
+    "postgresql": r"(?m)^ *(?:-> +)?Sort  \(",
+}
+# PostgreSQL prefers sequential scans and sorts of the few test rows over any
+# index, so they are made prohibitively expensive. Plans that still use them
+# have no index to use instead.
+PLANNER_SETTINGS = {"postgresql": ["enable_seqscan", "enable_sort"]}
+
+
+class QueryPlanTestCase(TestCase):
+    """Runs EXPLAIN on querysets and inspects the plan chosen by the database."""
+
+    def explain(self, queryset):
+        settings = PLANNER_SETTINGS.get(connection.vendor, [])
+        with connection.cursor() as cursor:
+            for setting in settings:
+                cursor.execute(f"SET {setting} = off")
+            try:
+                return queryset.explain()
+            finally:
+                for setting in settings:
+                    cursor.execute(f"RESET {setting}")
+
+    def assertNoFullTableScan(self, queryset):
+        plan = self.explain(queryset)
+        pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f"No plan inspection for {connection.vendor}")
+        scans = re.findall(pattern, plan)
+        self.assertFalse(scans, f"Full table scan of {scans} in plan:\n{plan}")
+
+    def assertNoSort(self, queryset):
+        plan = self.explain(queryset)
+        pattern = SORT_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f"No plan inspection for {connection.vendor}")
+        self.assertNotRegex(plan, pattern)
+
+
+class GlucoseDataQueryPlanTest(QueryPlanTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def filtered(self, query_string):
+        return filter_glucose_data(GlucoseData.objects.all(), QueryDict(query_string))
+
+    def test_list_filtered_by_user_and_range(self):
+        queryset = self.filtered(
+            "user_id=user1&start_timestamp=2024-04-26&stop_timestamp=2024-04-27"
+        ).order_by("device_timestamp")
+
+        self.assertNoFullTableScan(queryset)
+        self.assertNoSort(queryset)
+
+    def test_list_filtered_by_user(self):
+        queryset = self.filtered("user_id=user1").order_by("-device_timestamp")
+
+        self.assertNoFullTableScan(queryset)
+        self.assertNoSort(queryset)
+
+    def test_list_filtered_by_range(self):
+        queryset = self.filtered(
+            "start_timestamp=2024-04-26&stop_timestamp=2024-04-27"
+        ).order_by("device_timestamp")
+
+        self.assertNoFullTableScan(queryset)
+        self.assertNoSort(queryset)
+
+    def test_keyset_page_filtered_by_user(self):
+        timestamp = GlucoseData.objects.filter(user_id="user1").first().device_timestamp
+        queryset = (
+            self.filtered("user_id=user1")
+            .order_by("device_timestamp", "id")
+            .filter(device_timestamp__gte=timestamp)
+            .exclude(device_timestamp=timestamp, id__lte=1)
+        )
+
+        self.assertNoFullTableScan(queryset)
+        self.assertNoSort(queryset)
+
+    def test_statistics_filtered_by_user_and_range(self):
+        queryset = (
+            self.filtered(
+                "user_id=user1&start_timestamp=2024-04-26&stop_timestamp=2024-04-27"
+            )
+            .values_list(*GLUCOSE_CHANNELS)
+            .annotate(readings=Count("id"))
+        )
+
+        self.assertNoFullTableScan(queryset)
+
+    def test_detects_full_table_scan(self):
+        queryset = GlucoseData.objects.filter(glucose_history__gt=100)
+
+        with self.assertRaises(AssertionError):
+            self.assertNoFullTableScan(queryset)
+
+    def test_statistics_filtered_by_range(self):
+        queryset = (
+            self.filtered("start_timestamp=2024-04-26&stop_timestamp=2024-04-27")
+            .values_list(*GLUCOSE_CHANNELS)
+            .annotate(readings=Count("id"))
+        )
+
+        self.assertNoFullTableScan(queryset)
+
+    def test_series_filtered_by_user_and_range(self):
+        queryset = (
+            self.filtered(
+                "user_id=user1&start_timestamp=2024-04-26&stop_timestamp=2024-04-27"
+            )
+            .annotate(bucket=EpochBucket("device_timestamp", 900))
+            .values("bucket")
+            .annotate(readings=Count("glucose_history"))
+        )
+
+        self.assertNoFullTableScan(queryset)
+
+    def test_metrics_of_many_users(self):
+        queryset = (
+            self.filtered("start_timestamp=2024-04-26&stop_timestamp=2026-04-27")
+            .filter(user_id__in=["user1", "user2"])
+            .order_by("user", "device_timestamp")
+        )
+
+        self.assertNoFullTableScan(queryset)
+        self.assertNoSort(queryset)
+
+    def test_cohort_statistics_of_listed_users(self):
+        queryset = (
+            Customer.objects.filter(user_id__in=["user1", "user2"])
+            .annotate(
+                readings=FilteredRelation(
+                    "glucosedata",
+                    condition=Q(glucosedata__device_timestamp__gte="2024-04-26"),
+                )
+            )
+            .values("user_id")
+            .annotate(readings_count=Count("readings__glucose_history"))
+        )
+
+        self.assertNoFullTableScan(queryset)
@@ -0,0 +1,206 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from api.aggregates import glucose_statistics
+from api.devices import device_cache
+from api.filters import filter_glucose_data, glucose_filter_values
+from api.models import Customer, GlucoseDailySummary, GlucoseData
+from api.rollups import rebuild_daily_summaries, summarized_statistics
+from api.tests.test_query_counts import create_readings
+from api.tests.test_views import CSV_DATA
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+
+
+class GlucoseDailySummaryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # 15 minute readings over five days starting at midnight UTC
+        create_readings("user1", "SN-1", 480)
+        create_readings("user2", "SN-2", 100)
+        rebuild_daily_summaries("user1")
+        rebuild_daily_summaries("user2")
+
+    def statistics(self, query_string):
+        query_params = QueryDict(query_string)
+        queryset = filter_glucose_data(GlucoseData.objects.all(), query_params)
+        return summarized_statistics(queryset, *glucose_filter_values(query_params))
+
+    def test_rollup_matches_readings(self):
+        summary = GlucoseDailySummary.objects.get(user_id="user1", day="2024-04-27")
+        readings = GlucoseData.objects.filter(
+            user_id="user1", device_timestamp__date="2024-04-27"
+        )
+        values = list(readings.values_list("glucose_history", flat=True))
+
+        self.assertEqual(summary.glucose_history_count, 96)
+        self.assertEqual(summary.glucose_history_min, min(values))
+        self.assertEqual(summary.glucose_history_max, max(values))
+        self.assertEqual(summary.glucose_history_sum, sum(values))
+        self.assertEqual(
+            summary.glucose_history_sum_squares, sum(v * v for v in values)
+        )
+        self.assertEqual(summary.glucose_scan_count, 0)
+        self.assertIsNone(summary.glucose_scan_min)
+
+    def test_statistics_match_raw_readings(self):
+        for query_string in (
+            "",
+            "user_id=user1",
+            "user_id=user1&start_timestamp=2024-04-26T07:10:00Z",
+            "user_id=user1&stop_timestamp=2024-04-29T13:00:00Z",
+            "start_timestamp=2024-04-26T07:10:00Z&stop_timestamp=2024-04-29T13:00:00Z",
+            "user_id=user1&start_timestamp=2024-04-27&stop_timestamp=2024-04-29",
+            "user_id=user1&start_timestamp=2024-04-27T05:00:00Z"
+            "&stop_timestamp=2024-04-27T18:00:00Z",
+        ):
+            with self.subTest(query_string=query_string):
+                queryset = filter_glucose_data(
+                    GlucoseData.objects.all(), QueryDict(query_string)
+                )
+                self.assertEqual(
+                    self.statistics(query_string), glucose_statistics(queryset)
+                )
+
+    def test_whole_days_are_read_from_rollups(self):
+        # Rollups plus the partial first and last day
+        with self.assertNumQueries(3):
+            self.statistics(
+                "user_id=user1&start_timestamp=2024-04-26T07:10:00Z"
+                "&stop_timestamp=2024-04-29T13:00:00Z"
+            )
+        # Ranges from midnight to the latest reading have no partial days
+        with self.assertNumQueries(1):
+            self.statistics("user_id=user1&start_timestamp=2024-04-27T00:00:00Z")
+
+    def test_saved_reading_refreshes_its_day(self):
+        reading = GlucoseData.objects.filter(user_id="user1").first()
+        reading.glucose_history = 400
+        reading.save()
+
+        summary = GlucoseDailySummary.objects.get(user_id="user1", day="2024-04-26")
+        self.assertEqual(summary.glucose_history_max, 400)
+
+    def test_moved_reading_refreshes_both_days(self):
+        reading = GlucoseData.objects.filter(user_id="user2").first()
+        reading.device_timestamp = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        reading.save()
+
+        summaries = GlucoseDailySummary.objects.filter(user_id="user2")
+        self.assertEqual(
+            summaries.get(day="2024-04-26").glucose_history_count,
+            GlucoseData.objects.filter(
+                user_id="user2", device_timestamp__date="2024-04-26"
+            ).count(),
+        )
+        self.assertEqual(summaries.get(day="2024-05-01").glucose_history_count, 1)
+
+    def test_bulk_created_readings_refresh_their_days(self):
+        GlucoseData.objects.bulk_create(
+            GlucoseData(
+                user_id="user2",
+                device_timestamp=datetime(2024, 5, 1, hour, tzinfo=timezone.utc),
+                record_type=0,
+                glucose_history=90,
+            )
+            for hour in range(3)
+        )
+
+        summary = GlucoseDailySummary.objects.get(user_id="user2", day="2024-05-01")
+        self.assertEqual(summary.glucose_history_count, 3)
+
+    def test_updated_readings_refresh_their_days(self):
+        GlucoseData.objects.filter(
+            user_id="user2", device_timestamp__date="2024-04-27"
+        ).update(glucose_history=None, glucose_scan=80)
+
+        summary = GlucoseDailySummary.objects.get(user_id="user2", day="2024-04-27")
+        self.assertEqual(summary.glucose_history_count, 0)
+        self.assertEqual(summary.glucose_scan_count, 4)
+        self.assertEqual(summary.glucose_scan_max, 80)
+
+    def test_readings_updated_to_another_user_refresh_both_users(self):
+        GlucoseData.objects.filter(user_id="user2").update(user_id="user1")
+
+        self.assertFalse(GlucoseDailySummary.objects.filter(user_id="user2").exists())
+        summary = GlucoseDailySummary.objects.get(user_id="user1", day="2024-04-27")
+        self.assertEqual(summary.glucose_history_count, 100)
+
+    def test_deleted_readings_remove_their_day(self):
+        readings = GlucoseData.objects.filter(
+            user_id="user2", device_timestamp__date="2024-04-27"
+        )
+        for reading in readings:
+            reading.delete()
+
+        self.assertEqual(
+            list(
+                GlucoseDailySummary.objects.filter(user_id="user2").values_list(
+                    "day", flat=True
+                )
+            ),
+            [datetime(2024, 4, 26).date()],
+        )
+
+    def test_deleted_customer_deletes_rollups(self):
+        Customer.objects.get(user_id="user2").delete()
+
+        self.assertFalse(GlucoseDailySummary.objects.filter(user_id="user2").exists())
+
+    def test_rebuild_command(self):
+        GlucoseDailySummary.objects.all().delete()
+        stdout = StringIO()
+
+        call_command("rebuild_daily_summaries", "user1", stdout=stdout)
+
+        self.assertEqual(GlucoseDailySummary.objects.filter(user_id="user1").count(), 5)
+        self.assertFalse(GlucoseDailySummary.objects.filter(user_id="user2").exists())
+        self.assertIn("1 users", stdout.getvalue())
+
+
+@override_settings(GLUCOSE_IMPORT_EAGER=True, GLUCOSE_IMPORT_BATCH_SIZE=4)
+class GlucoseDailySummaryImportTest(TestCase):
+    def setUp(self):
+        self.addCleanup(device_cache.clear)
+
+    def import_csv(self, content):
+        upload = SimpleUploadedFile("user1.csv", content.encode("utf-8"))
+        self.client.post(
+            "/api/v1/prepopulate-data/bulk/", {"files": [upload]}, format="multipart"
+        )
+
+    def test_import_updates_rollups(self):
+        self.import_csv(CSV_DATA)
+
+        summary = GlucoseDailySummary.objects.get(user_id="user1")
+        self.assertEqual(summary.day, datetime(2021, 2, 10).date())
+        self.assertEqual(summary.glucose_history_count, 14)
+        self.assertEqual(summary.glucose_history_max, 155)
+        self.assertEqual(summary.glucose_scan_histogram, {"33": 1})
+
+    def test_reimport_with_changes_updates_rollups(self):
+        self.import_csv(CSV_DATA)
+        self.import_csv(CSV_DATA.replace(",0,155,", ",0,255,"))
+
+        summary = GlucoseDailySummary.objects.get(user_id="user1")
+        self.assertEqual(summary.glucose_history_count, 14)
+        self.assertEqual(summary.glucose_history_max, 255)
+
+    def test_rollups_follow_utc_days(self):
+        with override_settings(TIME_ZONE="Europe/Berlin"):
+            self.import_csv(CSV_DATA.replace("10-02-2021 09:40", "11-02-2021 00:30"))
+
+        # 00:30 in Berlin is still the 10th in UTC
+        summary = GlucoseDailySummary.objects.get(user_id="user1")
+        self.assertEqual(summary.day, datetime(2021, 2, 10).date())
+        self.assertEqual(summary.glucose_history_count, 14)
+        self.assertEqual(
+            summarized_statistics(
+                GlucoseData.objects.all(),
+                start=datetime(2021, 2, 9, tzinfo=timezone.utc),
+                stop=datetime(2021, 2, 10, tzinfo=timezone.utc) + timedelta(days=1),
+            )["glucose_history"]["count"],
+            14,
+        )
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from api.models import Customer, GlucoseData
+from api.serializers import GlucoseDataRowSerializer, GlucoseDataSerializer
+from api.tests.test_views import test_data_create
+from django.test import TestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+
+
+class GlucoseDataRowSerializerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+        GlucoseData.objects.create(
+            user=Customer.objects.get(user_id="user1"),
+            device=None,
+            device_timestamp=datetime(2024, 4, 27, 8, 15, 30, 120, tzinfo=timezone.utc),
+            record_type=1,
+            glucose_scan=99,
+            ketone=Decimal("1.25"),
+        )
+
+    def assertSameJSON(self, queryset):
+        row_serializer = GlucoseDataRowSerializer()
+        expected = JSONRenderer().render(
+            GlucoseDataSerializer(
+                queryset.select_related("user", "device", "text"), many=True
+            ).data
+        )
+        actual = JSONRenderer().render(
+            row_serializer.to_representation(row_serializer.get_queryset(queryset))
+        )
+        self.assertEqual(actual, expected)
+
+    def test_same_json_as_model_serializer(self):
+        self.assertSameJSON(GlucoseData.objects.order_by("id"))
+
+    @override_settings(TIME_ZONE="Europe/Berlin")
+    def test_same_json_in_other_time_zone(self):
+        self.assertSameJSON(GlucoseData.objects.order_by("id"))
+
+    def test_decimal_values_are_numbers(self):
+        data = JSONRenderer().render(
+            GlucoseDataSerializer(GlucoseData.objects.get(glucose_scan=99)).data
+        )
+
+        self.assertIn(b'"ketone":1.25', data)
+
+    def test_single_query(self):
+        row_serializer = GlucoseDataRowSerializer()
+        with self.assertNumQueries(1):
+            data = row_serializer.to_representation(
+                row_serializer.get_queryset(GlucoseData.objects.all())
+            )
+        self.assertEqual(len(data), 10)
+        self.assertIsNone(data[-1]["device"])
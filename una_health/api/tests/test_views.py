@@ -1,12 +1,39 @@
-from datetime import datetime
-from io import StringIO
+import csv
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from threading import current_thread
+from unittest import mock, skipUnless
 
-from api.models import Customer, Device, GlucoseData
+from api.devices import device_cache
+from api.exports import pyarrow
+from api.importers import import_glucose_csv
+from api.jobs import current_worker, fail_orphaned_jobs
+from api.models import Customer, Device, GlucoseData, GlucoseDataText, ImportJob
 from api.serializers import GlucoseDataSerializer
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, override_settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
+TEST_TEXTS = {
+    "non_numeric_rapid_acting_insulin": "abc",
+    "non_numeric_food_data": "apple",
+    "non_numeric_depot_insulin": "xyz",
+    "notes": "in testing phase",
+}
+
 
 def test_data_create():
     user1 = Customer.objects.create(user_id="user1")
@@ -23,7 +50,7 @@ def test_data_create():
     )
 
     for i in range(4):
-        GlucoseData.objects.create(
+        reading = GlucoseData.objects.create(
             user=user1,
             device=device1,
             device_timestamp=datetime(
@@ -32,23 +59,20 @@ def test_data_create():
             record_type=5 + i,
             glucose_history=185 + i,
             glucose_scan=201 + i,
-            non_numeric_rapid_acting_insulin="abc",
             rapid_acting_insulin=12 + i,
-            non_numeric_food_data="apple",
             carbohydrates_grams=100 + i,
             carbohydrates_portions=5 + i,
-            non_numeric_depot_insulin="xyz",
             depot_insulin=15 + i,
-            notes="in testing phase",
             glucose_test_strips=2 + i,
             ketone=10 + i,
             meal_insulin=20 + i,
             corrective_insulin=50 + i,
             insulin_change_by_user=5 + i,
         )
+        GlucoseDataText.objects.create(reading=reading, **TEST_TEXTS)
 
     for i in range(10, 15):
-        GlucoseData.objects.create(
+        reading = GlucoseData.objects.create(
             user=user2,
             device=device2,
             device_timestamp=datetime(
@@ -57,23 +81,53 @@ def test_data_create():
             record_type=5 + i,
             glucose_history=185 + i,
             glucose_scan=201 + i,
-            non_numeric_rapid_acting_insulin="abc",
             rapid_acting_insulin=12 + i,
-            non_numeric_food_data="apple",
             carbohydrates_grams=100 + i,
             carbohydrates_portions=5 + i,
-            non_numeric_depot_insulin="xyz",
             depot_insulin=15 + i,
-            notes="in testing phase",
             glucose_test_strips=2 + i,
             ketone=10 + i,
             meal_insulin=20 + i,
             corrective_insulin=50 + i,
             insulin_change_by_user=5 + i,
         )
+        GlucoseDataText.objects.create(reading=reading, **TEST_TEXTS)
+
+
+CSV_DATA = (
+    "Glukose-Werte,Erstellt am,25-02-2021 09:55 UTC,Erstellt von,ccc\n"
+    "\n"
+    "Gerät,Seriennummer,Gerätezeitstempel,Aufzeichnungstyp,Glukosewert-Verlauf mg/dL,Glukose-Scan mg/dL,"
+    "Nicht numerisches schnellwirkendes Insulin,Schnellwirkendes Insulin (Einheiten),Nicht numerische Nahrungsdaten,"
+    "Kohlenhydrate (Gramm),Kohlenhydrate (Portionen),Nicht numerisches Depotinsulin,Depotinsulin (Einheiten),"
+    "Notizen,Glukose-Teststreifen mg/dL,Keton mmol/L,Mahlzeiteninsulin (Einheiten),Korrekturinsulin (Einheiten),"
+    "Insulin-Änderung durch Anwender (Einheiten)\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 09:40,0,139,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 09:55,0,138,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:10,0,140,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:25,0,149,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:40,0,155,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:55,0,153,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:10,0,151,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:25,0,148,33,55,66,66,66,66,55,66,77,33,66,22,66,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:40,0,144,,,,100,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:55,0,145,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:10,0,143,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:25,0,139,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:40,0,136,,,,,,,,,,,,,,\n"
+    "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:55,0,132,,,,,,,,,,,,,,\n"
+)
+
 
+class ResponseCacheMixin:
+    """Starts every test with an empty response cache."""
 
-class GlucoseDataListViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        caches[settings.GLUCOSE_CACHE_ALIAS].clear()
+
+
+class GlucoseDataListViewTest(ResponseCacheMixin, TestCase):
     @classmethod
     def setUpTestData(cls):
         test_data_create()
@@ -115,6 +169,268 @@ class GlucoseDataListViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 9)
 
+    def test_invalid_timestamp(self):
+        response = self.client.get("/api/v1/levels/?stop_timestamp=tomorrow")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("stop_timestamp", response.data)
+
+
+class GlucoseDataFieldSelectionTest(ResponseCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def test_select_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/v1/levels/?user_id=user1&fields=device_timestamp,glucose_history"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(
+            response.data[0],
+            {"device_timestamp": "2024-04-26T12:30:00Z", "glucose_history": 185},
+        )
+        sql = queries[0]["sql"]
+        self.assertNotIn("notes", sql)
+        self.assertNotIn("api_device", sql)
+
+    def test_exclude_fields(self):
+        response = self.client.get("/api/v1/levels/?limit=2&exclude=user,device,notes")
+
+        self.assertEqual(response.status_code, 200)
+        row = response.data["results"][0]
+        self.assertEqual(len(row), 17)
+        self.assertNotIn("user", row)
+        self.assertNotIn("notes", row)
+        self.assertEqual(row["glucose_scan"], 201)
+
+    def test_select_fields_with_cursor(self):
+        first = self.client.get("/api/v1/levels/?cursor=&limit=5&fields=glucose_scan")
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(first.data["results"][0], {"glucose_scan": 201})
+        self.assertEqual(len(second.data["results"]), 4)
+        self.assertEqual(second.data["results"][-1], {"glucose_scan": 215})
+
+    def test_unknown_field(self):
+        response = self.client.get("/api/v1/levels/?fields=glucose_history,password")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["fields"], ["Unknown field 'password'."])
+
+
+class GlucoseDataCursorPaginationTest(ResponseCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def timestamps(self, response):
+        return [row["device_timestamp"] for row in response.data["results"]]
+
+    def test_first_page(self):
+        response = self.client.get("/api/v1/levels/?cursor=&limit=4")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertEqual(
+            response.data["results"][0]["device_timestamp"], "2024-04-26T12:30:00Z"
+        )
+
+    def test_follow_next_and_previous_links(self):
+        first = self.client.get("/api/v1/levels/?cursor=&limit=4")
+        second = self.client.get(first.data["next"])
+        third = self.client.get(second.data["next"])
+
+        self.assertEqual(len(second.data["results"]), 4)
+        self.assertEqual(third.data["results"][0]["user"]["user_id"], "user2")
+        self.assertEqual(len(third.data["results"]), 1)
+        self.assertIsNone(third.data["next"])
+
+        timestamps = (
+            self.timestamps(first) + self.timestamps(second) + self.timestamps(third)
+        )
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(len(set(timestamps)), 9)
+
+        previous = self.client.get(second.data["previous"])
+        self.assertEqual(self.timestamps(previous), self.timestamps(first))
+        self.assertIsNone(previous.data["previous"])
+
+    def test_descending_ordering_with_filters(self):
+        first = self.client.get(
+            "/api/v1/levels/?cursor=&limit=3&user_id=user2&ordering=-device_timestamp"
+        )
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(
+            self.timestamps(first),
+            ["2025-04-26T12:30:14Z", "2025-04-26T12:30:13Z", "2025-04-26T12:30:12Z"],
+        )
+        self.assertEqual(
+            self.timestamps(second), ["2025-04-26T12:30:11Z", "2025-04-26T12:30:10Z"]
+        )
+        self.assertIsNone(second.data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/v1/levels/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+
+class GlucoseDataExportViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def export(self, query_string="", **headers):
+        response = self.client.get(f"/api/v1/levels/export/?{query_string}", **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response
+
+    def test_csv_export(self):
+        response = self.export("user_id=user1")
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="glucose-data.csv"', response["Content-Disposition"])
+        rows = list(csv.DictReader(io.StringIO(response.getvalue().decode("utf-8"))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]["user_id"], "user1")
+        self.assertEqual(rows[0]["serial_number"], "ABC-123-XYZ-456-8")
+        self.assertEqual(rows[0]["device_timestamp"], "2024-04-26T12:30:00Z")
+        self.assertEqual(rows[0]["glucose_history"], "185")
+        self.assertEqual(rows[0]["notes"], "in testing phase")
+
+    def test_empty_csv_export_has_header(self):
+        response = self.export("user_id=unknown")
+
+        self.assertEqual(
+            response.getvalue().decode("utf-8").splitlines(),
+            [
+                "id,user_id,device_name,serial_number,device_timestamp,record_type,"
+                "glucose_history,glucose_scan,non_numeric_rapid_acting_insulin,"
+                "rapid_acting_insulin,non_numeric_food_data,carbohydrates_grams,"
+                "carbohydrates_portions,non_numeric_depot_insulin,depot_insulin,notes,"
+                "glucose_test_strips,ketone,meal_insulin,corrective_insulin,"
+                "insulin_change_by_user"
+            ],
+        )
+
+    def test_ndjson_export_matches_list(self):
+        response = self.export("export_format=ndjson")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = response.getvalue().decode("utf-8").splitlines()
+        expected = self.client.get("/api/v1/levels/?ordering=device_timestamp").json()
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_ndjson_export_writes_decimals_as_numbers(self):
+        GlucoseData.objects.filter(glucose_history=185).update(ketone=Decimal("0.6"))
+
+        response = self.export("user_id=user1&export_format=ndjson")
+
+        first = response.getvalue().decode("utf-8").splitlines()[0]
+        self.assertIn('"ketone":0.6,', first)
+
+    @override_settings(GLUCOSE_EXPORT_CHUNK_SIZE=2)
+    def test_streams_in_chunks_from_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.export("export_format=ndjson")
+            chunks = list(response.streaming_content)
+
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(b"".join(chunks).count(b"\n"), 9)
+
+    def test_gzip_export(self):
+        response = self.export("user_id=user2", HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        content = gzip.decompress(response.getvalue()).decode("utf-8")
+        self.assertEqual(len(content.splitlines()), 6)
+
+    def test_filters_by_range(self):
+        response = self.export("start_timestamp=2025-04-26 12:30:13")
+
+        self.assertEqual(len(response.getvalue().decode("utf-8").splitlines()), 3)
+
+    def test_invalid_format(self):
+        response = self.client.get("/api/v1/levels/export/?export_format=xml")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("export_format", response.data)
+
+
+@skipUnless(pyarrow, "pyarrow is not installed")
+class GlucoseDataArrowExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def export(self, query_string):
+        response = self.client.get(
+            f"/api/v1/levels/export/?{query_string}", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertExportedTable(self, table):
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(table.schema.field("glucose_history").type, pyarrow.int32())
+        self.assertEqual(table.schema.field("ketone").type, pyarrow.decimal128(7, 2))
+        self.assertEqual(
+            table.schema.field("device_timestamp").type,
+            pyarrow.timestamp("us", tz="UTC"),
+        )
+        self.assertEqual(
+            table.column("glucose_history").to_pylist(), [185, 186, 187, 188]
+        )
+        self.assertEqual(table.column("user_id").to_pylist(), ["user1"] * 4)
+        self.assertEqual(
+            table.column("device_timestamp")[0].as_py(),
+            datetime(2024, 4, 26, 12, 30, tzinfo=dt_timezone.utc),
+        )
+
+    @override_settings(GLUCOSE_EXPORT_CHUNK_SIZE=3)
+    def test_arrow_export(self):
+        response = self.export("user_id=user1&export_format=arrow")
+
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.arrow.file")
+        content = gzip.decompress(response.getvalue())
+        reader = pyarrow.ipc.open_file(pyarrow.BufferReader(content))
+        self.assertEqual(reader.num_record_batches, 2)
+        self.assertExportedTable(reader.read_all())
+
+    @override_settings(GLUCOSE_EXPORT_CHUNK_SIZE=3)
+    def test_parquet_export(self):
+        response = self.export("user_id=user1&export_format=parquet")
+
+        # Parquet pages are compressed already
+        self.assertNotIn("Content-Encoding", response)
+        parquet_file = pyarrow.parquet.ParquetFile(
+            pyarrow.BufferReader(response.getvalue())
+        )
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertExportedTable(parquet_file.read())
+
+    def test_empty_export(self):
+        response = self.export("user_id=unknown&export_format=parquet")
+
+        table = pyarrow.parquet.read_table(pyarrow.BufferReader(response.getvalue()))
+        self.assertEqual(table.num_rows, 0)
+
+
+class GlucoseDataArrowUnavailableTest(TestCase):
+    def test_requires_pyarrow(self):
+        with mock.patch("api.exports.pyarrow", None):
+            response = self.client.get("/api/v1/levels/export/?export_format=arrow")
+
+        self.assertEqual(response.status_code, 501)
+        self.assertIn("pyarrow", response.data["detail"])
+
 
 class GlucoseDataSingleViewTest(TestCase):
     @classmethod
@@ -128,45 +444,544 @@ class GlucoseDataSingleViewTest(TestCase):
         self.assertEqual(response.data["device_timestamp"], "2024-04-26T12:30:02Z")
 
 
-class PrepopulateGlucoseDataTest(TestCase):
-    def test_post_method(self):
-        csv_data = (
-            "Glukose-Werte,Erstellt am,25-02-2021 09:55 UTC,Erstellt von,ccc\n"
-            "\n"
-            "Gerät,Seriennummer,Gerätezeitstempel,Aufzeichnungstyp,Glukosewert-Verlauf mg/dL,Glukose-Scan mg/dL,"
-            "Nicht numerisches schnellwirkendes Insulin,Schnellwirkendes Insulin (Einheiten),Nicht numerische Nahrungsdaten,"
-            "Kohlenhydrate (Gramm),Kohlenhydrate (Portionen),Nicht numerisches Depotinsulin,Depotinsulin (Einheiten),"
-            "Notizen,Glukose-Teststreifen mg/dL,Keton mmol/L,Mahlzeiteninsulin (Einheiten),Korrekturinsulin (Einheiten),"
-            "Insulin-Änderung durch Anwender (Einheiten)\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 09:40,0,139,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 09:55,0,138,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:10,0,140,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:25,0,149,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:40,0,155,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 10:55,0,153,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:10,0,151,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:25,0,148,33,55,66,66,66,66,55,66,77,33,66,22,66,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:40,0,144,,,,100,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 11:55,0,145,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:10,0,143,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:25,0,139,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:40,0,136,,,,,,,,,,,,,,\n"
-            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,10-02-2021 12:55,0,132,,,,,,,,,,,,,,\n"
-        )
-
-        csv_file = StringIO(csv_data)
+class GlucoseMinMaxViewTest(ResponseCacheMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+
+    def test_statistics_for_user(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/v1/min-max-blood/?user_id=user1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["min_value"], 185)
+        self.assertEqual(response.data["max_value"], 204)
+        history = response.data["glucose_history"]
+        self.assertEqual(history["count"], 4)
+        self.assertEqual((history["min"], history["max"]), (185, 188))
+        self.assertEqual(history["mean"], 186.5)
+        self.assertEqual(history["std_dev"], 1.12)
+        self.assertEqual(history["percentiles"]["p25"], 185.75)
+        self.assertEqual(history["percentiles"]["p50"], 186.5)
+        self.assertEqual(response.data["glucose_scan"]["max"], 204)
+
+    def test_statistics_for_timestamp_range(self):
+        response = self.client.get(
+            "/api/v1/min-max-blood/?start_timestamp=2025-04-26 12:30:11"
+            "&stop_timestamp=2025-04-26 12:30:13"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["glucose_history"]["count"], 3)
+        self.assertEqual(response.data["min_value"], 196)
+        self.assertEqual(response.data["max_value"], 214)
+
+    def test_statistics_without_readings(self):
+        response = self.client.get("/api/v1/min-max-blood/?user_id=unknown")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data["min_value"])
+        self.assertIsNone(response.data["max_value"])
+        self.assertEqual(response.data["glucose_scan"]["count"], 0)
+        self.assertIsNone(response.data["glucose_scan"]["percentiles"]["p50"])
+
+    def test_invalid_timestamp(self):
+        response = self.client.get("/api/v1/min-max-blood/?start_timestamp=yesterday")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("start_timestamp", response.data)
+
+
+class GlucoseSeriesViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+        user = Customer.objects.create(user_id="user3")
+        GlucoseData.objects.bulk_create(
+            GlucoseData(
+                user=user,
+                device_timestamp=datetime(2024, 5, 1, 0, 5 * i, tzinfo=dt_timezone.utc),
+                record_type=0,
+                glucose_history=100 + i,
+                glucose_scan=150 if i == 4 else None,
+            )
+            for i in range(8)
+        )
+
+    def test_fifteen_minute_buckets(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/v1/levels/series/?user_id=user3&bucket=15m"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["bucket"], "15m")
+        results = response.data["results"]
+        self.assertEqual(
+            [bucket["timestamp"] for bucket in results],
+            ["2024-05-01T00:00:00Z", "2024-05-01T00:15:00Z", "2024-05-01T00:30:00Z"],
+        )
+        self.assertEqual(
+            results[1]["glucose_history"],
+            {"min": 103, "mean": 104.0, "max": 105, "count": 3},
+        )
+        self.assertEqual(results[1]["glucose_scan"]["count"], 1)
+        self.assertEqual(
+            results[2]["glucose_scan"],
+            {"min": None, "mean": None, "max": None, "count": 0},
+        )
+
+    def test_daily_buckets_with_timestamp_filter(self):
+        response = self.client.get(
+            "/api/v1/levels/series/?bucket=1d&start_timestamp=2024-04-01"
+            "&stop_timestamp=2024-04-30"
+        )
+
+        results = response.data["results"]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["timestamp"], "2024-04-26T00:00:00Z")
+        self.assertEqual(results[0]["glucose_history"]["mean"], 186.5)
+
+    def test_default_bucket(self):
+        response = self.client.get("/api/v1/levels/series/")
+
+        self.assertEqual(response.data["bucket"], "1h")
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_invalid_bucket(self):
+        response = self.client.get("/api/v1/levels/series/?bucket=7m")
+        self.assertEqual(response.status_code, 400)
+
+
+class TemporaryMediaMixin:
+    """Stores uploaded files in a temporary MEDIA_ROOT for the duration of a test."""
 
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+
+@override_settings(GLUCOSE_IMPORT_EAGER=True)
+class PrepopulateGlucoseDataTest(TemporaryMediaMixin, TestCase):
+    def test_post_method(self):
         file_name = "user1.csv"
         csv_file_upload = SimpleUploadedFile(
-            file_name, csv_data.encode("utf-8"), content_type="text/csv"
+            file_name, CSV_DATA.encode("utf-8"), content_type="text/csv"
         )
         response = self.client.post(
             "/api/v1/prepopulate-data/", {"file": csv_file_upload}, format="multipart"
         )
 
-        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "succeeded")
         self.assertTrue(GlucoseData.objects.exists())
 
         # response = self.client.get("/api/v1/levels/")
         # self.assertEqual(len(response.data), 14)
         # self.assertEqual(response.data[3]['user']['user_id'], 'user1')
+
+    @override_settings(GLUCOSE_IMPORT_BATCH_SIZE=4)
+    def test_post_method_flushes_in_batches(self):
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv", CSV_DATA.encode("utf-8"), content_type="text/csv"
+        )
+        response = self.client.post(
+            "/api/v1/prepopulate-data/", {"file": csv_file_upload}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(GlucoseData.objects.filter(user_id="user1").count(), 14)
+        glucose_data = GlucoseData.objects.get(glucose_history=148)
+        self.assertEqual(glucose_data.glucose_scan, 33)
+        self.assertEqual(glucose_data.text.notes, "77")
+        self.assertEqual(
+            glucose_data.device.serial_number, "e09bb0f0-018b-429b-94c7-62bb306a0136"
+        )
+
+    @override_settings(GLUCOSE_IMPORT_BATCH_SIZE=4)
+    def test_post_method_resolves_devices_once(self):
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv", CSV_DATA.encode("utf-8"), content_type="text/csv"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                "/api/v1/prepopulate-data/",
+                {"file": csv_file_upload},
+                format="multipart",
+            )
+
+        device_queries = [q for q in queries if '"api_device"' in q["sql"]]
+        self.assertEqual(len(device_queries), 2)
+
+
+@override_settings(GLUCOSE_IMPORT_EAGER=True)
+class BulkPrepopulateGlucoseDataTest(TestCase):
+    def upload(self, name, content):
+        return SimpleUploadedFile(
+            name, content, content_type="application/octet-stream"
+        )
+
+    def zip_archive(self, members):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for name, content in members.items():
+                archive.writestr(name, content)
+        return buffer.getvalue()
+
+    def post(self, files):
+        return self.client.post(
+            "/api/v1/prepopulate-data/bulk/", {"files": files}, format="multipart"
+        )
+
+    def test_imports_every_file(self):
+        response = self.post(
+            [
+                self.upload("user1.csv", CSV_DATA.encode("utf-8")),
+                self.upload("user2.csv", CSV_DATA.encode("utf-8")),
+            ]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [
+                (r["user_id"], r["status"], r["rows_inserted"])
+                for r in response.data["results"]
+            ],
+            [("user1", "succeeded", 14), ("user2", "succeeded", 14)],
+        )
+        self.assertEqual(GlucoseData.objects.filter(user_id="user2").count(), 14)
+
+    def test_streams_csv_members_of_zip_archives(self):
+        archive = self.zip_archive(
+            {
+                "export/user1.csv": CSV_DATA,
+                "export/user2.csv": CSV_DATA,
+                "export/readme.txt": "not an export",
+                "__MACOSX/export/._user1.csv": "resource fork",
+            }
+        )
+
+        response = self.post([self.upload("exports.zip", archive)])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r["name"] for r in response.data["results"]],
+            ["exports.zip/export/user1.csv", "exports.zip/export/user2.csv"],
+        )
+        self.assertEqual(GlucoseData.objects.count(), 28)
+
+    def test_failed_file_does_not_roll_back_the_others(self):
+        broken = CSV_DATA.replace("10-02-2021 12:55", "yesterday")
+        with self.assertLogs("api.bulk", level="ERROR"):
+            response = self.post(
+                [
+                    self.upload("user1.csv", CSV_DATA.encode("utf-8")),
+                    self.upload("user2.csv", broken.encode("utf-8")),
+                ]
+            )
+
+        first, second = response.data["results"]
+        self.assertEqual(first["status"], "succeeded")
+        self.assertEqual(second["status"], "failed")
+        self.assertIn("yesterday", second["error"])
+        self.assertEqual(GlucoseData.objects.filter(user_id="user1").count(), 14)
+        self.assertFalse(GlucoseData.objects.filter(user_id="user2").exists())
+        self.assertFalse(Customer.objects.filter(user_id="user2").exists())
+
+    def test_file_without_readings_fails(self):
+        header = "".join(CSV_DATA.splitlines(keepends=True)[:3])
+        with self.assertLogs("api.bulk", level="ERROR"):
+            response = self.post([self.upload("user1.csv", header.encode("utf-8"))])
+
+        result = response.data["results"][0]
+        self.assertEqual(result["status"], "failed")
+        self.assertIn("no readings", result["error"])
+        self.assertFalse(Customer.objects.filter(user_id="user1").exists())
+
+    def test_reimport_reports_skipped_rows(self):
+        self.post([self.upload("user1.csv", CSV_DATA.encode("utf-8"))])
+
+        response = self.post([self.upload("user1.csv", CSV_DATA.encode("utf-8"))])
+
+        result = response.data["results"][0]
+        self.assertEqual((result["rows_inserted"], result["rows_skipped"]), (0, 14))
+
+    def test_without_files(self):
+        response = self.post([])
+
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkPrepopulateGlucoseDataPoolTest(TransactionTestCase):
+    def setUp(self):
+        # Committed imports fill the device cache
+        self.addCleanup(device_cache.clear)
+
+    def test_imports_files_on_worker_threads(self):
+        threads = set()
+
+        def import_csv(file, customer):
+            threads.add(current_thread().name)
+            return import_glucose_csv(file, customer)
+
+        files = [
+            SimpleUploadedFile(f"user{i}.csv", CSV_DATA.encode("utf-8"))
+            for i in range(1, 4)
+        ]
+        with mock.patch("api.bulk.import_glucose_csv", import_csv):
+            response = self.client.post(
+                "/api/v1/prepopulate-data/bulk/", {"files": files}, format="multipart"
+            )
+
+        self.assertEqual(
+            [(r["user_id"], r["status"]) for r in response.data["results"]],
+            [("user1", "succeeded"), ("user2", "succeeded"), ("user3", "succeeded")],
+        )
+        self.assertEqual(GlucoseData.objects.count(), 42)
+        self.assertTrue(threads)
+        self.assertTrue(all(t.startswith("glucose-bulk-import") for t in threads))
+
+
+class ImportJobDetailViewTest(TemporaryMediaMixin, TestCase):
+    def post_csv(self):
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv", CSV_DATA.encode("utf-8"), content_type="text/csv"
+        )
+        return self.client.post(
+            "/api/v1/prepopulate-data/", {"file": csv_file_upload}, format="multipart"
+        )
+
+    def test_upload_is_scheduled_in_background(self):
+        response = self.post_csv()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "pending")
+        self.assertEqual(response["Location"], response.data["status_url"])
+        job = ImportJob.objects.get(id=response.data["job_id"])
+        self.assertEqual(job.user_id, "user1")
+        self.assertEqual(job.file_size, len(CSV_DATA.encode("utf-8")))
+        self.assertEqual(job.worker, current_worker())
+        self.assertFalse(GlucoseData.objects.exists())
+
+    @override_settings(GLUCOSE_IMPORT_EAGER=True, GLUCOSE_IMPORT_BATCH_SIZE=5)
+    def test_reports_finished_job(self):
+        job_id = self.post_csv().data["job_id"]
+
+        response = self.client.get(f"/api/v1/imports/{job_id}/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "succeeded")
+        self.assertEqual(response.data["user"], "user1")
+        self.assertEqual(response.data["rows_imported"], 14)
+        self.assertEqual(response.data["progress"], 1.0)
+        self.assertEqual(response.data["bytes_processed"], response.data["file_size"])
+        self.assertIsNotNone(response.data["finished_at"])
+        self.assertFalse(ImportJob.objects.get(id=job_id).file)
+
+    @override_settings(GLUCOSE_IMPORT_EAGER=True)
+    def test_reports_invalid_values(self):
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv",
+            CSV_DATA.replace(",0,140,", ",0,40000,").encode("utf-8"),
+            content_type="text/csv",
+        )
+        job_id = self.client.post(
+            "/api/v1/prepopulate-data/", {"file": csv_file_upload}, format="multipart"
+        ).data["job_id"]
+
+        response = self.client.get(f"/api/v1/imports/{job_id}/")
+
+        self.assertEqual(response.data["rows_inserted"], 14)
+        self.assertEqual(response.data["rows_skipped"], 0)
+        self.assertEqual(response.data["invalid_values"], 1)
+
+    @override_settings(GLUCOSE_IMPORT_EAGER=True)
+    def test_reports_failed_job(self):
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv",
+            (CSV_DATA + "FreeStyle LibreLink,abc,not a date,0,100\n").encode("utf-8"),
+            content_type="text/csv",
+        )
+        with self.assertLogs("api.jobs", level="ERROR"):
+            job_id = self.client.post(
+                "/api/v1/prepopulate-data/",
+                {"file": csv_file_upload},
+                format="multipart",
+            ).data["job_id"]
+
+        response = self.client.get(f"/api/v1/imports/{job_id}/")
+
+        self.assertEqual(response.data["status"], "failed")
+        self.assertIn("not a date", response.data["error"])
+        self.assertFalse(ImportJob.objects.get(id=job_id).file)
+
+    def test_fails_orphaned_jobs(self):
+        hostname, pid = current_worker().rsplit(":", 1)
+        stopped = subprocess.Popen([sys.executable, "-c", ""])
+        stopped.wait()
+        customer = Customer.objects.create(user_id="user1")
+        jobs = {
+            worker: ImportJob.objects.create(
+                user=customer,
+                file=ContentFile(CSV_DATA, name="user1.csv"),
+                status=status,
+                worker=worker,
+            )
+            for worker, status in [
+                (f"{hostname}:{stopped.pid}", ImportJob.Status.RUNNING),
+                (f"{hostname}:{stopped.pid}0", ImportJob.Status.SUCCEEDED),
+                (f"{hostname}:{os.getppid()}", ImportJob.Status.PENDING),
+                (f"{hostname}:{pid}", ImportJob.Status.PENDING),
+                (f"other-{hostname}:{stopped.pid}", ImportJob.Status.RUNNING),
+            ]
+        }
+        # A job left behind by an earlier process with the same ID
+        restarted = ImportJob.objects.create(user=customer, worker=f"{hostname}:{pid}")
+        ImportJob.objects.filter(pk=restarted.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+
+        with self.assertLogs("api.jobs", level="WARNING"):
+            fail_orphaned_jobs()
+
+        self.assertEqual(
+            ImportJob.objects.get(pk=restarted.pk).status, ImportJob.Status.FAILED
+        )
+        self.assertEqual(
+            [ImportJob.objects.get(pk=job.pk).status for job in jobs.values()],
+            [
+                ImportJob.Status.FAILED,
+                ImportJob.Status.SUCCEEDED,
+                ImportJob.Status.PENDING,
+                ImportJob.Status.PENDING,
+                ImportJob.Status.RUNNING,
+            ],
+        )
+        orphaned = ImportJob.objects.get(pk=jobs[f"{hostname}:{stopped.pid}"].pk)
+        self.assertFalse(orphaned.file)
+        self.assertIn("stopped", orphaned.error)
+
+    @override_settings(GLUCOSE_IMPORT_EAGER=True, GLUCOSE_IMPORT_BATCH_SIZE=5)
+    def test_reimport_is_idempotent(self):
+        first = self.client.get(f"/api/v1/imports/{self.post_csv().data['job_id']}/")
+        second = self.client.get(f"/api/v1/imports/{self.post_csv().data['job_id']}/")
+
+        self.assertEqual(first.data["rows_inserted"], 14)
+        self.assertEqual(second.data["rows_imported"], 14)
+        self.assertEqual(second.data["rows_inserted"], 0)
+        self.assertEqual(second.data["rows_updated"], 0)
+        self.assertEqual(second.data["rows_skipped"], 14)
+        self.assertEqual(GlucoseData.objects.count(), 14)
+
+    @override_settings(GLUCOSE_IMPORT_EAGER=True)
+    def test_reimport_updates_changed_rows(self):
+        self.post_csv()
+        changed = CSV_DATA.replace("10-02-2021 12:55,0,132", "10-02-2021 12:55,0,131")
+        changed += (
+            "FreeStyle LibreLink,e09bb0f0-018b-429b-94c7-62bb306a0136,"
+            "10-02-2021 13:10,0,130,,,,,,,,,,,,,,\n"
+        )
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv", changed.encode("utf-8"), content_type="text/csv"
+        )
+        job_id = self.client.post(
+            "/api/v1/prepopulate-data/", {"file": csv_file_upload}, format="multipart"
+        ).data["job_id"]
+
+        response = self.client.get(f"/api/v1/imports/{job_id}/")
+
+        self.assertEqual(response.data["rows_inserted"], 1)
+        self.assertEqual(response.data["rows_updated"], 1)
+        self.assertEqual(response.data["rows_skipped"], 13)
+        self.assertEqual(GlucoseData.objects.count(), 15)
+        self.assertTrue(GlucoseData.objects.filter(glucose_history=131).exists())
+        self.assertFalse(GlucoseData.objects.filter(glucose_history=132).exists())
+
+    @override_settings(GLUCOSE_IMPORT_EAGER=True)
+    def test_reimport_updates_texts(self):
+        self.post_csv()
+        # Only the two readings with text have a text row
+        self.assertEqual(GlucoseDataText.objects.count(), 2)
+
+        cleared = CSV_DATA.replace("66,77,33", "66,,33").replace(
+            ",144,,,,100,", ",144,,,,,"
+        )
+        csv_file_upload = SimpleUploadedFile(
+            "user1.csv", cleared.encode("utf-8"), content_type="text/csv"
+        )
+        job_id = self.client.post(
+            "/api/v1/prepopulate-data/", {"file": csv_file_upload}, format="multipart"
+        ).data["job_id"]
+
+        response = self.client.get(f"/api/v1/imports/{job_id}/")
+
+        self.assertEqual(response.data["rows_updated"], 2)
+        # The reading without any text left has no text row anymore
+        text = GlucoseDataText.objects.get()
+        self.assertEqual(text.notes, "")
+        self.assertEqual(text.non_numeric_food_data, "66")
+
+    def test_unknown_job(self):
+        response = self.client.get("/api/v1/imports/999/")
+        self.assertEqual(response.status_code, 404)
+
+
+class CohortStatisticsViewTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_data_create()
+        Customer.objects.create(user_id="user3")
+        Customer.objects.create(user_id="inactive", is_active=False)
+
+    def post(self, data):
+        response = self.client.post(
+            "/api/v1/min-max-blood/cohort/", data, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return json.loads(response.getvalue())["results"]
+
+    def test_listed_users(self):
+        with self.assertNumQueries(1):
+            results = self.post({"user_ids": ["user2", "user1", "unknown"]})
+
+        self.assertEqual([r["user_id"] for r in results], ["user1", "user2"])
+        self.assertEqual(
+            results[0]["glucose_history"],
+            {"min": 185, "mean": 186.5, "max": 188, "count": 4},
+        )
+        self.assertEqual(results[1]["glucose_scan"]["count"], 5)
+
+    def test_all_active_users(self):
+        results = self.post({"all_active": True})
+
+        self.assertEqual([r["user_id"] for r in results], ["user1", "user2", "user3"])
+        self.assertEqual(
+            results[2]["glucose_history"],
+            {"min": None, "mean": None, "max": None, "count": 0},
+        )
+
+    def test_time_window(self):
+        results = self.post(
+            {
+                "all_active": True,
+                "start_timestamp": "2025-04-26T12:30:12Z",
+                "stop_timestamp": "2025-04-26T12:30:13Z",
+            }
+        )
+
+        self.assertEqual([r["glucose_history"]["count"] for r in results], [0, 2, 0])
+        self.assertEqual(results[1]["glucose_history"]["min"], 197)
+
+    def test_requires_users_or_all_active(self):
+        for data in ({}, {"user_ids": ["user1"], "all_active": True}):
+            with self.subTest(data=data):
+                response = self.client.post(
+                    "/api/v1/min-max-blood/cohort/",
+                    data,
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 400)
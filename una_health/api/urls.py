@@ -1,9 +1,35 @@
 from django.urls import path
 
-from .views import GlucoseDataListView, GlucoseDataSingleView, PrepopulateGlucoseData, GlucoseMinMaxView
+from .async_views import (
+    AsyncGlucoseDataListView,
+    AsyncGlucoseDataSingleView,
+    AsyncGlucoseMinMaxView,
+)
+from .views import (
+    BulkPrepopulateGlucoseData,
+    CohortStatisticsView,
+    GlucoseDataExportView,
+    GlucoseDataListView,
+    GlucoseDataSingleView,
+    GlucoseMetricsView,
+    GlucoseMinMaxView,
+    GlucoseSeriesView,
+    ImportJobDetailView,
+    PrepopulateGlucoseData,
+)
 
 urlpatterns = [
     path("v1/levels/", GlucoseDataListView.as_view(), name="glucose-data-list"),
+    path(
+        "v1/levels/series/",
+        GlucoseSeriesView.as_view(),
+        name="glucose-data-series",
+    ),
+    path(
+        "v1/levels/export/",
+        GlucoseDataExportView.as_view(),
+        name="glucose-data-export",
+    ),
     path(
         "v1/levels/<int:id>/",
         GlucoseDataSingleView.as_view(),
@@ -14,9 +40,45 @@ urlpatterns = [
         PrepopulateGlucoseData.as_view(),
         name="import-glucose-data",
     ),
+    path(
+        "v1/prepopulate-data/bulk/",
+        BulkPrepopulateGlucoseData.as_view(),
+        name="bulk-import-glucose-data",
+    ),
+    path(
+        "v1/imports/<int:id>/",
+        ImportJobDetailView.as_view(),
+        name="import-job-detail",
+    ),
     path(
         "v1/min-max-blood/",
         GlucoseMinMaxView.as_view(),
         name="minmax-glucose-data",
     ),
+    path(
+        "v1/min-max-blood/cohort/",
+        CohortStatisticsView.as_view(),
+        name="cohort-glucose-statistics",
+    ),
+    path(
+        "v1/glucose-metrics/",
+        GlucoseMetricsView.as_view(),
+        name="glucose-metrics",
+    ),
+    # Async versions of the read endpoints for ASGI servers
+    path(
+        "v1/async/levels/",
+        AsyncGlucoseDataListView.as_view(),
+        name="async-glucose-data-list",
+    ),
+    path(
+        "v1/async/levels/<int:id>/",
+        AsyncGlucoseDataSingleView.as_view(),
+        name="async-glucose-data-single",
+    ),
+    path(
+        "v1/async/min-max-blood/",
+        AsyncGlucoseMinMaxView.as_view(),
+        name="async-minmax-glucose-data",
+    ),
 ]
@@ -1,87 +1,158 @@
 import logging
-from datetime import datetime
-from io import StringIO
 import time
+import zipfile
+from contextlib import ExitStack
 
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter
-from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Max, Min
 
-from .models import Customer, Device, GlucoseData
-from .serializers import GlucoseDataSerializer, GlucoseDataUploadSerializer, GlucoseMinMaxSerializer
+from .aggregates import BUCKET_SIZES, cohort_statistics, glucose_series
+from .bulk import expand_uploads, import_sources
+from .caching import cached_response
+from .exports import get_export_format, stream_json_results
+from .filters import GlucoseDataFilter, glucose_filter_values
+from .instrumentation import registry, span
+from .jobs import current_worker, enqueue_import
+from .metrics import empty_metrics, glucose_metrics
+from .models import Customer, GlucoseData, ImportJob
+from .pagination import GlucoseDataPagination
+from .rollups import summarized_statistics
+from .serializers import (
+    BulkImportFileSerializer,
+    CohortStatisticsRequestSerializer,
+    CohortStatisticsSerializer,
+    GlucoseDataBulkUploadSerializer,
+    GlucoseDataRowSerializer,
+    GlucoseDataSerializer,
+    GlucoseDataUploadSerializer,
+    GlucoseMetricsSerializer,
+    GlucoseMinMaxSerializer,
+    GlucoseSeriesBucketSerializer,
+    ImportJobSerializer,
+)
+
+# Swagger documentation for the filtering parameters of the read endpoints
+GLUCOSE_FILTER_PARAMETERS = [
+    openapi.Parameter(
+        "user_id",
+        openapi.IN_QUERY,
+        description="Filter by user ID",
+        type=openapi.TYPE_STRING,
+    ),
+    openapi.Parameter(
+        "start_timestamp",
+        openapi.IN_QUERY,
+        description="Filter by start timestamp",
+        type=openapi.TYPE_STRING,
+    ),
+    openapi.Parameter(
+        "stop_timestamp",
+        openapi.IN_QUERY,
+        description="Filter by stop timestamp",
+        type=openapi.TYPE_STRING,
+    ),
+]
 
 
 class GlucoseDataListView(generics.ListAPIView):
-    queryset = GlucoseData.objects.all()
+    # The nested user and device are fetched in the same query as the readings
+    queryset = GlucoseData.objects.select_related("user", "device")
     serializer_class = GlucoseDataSerializer
-    filter_backends = [OrderingFilter]
+    filter_backends = [GlucoseDataFilter, OrderingFilter]
     ordering_fields = ["device_timestamp"]
-    pagination_class = LimitOffsetPagination
+    pagination_class = GlucoseDataPagination
 
     # Swagger documentation for filtering parameters
     @swagger_auto_schema(
-        manual_parameters=[
+        manual_parameters=GLUCOSE_FILTER_PARAMETERS
+        + [
             openapi.Parameter(
-                "user_id",
+                "cursor",
                 openapi.IN_QUERY,
-                description="Filter by user ID",
+                description="Page through the results by cursor instead of offset. "
+                "Leave empty for the first page and follow the next/previous links.",
                 type=openapi.TYPE_STRING,
             ),
             openapi.Parameter(
-                "start_timestamp",
+                "fields",
                 openapi.IN_QUERY,
-                description="Filter by start timestamp",
+                description="Comma separated list of the fields to return",
                 type=openapi.TYPE_STRING,
             ),
             openapi.Parameter(
-                "stop_timestamp",
+                "exclude",
                 openapi.IN_QUERY,
-                description="Filter by stop timestamp",
+                description="Comma separated list of the fields to leave out",
                 type=openapi.TYPE_STRING,
             ),
         ]
     )
     def get(self, request, *args, **kwargs):
-        # Get query parameters
-        user_id = self.request.query_params.get("user_id")
-        start_timestamp = self.request.query_params.get("start_timestamp")
-        stop_timestamp = self.request.query_params.get("stop_timestamp")
+        return super().get(request, *args, **kwargs)
 
-        # Apply filters if provided
-        try:
-            if user_id:
-                self.queryset = self.queryset.filter(user_id=user_id)
-            if start_timestamp:
-                self.queryset = self.queryset.filter(device_timestamp__gte=start_timestamp)
-            if stop_timestamp:
-                self.queryset = self.queryset.filter(device_timestamp__lte=stop_timestamp)
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, self.list_data)
 
-            return super().get(request, *args, **kwargs)
+    def list_data(self):
+        # Rows are rendered by the values_list based fast path, which gives the
+        # same output as GlucoseDataSerializer at a fraction of the cost
+        row_serializer = GlucoseDataRowSerializer(fields=self.get_fields())
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = row_serializer.get_queryset(queryset)
 
-        except Exception as e:
-            return Response({"error": e.message}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(queryset)
+        with span("serialize"):
+            if page is not None:
+                data = row_serializer.to_representation(page)
+                return self.get_paginated_response(data).data
+            return row_serializer.to_representation(queryset)
+
+    def get_fields(self):
+        return selected_fields(self.request.query_params)
+
+
+def selected_fields(query_params):
+    """
+    Output fields of the list endpoints narrowed by the ``fields`` and
+    ``exclude`` query parameters. Only the columns behind these fields are
+    queried.
+    """
+    available = GlucoseDataSerializer.Meta.fields
+    selected = {}
+    for param in ("fields", "exclude"):
+        value = query_params.get(param)
+        if value is None:
+            continue
+        names = [name.strip() for name in value.split(",") if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValidationError(
+                {param: [f"Unknown field '{name}'." for name in unknown]}
+            )
+        selected[param] = names
+
+    fields = selected.get("fields") or available
+    exclude = selected.get("exclude", [])
+    return [name for name in available if name in fields and name not in exclude]
 
 
 class GlucoseDataSingleView(generics.RetrieveAPIView):
-    queryset = GlucoseData.objects.all()
+    queryset = GlucoseData.objects.select_related("user", "device", "text")
     serializer_class = GlucoseDataSerializer
     lookup_field = "id"
 
 
 class PrepopulateGlucoseData(APIView):
-    def integerConversion(self, val):
-        # Convert string to integer if possible
-        if val.isdigit():
-            return int(val)
-        else:
-            return None
-
     # Swagger documentation for request body and responses
     @swagger_auto_schema(
         request_body=openapi.Schema(
@@ -95,14 +166,21 @@ class PrepopulateGlucoseData(APIView):
             },
         ),
         responses={
-            status.HTTP_201_CREATED: openapi.Response(
-                description="Successfully prepopulated glucose data.",
+            status.HTTP_202_ACCEPTED: openapi.Response(
+                description="Glucose data import scheduled.",
                 schema=openapi.Schema(
                     type=openapi.TYPE_OBJECT,
                     properties={
                         "status": openapi.Schema(
-                            type=openapi.TYPE_STRING, description="Success."
-                        )
+                            type=openapi.TYPE_STRING, description="Job status."
+                        ),
+                        "job_id": openapi.Schema(
+                            type=openapi.TYPE_INTEGER, description="Import job ID."
+                        ),
+                        "status_url": openapi.Schema(
+                            type=openapi.TYPE_STRING,
+                            description="URL reporting the progress of the import.",
+                        ),
                     },
                 ),
             ),
@@ -115,45 +193,21 @@ class PrepopulateGlucoseData(APIView):
             serializer = GlucoseDataUploadSerializer(data=request.data)
             if serializer.is_valid():
                 file = serializer.validated_data["file"]
-                reader = StringIO(file.read().decode("utf-8"))
-                user_id = request.FILES.get("file").name.split(".")[0]
+                user_id = file.name.split(".")[0]
                 customer, created = Customer.objects.get_or_create(user_id=user_id)
-                next(reader)
-                next(reader)
-                next(reader)
-                glucose_data_list = []
-                for row in reader:
-                    row = row.replace("\r\n", "").split(",")
-                    timestamp = row[2]
-                    timestamp_obj = datetime.strptime(timestamp, "%d-%m-%Y %H:%M")
-                    device_data = {"device_name": row[0], "serial_number": row[1]}
-                    device, created = Device.objects.get_or_create(**device_data)
-
-                    glucose_data_list.append(
-                        GlucoseData(
-                            user=customer,
-                            device=device,
-                            device_timestamp=timestamp_obj,
-                            record_type=self.integerConversion(row[3]),
-                            glucose_history=self.integerConversion(row[4]),
-                            glucose_scan=self.integerConversion(row[5]),
-                            non_numeric_rapid_acting_insulin=row[6],
-                            rapid_acting_insulin=self.integerConversion(row[7]),
-                            non_numeric_food_data=row[8],
-                            carbohydrates_grams=self.integerConversion(row[9]),
-                            carbohydrates_portions=self.integerConversion(row[10]),
-                            non_numeric_depot_insulin=row[11],
-                            depot_insulin=self.integerConversion(row[12]),
-                            notes=row[13],
-                            glucose_test_strips=self.integerConversion(row[14]),
-                            ketone=self.integerConversion(row[15]),
-                            meal_insulin=self.integerConversion(row[16]),
-                            corrective_insulin=self.integerConversion(row[17]),
-                            insulin_change_by_user=self.integerConversion(row[18]),
-                        )
-                    )
-                GlucoseData.objects.bulk_create(glucose_data_list)
-                return Response({"status": "success"}, status=status.HTTP_201_CREATED)
+                job = ImportJob.objects.create(
+                    user=customer,
+                    file=file,
+                    file_size=file.size,
+                    worker=current_worker(),
+                )
+                enqueue_import(job)
+                status_url = reverse("import-job-detail", kwargs={"id": job.pk})
+                return Response(
+                    {"status": job.status, "job_id": job.pk, "status_url": status_url},
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={"Location": status_url},
+                )
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -165,46 +219,225 @@ class PrepopulateGlucoseData(APIView):
             )
 
 
-class GlucoseMinMaxView(generics.ListAPIView):
+class BulkPrepopulateGlucoseData(APIView):
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["files"],
+            properties={
+                "files": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_FILE),
+                    description="CSV files or zip archives of CSV files.",
+                )
+            },
+        ),
+        responses={
+            status.HTTP_200_OK: BulkImportFileSerializer(many=True),
+            status.HTTP_400_BAD_REQUEST: "Bad request. No files or invalid archive.",
+        },
+    )
+    def post(self, request, *args, **kwargs):
+        # Each CSV file, uploaded directly or inside a zip archive, is imported
+        # in its own transaction, so one broken file doesn't fail the others
+        serializer = GlucoseDataBulkUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with ExitStack() as stack:
+            try:
+                sources = expand_uploads(serializer.validated_data["files"], stack)
+            except zipfile.BadZipFile as e:
+                raise ValidationError({"files": [str(e)]})
+            with span("import"):
+                results = import_sources(sources)
+        serializer = BulkImportFileSerializer(results, many=True)
+        return Response({"results": serializer.data}, status=status.HTTP_200_OK)
+
+
+class ImportJobDetailView(generics.RetrieveAPIView):
+    queryset = ImportJob.objects.all()
+    serializer_class = ImportJobSerializer
+    lookup_field = "id"
+
+
+class GlucoseMinMaxView(generics.GenericAPIView):
     queryset = GlucoseData.objects.all()
     serializer_class = GlucoseMinMaxSerializer
-    filter_backends = [OrderingFilter]
-    ordering_fields = ["device_timestamp"]
-    pagination_class = LimitOffsetPagination
+    filter_backends = [GlucoseDataFilter]
 
+    @swagger_auto_schema(
+        manual_parameters=GLUCOSE_FILTER_PARAMETERS,
+        responses={status.HTTP_200_OK: GlucoseMinMaxSerializer},
+    )
     def get(self, request, *args, **kwargs):
-        # Get query parameters
-        user_id = self.request.query_params.get("user_id")
-        start_timestamp = self.request.query_params.get("start_timestamp")
-        stop_timestamp = self.request.query_params.get("stop_timestamp")
+        return cached_response(request, self.statistics)
 
-        # Apply filters if provided
-        try:
-            queryset = self.get_queryset()
-            if user_id:
-                queryset = queryset.filter(user_id=user_id)
-            if start_timestamp:
-                queryset = queryset.filter(device_timestamp__gte=start_timestamp)
-            if stop_timestamp:
-                queryset = queryset.filter(device_timestamp__lte=stop_timestamp)
-            
-            max_glucose_history = queryset.aggregate(max_value=Max("glucose_history"))
-            max_glucose_scan = queryset.aggregate(max_value=Max("glucose_scan"))
-
-            max_value = max(max_glucose_history["max_value"], max_glucose_scan["max_value"])
-            
-            min_glucose_history = queryset.aggregate(min_value=Min("glucose_history"))
-            min_glucose_scan = queryset.aggregate(min_value=Min("glucose_scan"))
-
-            min_value = min(min_glucose_history["min_value"], min_glucose_scan["min_value"])
-            serializer = self.get_serializer(data={'min_value': min_value, 'max_value': max_value})
+    def statistics(self):
+        # Min, max, mean, count, standard deviation and percentiles of both
+        # glucose channels. Whole days come from the daily rollups, only
+        # partial days at the edges of the range are read from raw readings.
+        queryset = self.filter_queryset(self.get_queryset())
+        user_id, start, stop = glucose_filter_values(self.request.query_params)
+        with span("aggregate"):
+            statistics = summarized_statistics(queryset, user_id, start, stop)
+        with span("serialize"):
+            return self.get_serializer(statistics).data
 
-            if serializer.is_valid():
-                return Response(serializer.data, status=status.HTTP_200_OK)
+
+class CohortStatisticsView(APIView):
+    @swagger_auto_schema(
+        request_body=CohortStatisticsRequestSerializer,
+        responses={status.HTTP_200_OK: CohortStatisticsSerializer(many=True)},
+    )
+    def post(self, request, *args, **kwargs):
+        # Min, mean, max and count per user for a whole cohort from a single
+        # query grouped by user, streamed while the rows arrive
+        serializer = CohortStatisticsRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if data["all_active"]:
+            customers = Customer.objects.filter(is_active=True)
+        else:
+            customers = Customer.objects.filter(user_id__in=data["user_ids"])
+        results = cohort_statistics(
+            customers, data.get("start_timestamp"), data.get("stop_timestamp")
+        )
+        return StreamingHttpResponse(
+            stream_json_results(results), content_type="application/json"
+        )
+
+
+class GlucoseMetricsView(generics.GenericAPIView):
+    queryset = GlucoseData.objects.all()
+    serializer_class = GlucoseMetricsSerializer
+    filter_backends = [GlucoseDataFilter]
+
+    @swagger_auto_schema(
+        manual_parameters=GLUCOSE_FILTER_PARAMETERS
+        + [
+            openapi.Parameter(
+                "user_ids",
+                openapi.IN_QUERY,
+                description="Comma separated list of user IDs to compute the "
+                "metrics of in one request",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={status.HTTP_200_OK: GlucoseMetricsSerializer(many=True)},
+    )
+    def get(self, request, *args, **kwargs):
+        return cached_response(request, self.metrics)
+
+    def metrics(self):
+        # Time in range, time below and above range, mean glucose, GMI and
+        # coefficient of variation per user, weighted by the time each
+        # reading stands for
+        queryset = self.filter_queryset(self.get_queryset())
+        user_ids = self.get_user_ids()
+        with span("aggregate"):
+            if user_ids is None:
+                results = list(glucose_metrics(queryset))
             else:
-                return Response({"error": "Internal Server Error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
+                found = {
+                    metrics["user_id"]: metrics
+                    for metrics in glucose_metrics(
+                        queryset.filter(user_id__in=user_ids)
+                    )
+                }
+                results = [
+                    found.get(user_id) or empty_metrics(user_id) for user_id in user_ids
+                ]
+        with span("serialize"):
+            serializer = self.get_serializer(results, many=True)
+            return {"results": serializer.data}
 
-        except Exception as e:
-            print(e)
-            return Response({})
\ No newline at end of file
+    def get_user_ids(self):
+        value = self.request.query_params.get("user_ids")
+        if value is None:
+            return None
+        user_ids = list(dict.fromkeys(user_id.strip() for user_id in value.split(",")))
+        user_ids = [user_id for user_id in user_ids if user_id]
+        if not user_ids:
+            raise ValidationError({"user_ids": ["List at least one user ID."]})
+        return user_ids
+
+
+class GlucoseSeriesView(generics.GenericAPIView):
+    queryset = GlucoseData.objects.all()
+    serializer_class = GlucoseSeriesBucketSerializer
+    filter_backends = [GlucoseDataFilter]
+
+    @swagger_auto_schema(
+        manual_parameters=GLUCOSE_FILTER_PARAMETERS
+        + [
+            openapi.Parameter(
+                "bucket",
+                openapi.IN_QUERY,
+                description="Bucket size, one of 5m, 15m, 1h and 1d (default 1h)",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={status.HTTP_200_OK: GlucoseSeriesBucketSerializer(many=True)},
+    )
+    def get(self, request, *args, **kwargs):
+        # Downsampled glucose series for charts, aggregated by the database
+        bucket = request.query_params.get("bucket", "1h")
+        if bucket not in BUCKET_SIZES:
+            raise ValidationError(
+                {"bucket": [f"Must be one of {', '.join(BUCKET_SIZES)}."]}
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        with span("aggregate"):
+            buckets = list(glucose_series(queryset, BUCKET_SIZES[bucket]))
+        with span("serialize"):
+            serializer = self.get_serializer(buckets, many=True)
+            data = serializer.data
+        return Response({"bucket": bucket, "results": data}, status=status.HTTP_200_OK)
+
+
+class GlucoseDataExportView(generics.GenericAPIView):
+    queryset = GlucoseData.objects.all()
+    filter_backends = [GlucoseDataFilter]
+
+    @swagger_auto_schema(
+        manual_parameters=GLUCOSE_FILTER_PARAMETERS
+        + [
+            openapi.Parameter(
+                "export_format",
+                openapi.IN_QUERY,
+                description="Export format, one of csv (default), ndjson, arrow "
+                "and parquet. Arrow and Parquet require pyarrow.",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        responses={
+            status.HTTP_200_OK: "Glucose data in the requested format.",
+            status.HTTP_501_NOT_IMPLEMENTED: "pyarrow is not installed.",
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        # Streams every matching reading in one response, memory use stays
+        # constant however many rows are exported
+        name = request.query_params.get("export_format", "csv")
+        export_format = get_export_format(name)
+        queryset = self.filter_queryset(self.get_queryset())
+        content = export_format.export(queryset)
+        filename = f"glucose-data.{name}"
+        headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+        # Compressed on the fly for clients accepting gzip
+        accepts_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+        if accepts_gzip and export_format.compressible:
+            content = compress_sequence(content)
+            headers["Content-Encoding"] = "gzip"
+        response = StreamingHttpResponse(
+            content, content_type=export_format.content_type, headers=headers
+        )
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+
+def prometheus_metrics(request):
+    """Request metrics of this process in the Prometheus text format."""
+    return HttpResponse(
+        registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,172 @@
+"""
+Requests per second of the sync (WSGI) and async (ASGI) read endpoints under
+concurrent load, with one worker each.
+
+The WSGI worker serves requests from a pool of ``--threads`` threads, like a
+threaded gunicorn worker. The ASGI worker runs every request on one event
+loop with up to ``--concurrency`` requests in flight. ``--latency`` makes
+every query take that long, like a slow aggregate on a database server.
+
+The async views open a database connection per request, so with fast
+queries the WSGI worker is ahead; the ASGI worker pulls ahead once requests
+mostly wait on the database.
+
+Run from the ``una_health`` directory::
+
+    python -m benchmarks.async_views --requests 400 --threads 4 --latency 20
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from statistics import quantiles
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.utils import add_latency, setup_django
+
+PATHS = [
+    "levels/?user_id={user_id}&limit=100",
+    "min-max-blood/?user_id={user_id}",
+    "min-max-blood/?user_id={user_id}&start_timestamp=2024-01-03T12:00:00Z",
+]
+
+
+def create_readings(users, rows):
+    from api.models import Customer, GlucoseData
+    from api.rollups import rebuild_daily_summaries
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for number in range(users):
+        user = Customer.objects.create(user_id=f"user{number}")
+        GlucoseData.objects.bulk_create(
+            (
+                GlucoseData(
+                    user=user,
+                    device_timestamp=start + timedelta(minutes=15 * i),
+                    record_type=0,
+                    glucose_history=80 + i % 120,
+                )
+                for i in range(rows)
+            ),
+            batch_size=1000,
+        )
+        rebuild_daily_summaries(user.user_id)
+
+
+def request_paths(requests, users):
+    return [
+        "/api/v1/" + PATHS[i % len(PATHS)].format(user_id=f"user{i % users}")
+        for i in range(requests)
+    ]
+
+
+def run_wsgi(paths, threads):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+
+    def get(path):
+        path, _, query_string = path.partition("?")
+        environ = {
+            "HTTP_HOST": "testserver",
+            "PATH_INFO": path,
+            "QUERY_STRING": query_string,
+        }
+        setup_testing_defaults(environ)
+        start = time.perf_counter()
+        statuses = []
+        response = application(environ, lambda status, headers: statuses.append(status))
+        b"".join(response)
+        response.close()
+        assert statuses[0].startswith("200"), statuses[0]
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(get, paths))
+
+
+def run_asgi(paths, concurrency):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+
+    async def get(semaphore, path):
+        path, _, query_string = path.replace("/v1/", "/v1/async/").partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "query_string": query_string.encode("ascii"),
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+        }
+        messages = []
+        events = asyncio.Queue()
+        events.put_nowait({"type": "http.request", "body": b"", "more_body": False})
+
+        async def send(message):
+            messages.append(message)
+            # The client disconnects once the response is complete
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                events.put_nowait({"type": "http.disconnect"})
+
+        async with semaphore:
+            start = time.perf_counter()
+            await application(scope, events.get, send)
+            assert messages[0]["status"] == 200, messages[0]["status"]
+            return time.perf_counter() - start
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(get(semaphore, path) for path in paths))
+
+    return asyncio.run(main())
+
+
+def report(name, timings, seconds):
+    p50, p95 = (quantiles(timings, n=20)[i] * 1000 for i in (9, 18))
+    print(
+        f"{name:<40} {len(timings) / seconds:>10,.0f} requests/s "
+        f"p50 {p50:>7.1f} ms  p95 {p95:>7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=2000, help="Readings per user")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--latency", type=float, default=20, help="Milliseconds per query"
+    )
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.test.utils import override_settings
+
+    create_readings(args.users, args.rows)
+    if args.latency:
+        add_latency(args.latency / 1000)
+    paths = request_paths(args.requests, args.users)
+
+    # Every request is answered from the database, not the response cache
+    dummy_cache = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+    with override_settings(CACHES={"default": dummy_cache}):
+        for name, run, workers in (
+            (f"WSGI, {args.threads} threads", run_wsgi, args.threads),
+            (f"ASGI, {args.concurrency} in flight", run_asgi, args.concurrency),
+        ):
+            start = time.perf_counter()
+            timings = run(paths, workers)
+            report(name, timings, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
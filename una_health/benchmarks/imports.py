@@ -0,0 +1,68 @@
+"""
+Rows per second of a full CSV import with the default native bulk loader,
+compared with the ``bulk_create`` loader, and with parsing overlapped with
+writing or not.
+
+Every run imports the export for a new user, so all rows are inserted.
+``--latency`` makes every query take that long, like the round trip to a
+database server. Only then does the parse thread get to run while the
+import waits for the database, with the in-memory test database both stages
+compete for the interpreter.
+
+Run from the ``una_health`` directory::
+
+    python -m benchmarks.imports --rows 100000 --latency 2
+"""
+import argparse
+import io
+from itertools import count
+
+from benchmarks.parsing import generate_lines
+from benchmarks.utils import add_latency, best_time, report, setup_django
+
+
+def import_runner(data, loader):
+    from api.importers import import_glucose_csv
+    from api.models import Customer
+
+    users = count()
+
+    def run():
+        customer = Customer.objects.create(user_id=f"{loader}{next(users)}")
+        import_glucose_csv(io.BytesIO(data), customer)
+
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Milliseconds per query"
+    )
+    args = parser.parse_args()
+
+    setup_django()
+    if args.latency:
+        add_latency(args.latency / 1000)
+
+    from django.test.utils import override_settings
+
+    header = "Glukose-Werte\r\nGeneriert am,10-02-2021 09:40\r\nGerät,...\r\n"
+    data = (header + "".join(generate_lines(args.rows))).encode("utf-8")
+
+    for name, loader, queue_size in (
+        ("bulk_create", "orm", 0),
+        ("native bulk load", "native", 0),
+        ("bulk_create, pipelined", "orm", 4),
+        ("native bulk load, pipelined", "native", 4),
+    ):
+        with override_settings(
+            GLUCOSE_IMPORT_LOADER=loader, GLUCOSE_IMPORT_QUEUE_SIZE=queue_size
+        ):
+            run = import_runner(data, f"{loader}{queue_size}-")
+            report(name, args.rows, best_time(run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Rows per second of the CSV parse stage of the import, compared with the
+per-row parsing the import used before.
+
+Run from the ``una_health`` directory::
+
+    python -m benchmarks.parsing --rows 500000
+"""
+import argparse
+import csv
+from datetime import datetime, timedelta
+
+from benchmarks.utils import best_time, report, setup_django
+
+
+def generate_lines(rows):
+    start = datetime(2021, 2, 10)
+    lines = []
+    for i in range(rows):
+        timestamp = (start + timedelta(minutes=15 * i)).strftime("%d-%m-%Y %H:%M")
+        if i % 20:
+            values = f"0,{80 + i % 150},,,,,,,,,,,,,,"
+        else:
+            values = f"1,,{90 + i % 140},,4,,30,2,,,,,,,,"
+        lines.append(f"FreeStyle LibreLink,SN-1,{timestamp},{values}\r\n")
+    return lines
+
+
+def integer_conversion(val):
+    if val.isdigit():
+        return int(val)
+    else:
+        return None
+
+
+def parse_per_row(lines):
+    # The parsing done by PrepopulateGlucoseData before the columnar parser
+    parsed = []
+    for row in lines:
+        row = row.replace("\r\n", "").split(",")
+        parsed.append(
+            (
+                row[0],
+                row[1],
+                datetime.strptime(row[2], "%d-%m-%Y %H:%M"),
+                *(integer_conversion(row[i]) for i in (3, 4, 5, 7, 9, 10, 12)),
+                row[6],
+                row[8],
+                row[11],
+                row[13],
+                *(integer_conversion(row[i]) for i in range(14, 19)),
+            )
+        )
+    return parsed
+
+
+def parse_columns(lines, batch_size=1000):
+    from api.parsers import LibreViewParser
+
+    parser = LibreViewParser()
+    reader = csv.reader(lines)
+    batch = []
+    for row in reader:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            parser.parse(batch)
+            batch = []
+    if batch:
+        parser.parse(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    lines = generate_lines(args.rows)
+
+    report(
+        "per-row split + strptime", args.rows, best_time(lambda: parse_per_row(lines))
+    )
+    report("LibreViewParser", args.rows, best_time(lambda: parse_columns(lines)))
+
+
+if __name__ == "__main__":
+    main()
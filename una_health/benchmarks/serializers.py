@@ -0,0 +1,76 @@
+"""
+Rows per second of the levels serialization paths on one page of readings.
+
+Run from the ``una_health`` directory::
+
+    python -m benchmarks.serializers --rows 10000
+"""
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.utils import best_time, report, setup_django
+
+
+def create_readings(rows):
+    from api.models import Customer, Device, GlucoseData
+
+    user = Customer.objects.create(user_id="benchmark")
+    device = Device.objects.create(device_name="FreeStyle", serial_number="SN-1")
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    GlucoseData.objects.bulk_create(
+        (
+            GlucoseData(
+                user=user,
+                device=device,
+                device_timestamp=start + timedelta(minutes=15 * i),
+                record_type=0,
+                glucose_history=80 + i % 120,
+            )
+            for i in range(rows)
+        ),
+        batch_size=1000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from api.models import GlucoseData
+    from api.serializers import GlucoseDataRowSerializer, GlucoseDataSerializer
+    from rest_framework.renderers import JSONRenderer
+
+    create_readings(args.rows)
+    renderer = JSONRenderer()
+    queryset = GlucoseData.objects.order_by("device_timestamp")
+
+    def model_serializer():
+        renderer.render(GlucoseDataSerializer(queryset.all(), many=True).data)
+
+    def model_serializer_select_related():
+        renderer.render(
+            GlucoseDataSerializer(
+                queryset.select_related("user", "device", "text"), many=True
+            ).data
+        )
+
+    def row_serializer():
+        row_serializer = GlucoseDataRowSerializer()
+        renderer.render(
+            row_serializer.to_representation(row_serializer.get_queryset(queryset))
+        )
+
+    report("GlucoseDataSerializer", args.rows, best_time(model_serializer))
+    report(
+        "GlucoseDataSerializer + select_related",
+        args.rows,
+        best_time(model_serializer_select_related),
+    )
+    report("GlucoseDataRowSerializer", args.rows, best_time(row_serializer))
+
+
+if __name__ == "__main__":
+    main()
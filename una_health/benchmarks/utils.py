@@ -0,0 +1,50 @@
+import os
+import time
+
+
+def setup_django(database=True):
+    """Configure Django and create an empty test database to benchmark against."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "una_health.settings")
+    import django
+
+    django.setup()
+    if not database:
+        return
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def add_latency(seconds):
+    """Sleep ``seconds`` before every query, on every connection."""
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+    for connection in connections.all(initialized_only=True):
+        install(None, connection)
+
+
+def best_time(func, repeat=3):
+    """Return the fastest of ``repeat`` runs of ``func`` in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def report(name, rows, seconds):
+    print(f"{name:<40} {seconds * 1000:>10.1f} ms {rows / seconds:>14,.0f} rows/s")
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so the timings cover the other middleware too
+    "api.instrumentation.instrumentation_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -122,7 +124,82 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded files, e.g. CSV exports waiting to be imported
+
+MEDIA_URL = "media/"
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# The local-memory cache is per process, use the file based cache (or any
+# shared backend) to share cached responses between processes.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+# The glucose indexes include the glucose values on PostgreSQL only, on SQLite
+# they are created as plain indexes.
+SILENCED_SYSTEM_CHECKS = ["models.W040"]
+
+
+# Glucose data import
+
+# Number of CSV rows written per bulk insert while importing an upload
+GLUCOSE_IMPORT_BATCH_SIZE = 1000
+
+# Batches an import parses ahead of the one being written, on a separate
+# thread; 0 parses and writes every batch one after the other. Both stages
+# compete for the interpreter, so the parse thread only helps when queries wait
+# on a slow database server: python -m benchmarks.imports measured no gain on
+# PostgreSQL over a local socket and 17,900 against 21,500 rows/s on SQLite.
+GLUCOSE_IMPORT_QUEUE_SIZE = 0
+
+# How imports write readings: "native" bulk loads them with COPY on PostgreSQL
+# and executemany elsewhere, "orm" creates model instances with bulk_create
+GLUCOSE_IMPORT_LOADER = "native"
+
+# Maximum number of devices kept in the per-process device cache
+GLUCOSE_DEVICE_CACHE_SIZE = 1024
+
+# Number of background threads running import jobs in each process
+GLUCOSE_IMPORT_WORKERS = 2
+
+# Run import jobs synchronously in the request instead of on the worker pool
+GLUCOSE_IMPORT_EAGER = False
+
+# Number of files of a bulk upload imported in parallel (always 1 on SQLite)
+GLUCOSE_BULK_IMPORT_WORKERS = 4
+
+
+# Glucose data export
+
+# Rows fetched from the database per round trip while streaming an export
+GLUCOSE_EXPORT_CHUNK_SIZE = 2000
+
+
+# Glucose metrics
+
+# Longest time in seconds a single reading stands for when metrics are
+# weighted by time, longer gaps between readings count as missing data
+GLUCOSE_METRICS_MAX_GAP = 20 * 60
+
+
+# Glucose response cache
+
+# Cache holding the responses of the list and statistics endpoints
+GLUCOSE_CACHE_ALIAS = "default"
+
+# Seconds a cached response is kept, imports invalidate it earlier
+GLUCOSE_CACHE_TIMEOUT = 3600
+
+
+# Request instrumentation
+
+# Send the query count, database time, named spans and total time of every
+# request in a Server-Timing response header
+GLUCOSE_SERVER_TIMING = True
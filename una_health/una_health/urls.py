@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from api.views import prometheus_metrics
 from django.contrib import admin
 from django.urls import include, path, re_path
 from drf_yasg import openapi
@@ -34,6 +35,7 @@ schema_view = get_schema_view(
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("api.urls")),
+    path("metrics", prometheus_metrics, name="metrics"),
     path(
         "swagger_doc/",
         schema_view.with_ui("swagger", cache_timeout=0),